@@ -51,8 +51,10 @@ classdef GuiOutputs < matlab.System & coder.ExternalDependency
             if isempty(coder.target)
                 % Place simulation output code here 
             else
-                % Call C-function implementing device output
-                coder.ceval('send_socket_data', debug, V1, V2, V3, I1, I2, I3, f0_V1, f0_V2, f0_V3, f0_I1, f0_I2, f0_I3);
+                % Call C-function implementing device output with the
+                % channels in the order of the channels table of tcp_client.c
+                values = [debug, V1, V2, V3, I1, I2, I3, f0_V1, f0_V2, f0_V3, f0_I1, f0_I2, f0_I3];
+                coder.ceval('send_socket_data', coder.rref(values), int32(numel(values)));
             end
         end
         
@@ -14,23 +14,55 @@
 #define TCP_BACKLOG 10            /* Maximum length for the queue of pending connections */
 #define TCP_BUFFER_SIZE 1024      /* Maximum buffer size (in bytes) for socket send */
 
+/* Framed protocol (see gui_pyqt/src/protocol.py). Define GUI_BATCHED_MODE to
+   send samples in batches of GUI_BATCH_LEN instead of the legacy lockstep
+   exchange of one 13 double frame per sample. The server must then be
+   configured with protocolMode = "framed". */
+/* #define GUI_BATCHED_MODE */
+#define GUI_BATCH_LEN 64          /* Number of samples per channel in a batched frame */
+/* The GUI computes f0 of every channel itself, so in batched mode the last
+   GUI_N_F0_CHANNELS channels, the f0 channels, are left out of frames unless
+   GUI_SEND_F0 is defined. */
+/* #define GUI_SEND_F0 */
+/* Define GUI_FLOAT32 to send the voltages, currents and f0 channels of
+   batched frames as floats, halving the bandwidth, or GUI_INT16 to send
+   them as 16 bit integers scaled to the full scale values below, quartering
+   it. The debug channel stays a double. The channel types are announced to
+   the server in a schema message when connecting, which can also be sent
+   with doubles by defining GUI_SEND_SCHEMA. */
+/* #define GUI_FLOAT32 */
+/* #define GUI_INT16 */
+/* #define GUI_SEND_SCHEMA */
+#define GUI_V_FULL_SCALE 400.0    /* Largest voltage magnitude sent with GUI_INT16 */
+#define GUI_I_FULL_SCALE 20.0     /* Largest current magnitude sent with GUI_INT16 */
+#define GUI_F0_NOMINAL 50.0       /* Centre of the range of f0 sent with GUI_INT16 */
+#define GUI_F0_FULL_SCALE 10.0    /* Largest deviation of f0 from GUI_F0_NOMINAL sent with GUI_INT16 */
+#if defined(GUI_FLOAT32) && defined(GUI_INT16)
+#error "Define at most one of GUI_FLOAT32 and GUI_INT16"
+#endif
+#if (defined(GUI_FLOAT32) || defined(GUI_INT16)) && !defined(GUI_BATCHED_MODE)
+#error "GUI_FLOAT32 and GUI_INT16 require GUI_BATCHED_MODE"
+#endif
+#if (defined(GUI_FLOAT32) || defined(GUI_INT16)) && !defined(GUI_SEND_SCHEMA)
+#define GUI_SEND_SCHEMA
+#endif
+#define GUI_PROTOCOL_VERSION 1
+#define GUI_FRAME_MAGIC "GPTF"    /* Magic number of sample frames */
+#define GUI_CONTROL_MAGIC "GPTC"  /* Magic number of control frames */
+#define GUI_SCHEMA_MAGIC "GPTS"   /* Magic number of schema messages */
+/* Channels of a sample. Their names, units, groups and scaling are listed in
+   the channels table of tcp_client.c, which is announced to the server in the
+   schema message. To change the channel layout, e.g. to add a neutral
+   current, edit that table and these counts together, and pass that many
+   values to send_socket_data. */
+#define GUI_N_CHANNELS 13         /* Number of channels of a sample */
+#define GUI_N_F0_CHANNELS 6       /* Number of f0 channels at the end of a sample */
+#define GUI_N_CONTROL_INPUTS 6
+
 void connect_to_server(void);
-void send_socket_data(
-                        real_T t,
-                        real_T V1,
-                        real_T V2,
-                        real_T V3,
-                        real_T I1,
-                        real_T I2,
-                        real_T I3,
-                        real_T f0_V1,
-                        real_T f0_V2,
-                        real_T f0_V3,
-                        real_T f0_I1,
-                        real_T f0_I2,
-                        real_T f0_I3
-                     );
+void send_socket_data(const real_T *values, int_T n_values);
 real_T read_socket_data(void);
+void flush_socket_data(void);
 void close_socket(void);
 
 #endif /* _GUI_H */
\ No newline at end of file
@@ -25,12 +25,136 @@
 
 #include "gui.h"
 
-#define BUFFER_LEN 13
+#define BUFFER_LEN GUI_N_CHANNELS
 #define BUFFER_SIZE BUFFER_LEN * 8
 
+#ifdef GUI_SEND_F0
+#define FRAME_CHANNELS BUFFER_LEN /* channels sent in batched frames */
+#else
+#define FRAME_CHANNELS (BUFFER_LEN - GUI_N_F0_CHANNELS) /* all but the f0 channels */
+#endif
+
+/* Header of framed protocol messages. Fields are sent in host byte order,
+   which is little-endian on all supported targets. */
+typedef struct {
+    char magic[4];
+    uint16_T version;
+    uint16_T flags;
+    uint32_T sequence;
+    uint32_T sample_count;
+    uint32_T channel_mask;
+} frame_header_T;
+
+/* Description of a channel in the schema message. A 16 bit integer channel
+   represents the value offset + scale * integer. */
+typedef struct {
+    const char *name;
+    const char *unit;
+    const char *group;
+    real_T scale;
+    real_T offset;
+} channel_T;
+
+#if defined(GUI_FLOAT32)
+#define SAMPLE_DTYPE "f4" /* type of voltages, currents and f0 channels on the wire */
+#elif defined(GUI_INT16)
+#define SAMPLE_DTYPE "i2"
+#else
+#define SAMPLE_DTYPE "f8"
+#endif
+
+#define V_SCALE (GUI_V_FULL_SCALE / 32767)
+#define I_SCALE (GUI_I_FULL_SCALE / 32767)
+#define F0_SCALE (GUI_F0_FULL_SCALE / 32767)
+
+/* Channels in the order they are sent, GUI_N_CHANNELS of them with the
+   GUI_N_F0_CHANNELS f0 channels last. Only the debug channel is always a
+   double. */
+static const channel_T channels[] = {
+    {"debug", "", "derived", 1.0, 0.0},
+    {"V1", "V", "V", V_SCALE, 0.0},
+    {"V2", "V", "V", V_SCALE, 0.0},
+    {"V3", "V", "V", V_SCALE, 0.0},
+    {"I1", "A", "I", I_SCALE, 0.0},
+    {"I2", "A", "I", I_SCALE, 0.0},
+    {"I3", "A", "I", I_SCALE, 0.0},
+    {"f0_V1", "Hz", "derived", F0_SCALE, GUI_F0_NOMINAL},
+    {"f0_V2", "Hz", "derived", F0_SCALE, GUI_F0_NOMINAL},
+    {"f0_V3", "Hz", "derived", F0_SCALE, GUI_F0_NOMINAL},
+    {"f0_I1", "Hz", "derived", F0_SCALE, GUI_F0_NOMINAL},
+    {"f0_I2", "Hz", "derived", F0_SCALE, GUI_F0_NOMINAL},
+    {"f0_I3", "Hz", "derived", F0_SCALE, GUI_F0_NOMINAL}
+};
+
+/* Fails to compile unless the table has GUI_N_CHANNELS entries */
+typedef char channels_table_size_T[sizeof(channels) / sizeof(channels[0]) == GUI_N_CHANNELS ? 1 : -1];
+
 int socket_desc; /* socket descriptor for opened socket communication with server */
 boolean_T connected_to_server; /* flag for determining whether program is connected to server */
 
+#ifdef GUI_BATCHED_MODE
+static real_T batch_buffer[BUFFER_LEN][GUI_BATCH_LEN]; /* channel-major batch of samples */
+#if defined(GUI_FLOAT32)
+static real32_T compact_buffer[GUI_BATCH_LEN]; /* one channel of a batch converted to floats */
+#elif defined(GUI_INT16)
+static int16_T compact_buffer[GUI_BATCH_LEN]; /* one channel of a batch converted to integers */
+#endif
+static uint32_T batch_count; /* number of samples in batch_buffer */
+static uint32_T frame_sequence; /* sequence number of next frame sent */
+
+static real_T control_inputs[GUI_N_CONTROL_INPUTS]; /* last control inputs received */
+static int control_index; /* index of next control input returned by read_socket_data */
+static unsigned char control_buffer[sizeof(frame_header_T) + GUI_N_CONTROL_INPUTS * 8];
+static int control_buffer_len; /* number of bytes of a partial control frame received */
+static int control_frame_size; /* size of control frame being received, once its header is complete */
+static frame_header_T control_header; /* header of control frame being received */
+#endif
+
+static void send_all(const void *buffer, int buffer_size);
+
+#ifdef GUI_SEND_SCHEMA
+/**
+ * Announce the names, units, types and groups of the channels to the
+ * server. Must be sent before any samples.
+ */
+static void send_schema(void)
+{
+    char payload[TCP_BUFFER_SIZE * 2];
+    frame_header_T header;
+    int length;
+    int channel;
+
+    length = snprintf(payload, sizeof(payload), "{\"channels\": [");
+    for (channel = 0; channel < GUI_N_CHANNELS; channel++)
+    {
+        length += snprintf(
+                            payload + length,
+                            sizeof(payload) - length,
+                            "%s{\"name\": \"%s\", \"unit\": \"%s\", \"dtype\": \"%s\", \"group\": \"%s\", "
+                            "\"scale\": %.17g, \"offset\": %.17g}",
+                            channel == 0 ? "" : ", ",
+                            channels[channel].name,
+                            channels[channel].unit,
+                            channel == 0 ? "f8" : SAMPLE_DTYPE,
+                            channels[channel].group,
+                            channels[channel].scale,
+                            channels[channel].offset
+                          );
+    }
+    length += snprintf(payload + length, sizeof(payload) - length, "]}");
+
+    memcpy(header.magic, GUI_SCHEMA_MAGIC, sizeof(header.magic));
+    header.version = GUI_PROTOCOL_VERSION;
+    header.flags = 0;
+    header.sequence = 0;
+    header.sample_count = length; /* length of the JSON payload */
+    header.channel_mask = GUI_N_CHANNELS; /* number of channels */
+
+    send_all(&header, sizeof(header));
+    send_all(payload, length);
+}
+#endif
+
 /**
  * Connect to TCP/IP live server if not already connected.
  */
@@ -69,66 +193,27 @@ void connect_to_server(void)
 
         /* Set flag to indicate connection to server */
         connected_to_server = 1;
+
+#ifdef GUI_SEND_SCHEMA
+        send_schema();
+#endif
     }
 }
 
 /**
- * Send data passed as arguments to TCP/IP server.
+ * Send a buffer in its entirety to TCP/IP server.
  *
- * @param debug Debug value.
- * @param V1 Instantaneous channel 1 voltage.
- * @param V2 Instantaneous channel 2 voltage.
- * @param V3 Instantaneous channel 3 voltage.
- * @param I1 Instantaneous channel 1 current.
- * @param I2 Instantaneous channel 2 current.
- * @param I3 Instantaneous channel 3 current.
- * @param f0_V1 Computed fundamental frequency of channel 1 voltage.
- * @param f0_V2 Computed fundamental frequency of channel 2 voltage.
- * @param f0_V3 Computed fundamental frequency of channel 3 voltage.
- * @param f0_I1 Computed fundamental frequency of channel 1 current.
- * @param f0_I2 Computed fundamental frequency of channel 2 current.
- * @param f0_I3 Computed fundamental frequency of channel 3 current.
+ * @param buffer Pointer to data to be sent.
+ * @param buffer_size Number of bytes to be sent.
  */
-void send_socket_data(
-                        real_T debug,
-                        real_T V1,
-                        real_T V2,
-                        real_T V3,
-                        real_T I1,
-                        real_T I2,
-                        real_T I3,
-                        real_T f0_V1,
-                        real_T f0_V2,
-                        real_T f0_V3,
-                        real_T f0_I1,
-                        real_T f0_I2,
-                        real_T f0_I3
-                     )
+static void send_all(const void *buffer, int buffer_size)
 {
-	int buffer_size = BUFFER_SIZE;
-    real_T buffer[BUFFER_LEN] = {
-                                    debug,
-                                    V1,
-                                    V2,
-                                    V3,
-                                    I1,
-                                    I2,
-                                    I3,
-                                    f0_V1,
-                                    f0_V2,
-                                    f0_V3,
-                                    f0_I1,
-                                    f0_I2,
-                                    f0_I3
-                                 };
-
-	unsigned char *buffer_ptr = (unsigned char *)buffer;
+	const unsigned char *buffer_ptr = (const unsigned char *)buffer;
 	int sent_size;
 
-	/* Send data to server */
 	while (buffer_size > 0)
 	{
-		if ((sent_size = send(socket_desc, buffer, buffer_size, 0)) < 0)
+		if ((sent_size = send(socket_desc, buffer_ptr, buffer_size, 0)) < 0)
 		{
 			fprintf(stderr, "Send failed.\n");
 
@@ -144,12 +229,226 @@ void send_socket_data(
 	}
 }
 
+/**
+ * Send the values of the channels of one sample to TCP/IP server.
+ *
+ * In batched mode, the sample is added to the current batch and the batch
+ * is only sent once it holds GUI_BATCH_LEN samples.
+ *
+ * @param values Values of the channels in the order of the channels table,
+ *               i.e. debug, V1-V3, I1-I3 and the f0 of each.
+ * @param n_values Number of values, which must be GUI_N_CHANNELS.
+ */
+void send_socket_data(const real_T *values, int_T n_values)
+{
+#ifdef GUI_BATCHED_MODE
+    int channel;
+#endif
+
+    if (n_values != GUI_N_CHANNELS)
+    {
+        fprintf(stderr, "Expected %d channel values, got %d.\n", GUI_N_CHANNELS, (int)n_values);
+
+        /* Close socket */
+        close(socket_desc);
+        printf("Socket closed successfully.\n");
+
+        exit(EXIT_FAILURE);
+    }
+
+#ifdef GUI_BATCHED_MODE
+    for (channel = 0; channel < GUI_N_CHANNELS; channel++)
+    {
+        batch_buffer[channel][batch_count] = values[channel];
+    }
+    batch_count++;
+
+    if (batch_count == GUI_BATCH_LEN)
+    {
+        flush_socket_data();
+    }
+#else
+	/* Send data to server */
+	send_all(values, BUFFER_SIZE);
+#endif
+}
+
+/**
+ * Send samples of the current batch to TCP/IP server as a single frame.
+ *
+ * Does nothing if not in batched mode or if the batch is empty.
+ */
+void flush_socket_data(void)
+{
+#ifdef GUI_BATCHED_MODE
+    frame_header_T header;
+    int channel;
+
+    if (batch_count == 0)
+    {
+        return;
+    }
+
+    memcpy(header.magic, GUI_FRAME_MAGIC, sizeof(header.magic));
+    header.version = GUI_PROTOCOL_VERSION;
+    header.flags = 0;
+    header.sequence = frame_sequence++;
+    header.sample_count = batch_count;
+    header.channel_mask = (1u << FRAME_CHANNELS) - 1;
+
+    send_all(&header, sizeof(header));
+
+#if defined(GUI_FLOAT32) || defined(GUI_INT16)
+    /* The debug channel is sent as doubles and all others in the compact type */
+    send_all(batch_buffer[0], batch_count * 8);
+    for (channel = 1; channel < FRAME_CHANNELS; channel++)
+    {
+        uint32_T i;
+
+        for (i = 0; i < batch_count; i++)
+        {
+#ifdef GUI_FLOAT32
+            compact_buffer[i] = (real32_T)batch_buffer[channel][i];
+#else
+            real_T value = (batch_buffer[channel][i] - channels[channel].offset) / channels[channel].scale;
+
+            /* Round to nearest and clip to the range of int16_T */
+            value = value < 0 ? value - 0.5 : value + 0.5;
+            if (value > 32767)
+            {
+                value = 32767;
+            }
+            else if (value < -32768)
+            {
+                value = -32768;
+            }
+            compact_buffer[i] = (int16_T)value;
+#endif
+        }
+        send_all(compact_buffer, batch_count * sizeof(compact_buffer[0]));
+    }
+#else
+    if (batch_count == GUI_BATCH_LEN)
+    {
+        /* Rows of a full batch are contiguous */
+        send_all(batch_buffer, FRAME_CHANNELS * GUI_BATCH_LEN * 8);
+    }
+    else
+    {
+        for (channel = 0; channel < FRAME_CHANNELS; channel++)
+        {
+            send_all(batch_buffer[channel], batch_count * 8);
+        }
+    }
+#endif
+
+    batch_count = 0;
+#endif
+}
+
+#ifdef GUI_BATCHED_MODE
+/**
+ * Receive any control frames sent by the server without blocking and
+ * update the control inputs with the latest values.
+ *
+ * A control frame only carries the inputs whose bits are set in its
+ * channel mask, in ascending order. Other inputs keep their values.
+ */
+static void poll_control_frames(void)
+{
+    int read_size;
+    int wanted;
+    int i;
+    const unsigned char *payload;
+
+    for (;;)
+    {
+        /* Receive the header first, then the payload it describes */
+        if (control_buffer_len < (int)sizeof(frame_header_T))
+        {
+            wanted = sizeof(frame_header_T) - control_buffer_len;
+        }
+        else
+        {
+            wanted = control_frame_size - control_buffer_len;
+        }
+
+        read_size = recv(
+                            socket_desc,
+                            control_buffer + control_buffer_len,
+                            wanted,
+                            MSG_DONTWAIT
+                        );
+
+        if (read_size <= 0)
+        {
+            /* No more data available (EAGAIN) or connection closed */
+            return;
+        }
+
+        control_buffer_len += read_size;
+
+        if (control_buffer_len == (int)sizeof(frame_header_T))
+        {
+            memcpy(&control_header, control_buffer, sizeof(control_header));
+            if (memcmp(control_header.magic, GUI_CONTROL_MAGIC, sizeof(control_header.magic)) != 0
+                || (control_header.channel_mask >> GUI_N_CONTROL_INPUTS) != 0)
+            {
+                fprintf(stderr, "Unexpected control frame.\n");
+                control_buffer_len = 0;
+                continue;
+            }
+
+            control_frame_size = sizeof(frame_header_T);
+            for (i = 0; i < GUI_N_CONTROL_INPUTS; i++)
+            {
+                if (control_header.channel_mask & (1u << i))
+                {
+                    control_frame_size += 8;
+                }
+            }
+        }
+
+        if (control_buffer_len >= (int)sizeof(frame_header_T)
+            && control_buffer_len == control_frame_size)
+        {
+            payload = control_buffer + sizeof(frame_header_T);
+            for (i = 0; i < GUI_N_CONTROL_INPUTS; i++)
+            {
+                if (control_header.channel_mask & (1u << i))
+                {
+                    memcpy(&control_inputs[i], payload, 8);
+                    payload += 8;
+                }
+            }
+            control_buffer_len = 0;
+        }
+    }
+}
+#endif
+
 /**
  * Read single double value from TCP/IP receive buffer.
  *
  * @returns Double value read from TCP/IP receive buffer.
  */
 real_T read_socket_data(void) {
+#ifdef GUI_BATCHED_MODE
+    real_T value;
+
+    /* Control inputs are only sent by the server when they change, so poll
+       for updates once per set of inputs and otherwise return the last
+       values received. */
+    if (control_index == 0)
+    {
+        poll_control_frames();
+    }
+
+    value = control_inputs[control_index];
+    control_index = (control_index + 1) % GUI_N_CONTROL_INPUTS;
+
+    return value;
+#else
     void *buffer;
     int_T read_size;
     real_T value;
@@ -171,6 +470,7 @@ real_T read_socket_data(void) {
     free(buffer);
 
     return value;
+#endif
 }
 
 /**
@@ -178,6 +478,9 @@ real_T read_socket_data(void) {
  */
 void close_socket(void)
 {
+	/* Send any samples remaining in the current batch */
+	flush_socket_data();
+
 	/* Close socket */
 	close(socket_desc);
 }
\ No newline at end of file
@@ -0,0 +1,493 @@
+"""Acquisition in a separate process.
+
+With settings.acquisitionMode set to "process", the TcpServer receiving
+samples and everything derived from them in each session (triggering,
+history, recording and measurements) run in a child process with its own
+interpreter, so plotting and receiving no longer compete for one GIL and
+can use two cores.
+
+The sample store, history pyramid and trigger frame of every session are
+in shared memory (see sharedmemory.py), which the GUI attaches to and only
+reads. Everything else goes over a multiprocessing Pipe:
+
+    GUI to acquisition process
+        (method, args)      call of a TcpServer method in CALLS
+    Acquisition process to GUI
+        ("sessions", list)  description of every session, sent whenever the
+                            sessions change
+        ("state", dict)     measurement results, metrics summary and events
+                            changed since the last state of every session,
+                            sent every settings.statePublishInterval
+        ("stopped",)        sent last, when the server has stopped
+
+The GUI process talks to AcquisitionProxy, which has the interface of
+TcpServer used by the GUI, so the GUI works the same with either mode.
+"""
+# Standard library imports
+from collections import namedtuple
+import multiprocessing
+import threading
+
+# Third-party library imports
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+# Local application imports
+import settings
+from decimation import MinMaxPyramid
+from events import EventStore
+from instrumentation import PipelineMetrics
+from measurements import PhaseMeasurements
+from recorder import recordingPath
+from schema import ChannelSchema, defaultSchema
+from server import TcpServer
+from session import AcquisitionSession, Frame
+from sharedmemory import SharedFrame, SharedRingBuffer
+
+# TcpServer methods the GUI may call in the acquisition process
+CALLS = {
+    "runServer",
+    "stopServer",
+    "restoreSessions",
+    "setActiveSession",
+    "setTriggerMode",
+    "setTriggerSlope",
+    "rearmTrigger",
+    "postControl",
+    "startRecording",
+    "stopRecording",
+}
+
+# Calls after which the sessions are described to the GUI again
+SESSION_CALLS = {"restoreSessions", "startRecording", "stopRecording"}
+
+# Histograms recorded by the GUI rather than the acquisition process
+GUI_HISTOGRAMS = ("plotFrame", "snapshot")
+
+STARTUP_TIMEOUT = 30.0  # seconds to wait for the acquisition process to describe its sessions
+
+# Parts of the trigger and measurements of a session read by the GUI
+TriggerState = namedtuple("TriggerState", ["channels"])
+MeasurementsState = namedtuple("MeasurementsState", ["results"])
+
+
+class SharedSession(AcquisitionSession):
+    """Session of the acquisition process whose sample store, history
+    pyramid and trigger frame are in shared memory.
+
+    The blocks are replaced when the session is reconfigured and unlinked
+    when it is closed.
+    """
+    def __init__(self, name, schema=defaultSchema) -> None:
+        self.sharedBuffers = []  # SharedRingBuffers of the current configuration
+        self.sharedFrame = None
+        super(SharedSession, self).__init__(name, schema)
+
+    def configure(self, schema):
+        replaced = self.sharedBuffers + [self.sharedFrame]
+        self.sharedBuffers = []
+        super(SharedSession, self).configure(schema)
+
+        self.sharedFrame = SharedFrame(len(self.trigger.channels))
+        self.sharedFrame.publish(*self.latestFrame)
+        # The worker threads of the old configuration have stopped, so
+        # nothing in this process reads the replaced blocks any more
+        for block in replaced:
+            if block is not None:
+                block.unlink()
+                block.close()
+
+    def createRingBuffer(self, nChannels, capacity):
+        buffer = SharedRingBuffer(nChannels, capacity)
+        self.sharedBuffers.append(buffer)
+        return buffer
+
+    def publishFrame(self):
+        super(SharedSession, self).publishFrame()
+        self.sharedFrame.publish(*self.latestFrame)
+
+    def describe(self):
+        """Return what the GUI needs to attach to the session."""
+        return {
+            "name": self.name,
+            "host": self.host,
+            "connected": self.connected,
+            "recording": self.recording,
+            "schema": self.schema.toJson(),
+            "triggerChannels": list(self.trigger.channels),
+            "store": self.sampleStore.name,
+            "levels": [buffer.name for buffer in self.sharedBuffers[1:]],
+            "frame": self.sharedFrame.name,
+        }
+
+    def close(self):
+        super(SharedSession, self).close()
+        for block in self.sharedBuffers + [self.sharedFrame]:
+            block.unlink()
+            block.close()
+
+
+class AcquisitionProcess:
+    """The TcpServer of the acquisition process, driven by calls from the
+    GUI over a pipe.
+    """
+    def __init__(self, connection, controlInputs) -> None:
+        self.connection = connection
+        self.sendLock = threading.Lock()  # sent to from the server, call and state threads
+        self.stopEvent = threading.Event()
+        self.eventRevisions = {}  # (EventStore, revision last published) by session name
+
+        self.server = TcpServer(controlInputs, sessionClass=SharedSession)
+        self.server.sessionsChanged.connect(self.publishSessions)
+
+    def run(self):
+        """Serve calls until runServer is called, then run the server until
+        stopServer is called.
+        """
+        self.publishSessions()
+        while self.receiveCall() != "runServer":
+            pass
+
+        callsThread = threading.Thread(target=self.receiveCalls, name="AcquisitionCalls", daemon=True)
+        callsThread.start()
+        threading.Thread(target=self.publishState, name="AcquisitionState", daemon=True).start()
+        self.server.runServer()
+
+        # stopServer closes the sessions on the calls thread, which must
+        # finish unlinking their shared memory before the process exits
+        callsThread.join()
+        self.stopEvent.set()
+        self.send(("stopped",))
+
+    def receiveCall(self):
+        """Make the next call received from the GUI. Returns the name of the
+        method called.
+        """
+        try:
+            method, args = self.connection.recv()
+        except EOFError:
+            method, args = "stopServer", ()  # the GUI has gone
+        if method not in CALLS:
+            print(f"Ignoring call of {method} from the GUI")
+            return method
+
+        if method != "runServer":
+            getattr(self.server, method)(*args)
+        if method in SESSION_CALLS:
+            self.publishSessions()
+        return method
+
+    def receiveCalls(self):
+        while self.receiveCall() != "stopServer":
+            pass
+
+    def publishSessions(self):
+        self.send(
+            ("sessions", [session.describe() for session in list(self.server.sessions.values())])
+        )
+
+    def publishState(self):
+        while not self.stopEvent.wait(settings.statePublishInterval):
+            self.send(
+                (
+                    "state",
+                    {
+                        name: (
+                            session.measurements.results,
+                            session.metricsSummary(),
+                            self.changedEvents(name, session),
+                        )
+                        for name, session in list(self.server.sessions.items())
+                    },
+                )
+            )
+
+    def changedEvents(self, name, session):
+        """Return the events of a session changed since they were last
+        published, or all of them if its event store has been replaced.
+        """
+        events, revision = self.eventRevisions.get(name, (None, 0))
+        if events is not session.events:
+            revision = 0
+        changed, revision = session.events.changedSince(revision)
+        self.eventRevisions[name] = (session.events, revision)
+        return changed
+
+    def send(self, message):
+        with self.sendLock:
+            try:
+                self.connection.send(message)
+            except (BrokenPipeError, OSError):
+                pass  # the GUI has gone
+
+
+def runAcquisition(connection, controlInputs, settingsValues):
+    """Entry point of the acquisition process."""
+    # Use the settings of the GUI even if they were changed after import
+    vars(settings).update(settingsValues)
+    AcquisitionProcess(connection, controlInputs).run()
+
+
+class SessionProxy:
+    """Read-only view of a session of the acquisition process, attached to
+    its shared memory.
+    """
+    def __init__(self, description) -> None:
+        self.name = description["name"]
+        self.schema = ChannelSchema.fromJson(description["schema"])
+        self.nChannels = self.schema.nChannels
+        self.storeName = description["store"]
+
+        self.sampleStore = SharedRingBuffer(self.nChannels, settings.maxBufferLength, self.storeName)
+        levelNames = iter(description["levels"])
+        self.historyPyramid = MinMaxPyramid(
+            self.sampleStore,
+            settings.decimationFactor,
+            ringBuffer=lambda nChannels, capacity: SharedRingBuffer(nChannels, capacity, next(levelNames))
+        )
+        self.sharedFrame = SharedFrame(len(description["triggerChannels"]), description["frame"])
+        self.frame = Frame(0, ((0, 0),) * self.sharedFrame.nWindows)
+
+        self.trigger = TriggerState(tuple(description["triggerChannels"]))
+        self.measurements = MeasurementsState(tuple(PhaseMeasurements() for _ in self.schema.phases()))
+        self.events = EventStore(settings.maxEvents)  # events received from the acquisition process
+
+        # Metrics of the GUI, and the latest summary of the acquisition process
+        self.metrics = PipelineMetrics()
+        self.acquisitionSummary = self.metrics.summary()
+        self.update(description)
+
+    def update(self, description):
+        """Update the connection state of the session."""
+        self.host = description["host"]
+        self.connected = description["connected"]
+        self.recording = description["recording"]
+
+    @property
+    def latestFrame(self):
+        frame = self.sharedFrame.read()
+        if frame is not None:
+            self.frame = Frame(*frame)
+        return self.frame
+
+    def channelName(self, channel):
+        """Return the name of a channel in the namespace of the session."""
+        return f"{self.name}.{self.schema.names[channel]}"
+
+    def close(self):
+        """Let go of the shared memory of the session. The session must no
+        longer be used.
+        """
+        for level in self.historyPyramid.levels:
+            level.summaries.close()
+        self.sampleStore.close()
+        self.sharedFrame.close()
+
+    def metricsSummary(self):
+        """Return the metrics of the acquisition process with the GUI
+        histograms and snapshot retries of this process.
+        """
+        summary = dict(self.acquisitionSummary)
+        for key, value in self.metrics.summary().items():
+            if key.startswith(GUI_HISTOGRAMS):
+                summary[key] = value
+        summary["snapshot_retries"] = self.sampleStore.snapshotRetries
+        return summary
+
+
+class SessionCloser(QObject):
+    """Closes the session proxies replaced by the receive thread on the GUI
+    thread, once the GUI has been told of the sessions replacing them and no
+    longer reads them.
+    """
+    @pyqtSlot(list)
+    def closeSessions(self, sessions):
+        for session in sessions:
+            session.close()
+
+
+class AcquisitionProxy(QObject):
+    """Runs the TcpServer in an acquisition process and gives the GUI the
+    same interface to it as a TcpServer in the GUI process.
+
+    The process is started when the proxy is created, so the sessions are
+    known straight away, but it only accepts clients once runServer is
+    called. runServer then applies what the process publishes until it
+    stops, so it is run on the receive thread.
+    """
+    sessionsChanged = pyqtSignal()  # emitted when a client connects or disconnects
+    sessionsReplaced = pyqtSignal(list)  # SessionProxies replaced, emitted after sessionsChanged
+
+    def __init__(self, controlInputs) -> None:
+        super(QObject, self).__init__()
+        self.triggerMode = settings.triggerMode
+        self.triggerSlope = settings.triggerSlope
+        self.sessions = {}  # SessionProxy of every session, by name
+        self.activeSession = None
+
+        # Created before the proxy is moved to the receive thread, so that it
+        # closes replaced sessions on the GUI thread
+        self.sessionCloser = SessionCloser()
+        self.sessionsReplaced.connect(self.sessionCloser.closeSessions)
+
+        # Spawned rather than forked, since the GUI process has Qt threads
+        context = multiprocessing.get_context("spawn")
+        self.connection, childConnection = context.Pipe()
+        settingsValues = {
+            name: value for name, value in vars(settings).items() if not name.startswith("__")
+        }
+        self.process = context.Process(
+            target=runAcquisition,
+            args=(childConnection, controlInputs, settingsValues),
+            name="Acquisition",
+            daemon=True
+        )
+        self.process.start()
+        childConnection.close()
+        self.waitForSessions()
+
+    # ----------------------------
+    # State of the active session
+    # ----------------------------
+    @property
+    def sampleStore(self):
+        return self.activeSession.sampleStore
+
+    @property
+    def historyPyramid(self):
+        return self.activeSession.historyPyramid
+
+    @property
+    def trigger(self):
+        return self.activeSession.trigger
+
+    @property
+    def measurements(self):
+        return self.activeSession.measurements
+
+    @property
+    def latestFrame(self):
+        return self.activeSession.latestFrame
+
+    def call(self, method, *args):
+        """Call a TcpServer method in the acquisition process."""
+        self.connection.send((method, args))
+
+    def waitForSessions(self):
+        """Apply messages from the acquisition process until it describes
+        its sessions.
+        """
+        while True:
+            if not self.connection.poll(STARTUP_TIMEOUT):
+                raise RuntimeError("The acquisition process did not start")
+            message = self.connection.recv()
+            self.handle(message)
+            if message[0] == "sessions":
+                return
+
+    def runServer(self):
+        """Let the acquisition process accept clients, and apply what it
+        publishes until it stops.
+        """
+        self.call("runServer")
+        while True:
+            try:
+                message = self.connection.recv()
+            except EOFError:
+                print("Acquisition process exited")
+                break
+            if message[0] == "stopped":
+                break
+            self.handle(message)
+        self.process.join(1)
+
+    def handle(self, message):
+        """Apply a message from the acquisition process."""
+        if message[0] == "sessions":
+            replaced = self.attachSessions(message[1])
+            self.sessionsChanged.emit()
+            if replaced:
+                self.sessionsReplaced.emit(replaced)
+        elif message[0] == "state":
+            for name, (results, summary, events) in message[1].items():
+                session = self.sessions.get(name)
+                if session is not None:
+                    session.measurements = MeasurementsState(results)
+                    session.acquisitionSummary = summary
+                    for event in events:
+                        session.events.put(event)
+
+    def attachSessions(self, descriptions):
+        """Attach to new sessions and sessions whose shared memory has been
+        replaced. The sessions are replaced as a whole, so the GUI never sees
+        a partially updated set. Returns the SessionProxies replaced, to be
+        closed once the GUI no longer reads them.
+        """
+        sessions = {}
+        for description in descriptions:
+            session = self.sessions.get(description["name"])
+            if session is not None and session.storeName == description["store"]:
+                session.update(description)
+            else:
+                try:
+                    session = SessionProxy(description)
+                except FileNotFoundError:
+                    continue  # already replaced, described again in a later message
+            sessions[session.name] = session
+        if not sessions:
+            return []
+
+        replaced = [session for name, session in self.sessions.items() if sessions.get(name) is not session]
+        self.sessions = sessions
+        active = self.activeSession.name if self.activeSession is not None else None
+        self.activeSession = sessions.get(active, next(iter(sessions.values())))
+        return replaced
+
+    def stopServer(self):
+        """Stop the acquisition process. Its sessions remain readable."""
+        if self.process.is_alive():
+            self.call("stopServer")
+
+    def restoreSessions(self, cache):
+        """Recreate the sessions of a SessionCache in the acquisition
+        process. Must be called before the server is started.
+        """
+        self.call("restoreSessions", cache)
+        self.waitForSessions()
+        if cache.activeSession in self.sessions:
+            self.setActiveSession(cache.activeSession)
+
+    def setActiveSession(self, name):
+        """Select the session plotted by the GUI."""
+        self.activeSession = self.sessions[name]
+        self.call("setActiveSession", name)
+
+    def setTriggerMode(self, mode):
+        """Change the trigger mode of all sessions."""
+        self.triggerMode = mode
+        self.call("setTriggerMode", mode)
+
+    def setTriggerSlope(self, slope):
+        """Change the trigger slope of all sessions."""
+        self.triggerSlope = slope
+        self.call("setTriggerSlope", slope)
+
+    def rearmTrigger(self):
+        """Re-arm the trigger of all sessions."""
+        self.call("rearmTrigger")
+
+    def postControl(self, index, value):
+        """Change the value of a control input."""
+        self.call("postControl", index, value)
+
+    def startRecording(self, path=None):
+        """Start recording the active session. Returns the path of the
+        recording.
+        """
+        if path is None:
+            path = recordingPath(settings.recordingDirectory, self.activeSession.name)
+        self.call("startRecording", path)
+        return path
+
+    def stopRecording(self):
+        """Stop recording the active session."""
+        self.call("stopRecording")
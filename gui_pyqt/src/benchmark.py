@@ -0,0 +1,413 @@
+"""Benchmarks of the receive, buffer, trigger, history and render hot paths.
+
+Each pipeline benchmark drives a component with a synthetic stream of
+settings.benchmarkDuration seconds of samples at each sample rate, and
+records:
+
+    * throughput: samples (or frames, for rendering) processed per second
+    * load: fraction of one core needed to keep up with the sample rate
+    * p50 and p99 latency of each call
+    * peak memory allocated while running, measured with tracemalloc in a
+      separate pass so that tracing does not distort the timings
+
+Render benchmarks plot up to settings.maxBufferLength points in a
+PlotWidget on the offscreen Qt platform, once per render mode, and estimate
+the points per frame each mode can draw within settings.targetPlotInterval.
+Modes that are unavailable, e.g. opengl without a working OpenGL context,
+are reported and skipped.
+
+Results are saved as JSON in settings.benchmarkDirectory, one file per
+run, and a previous run can be compared against.
+
+Usage:
+    python benchmark.py [--label v0.1.0] [--rates 1000,10000,100000]
+                        [--only decode_framed,trigger] [--compare FILE]
+                        [--render-modes raster,opengl]
+"""
+# Standard library imports
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import encoding
+import protocol
+import rendering
+import settings
+from decimation import MinMaxPyramid
+from ringbuffer import RingBuffer
+from schema import CURRENT_GROUP, VOLTAGE_GROUP, defaultSchema
+from simulator import WaveformGenerator, int16Schema
+from stripchart import StripChart
+from trigger import TriggerEngine
+
+BATCH = 64  # samples per frame, as sent by the batched Simulink client (GUI_BATCH_LEN)
+
+
+class FakeTransport:
+    """Stands in for an asyncio transport so that a ClientConnection can be
+    driven without sockets.
+    """
+    def get_extra_info(self, name):
+        return ("benchmark", 0)
+
+    def set_write_buffer_limits(self, high):
+        pass
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def stream(rate, duration=None):
+    """Return a synthetic stream of duration seconds at a sample rate with
+    shape (channels, samples).
+    """
+    duration = settings.benchmarkDuration if duration is None else duration
+    generator = WaveformGenerator(rate, ("sine", "harmonics", "noise"))
+    return generator.block(int(rate * duration))
+
+
+def connection(framed):
+    """Return a ClientConnection of a server with no event loop, connected
+    to a FakeTransport.
+    """
+    from server import ClientConnection, TcpServer
+
+    settings.protocolMode = protocol.FRAMED_MODE if framed else protocol.LEGACY_MODE
+    server = TcpServer([0.0] * protocol.N_CONTROL_INPUTS)
+    client = ClientConnection(server)
+    client.connection_made(FakeTransport())
+    client.session.measurements.stop()  # not part of the receive path
+    return client
+
+
+def feed(client, message):
+    """Deliver a message to a connection as the event loop would."""
+    view = client.get_buffer(-1)
+    view[:len(message)] = message
+    client.buffer_updated(len(message))
+
+
+def decodeFramedCalls(rate, schema=defaultSchema, flags=0):
+    """Receive path of framed clients: one call per frame of BATCH samples."""
+    data = stream(rate)
+    client = connection(framed=True)
+    if schema != defaultSchema:
+        feed(client, schema.toMessage())
+    messages = []
+    for sequence, start in enumerate(range(0, data.shape[1], BATCH)):
+        block = data[:, start : start + BATCH]
+        header = protocol.frameHeader.pack(
+            protocol.FRAME_MAGIC,
+            protocol.PROTOCOL_VERSION,
+            flags,
+            sequence,
+            block.shape[1],
+            (1 << schema.nChannels) - 1,
+        )
+        messages.append((header + schema.encodeFrame(block, flags), block.shape[1]))
+    return [(lambda message=message: feed(client, message), n) for message, n in messages]
+
+
+def decodeCompactCalls(rate):
+    """Receive path of framed clients sending scaled 16 bit integers, delta
+    encoded and compressed with zlib.
+    """
+    return decodeFramedCalls(rate, int16Schema(), encoding.FLAG_DELTA | encoding.FLAG_ZLIB)
+
+
+def decodeLegacyCalls(rate):
+    """Receive path of legacy clients: one call per sample."""
+    data = stream(rate)
+    client = connection(framed=False)
+    messages = np.ascontiguousarray(data.T, dtype="<f8")
+    return [(lambda message=message: feed(client, message.tobytes()), 1) for message in messages]
+
+
+def triggerCalls(rate):
+    """Trigger function over frames of BATCH samples."""
+    data = stream(rate)
+    store = RingBuffer(defaultSchema.nChannels, settings.maxBufferLength)
+    trigger = TriggerEngine(
+        defaultSchema.group(VOLTAGE_GROUP) + defaultSchema.group(CURRENT_GROUP),
+        settings.nSamplesInView,
+        hysteresis=settings.triggerHysteresis
+    )
+
+    def update(block):
+        store.write(block)
+        trigger.update(store)
+
+    return [
+        (lambda block=data[:, start : start + BATCH]: update(block), BATCH)
+        for start in range(0, data.shape[1], BATCH)
+    ]
+
+
+def bufferCalls(rate):
+    """Sample store writes of BATCH samples, each followed by a snapshot of
+    a plot window as taken by the GUI.
+    """
+    data = stream(rate)
+    store = RingBuffer(defaultSchema.nChannels, settings.maxBufferLength)
+
+    def writeAndSnapshot(block):
+        store.write(block)
+        store.snapshot(store.totalWritten - settings.nSamplesInView, store.totalWritten, 1)
+
+    return [
+        (lambda block=data[:, start : start + BATCH]: writeAndSnapshot(block), BATCH)
+        for start in range(0, data.shape[1], BATCH)
+    ]
+
+
+def rangeStatsCalls(rate):
+    """Sample store writes of BATCH samples, each followed by an update of
+    the history pyramid and the statistics of all retained samples, as
+    computed for the measurement cursors.
+    """
+    data = stream(rate)
+    store = RingBuffer(defaultSchema.nChannels, settings.maxBufferLength)
+    pyramid = MinMaxPyramid(store, settings.decimationFactor)
+
+    def writeAndMeasure(block):
+        store.write(block)
+        pyramid.update()
+        pyramid.stats(store.oldestIndex, store.totalWritten)
+
+    return [
+        (lambda block=data[:, start : start + BATCH]: writeAndMeasure(block), BATCH)
+        for start in range(0, data.shape[1], BATCH)
+    ]
+
+
+def rollCalls(rate):
+    """Sample store writes of BATCH samples, each followed by an update of
+    a strip chart of settings.rollSeconds, 1000 columns wide, as plotted in
+    roll mode.
+    """
+    data = stream(rate)
+    store = RingBuffer(defaultSchema.nChannels, settings.maxBufferLength)
+    chart = StripChart(store, int(settings.rollSeconds * rate), 1000)
+
+    def writeAndRoll(block):
+        store.write(block)
+        chart.update()
+
+    return [
+        (lambda block=data[:, start : start + BATCH]: writeAndRoll(block), BATCH)
+        for start in range(0, data.shape[1], BATCH)
+    ]
+
+
+pipelineBenchmarks = {
+    "decode_framed": decodeFramedCalls,
+    "decode_compact": decodeCompactCalls,
+    "decode_legacy": decodeLegacyCalls,
+    "trigger": triggerCalls,
+    "buffer": bufferCalls,
+    "range_stats": rangeStatsCalls,
+    "roll": rollCalls,
+}
+
+
+def run(calls):
+    """Time a list of (callable, samples) pairs. Returns total samples,
+    total seconds and per-call latencies in nanoseconds.
+    """
+    latencies = np.empty(len(calls), dtype=np.int64)
+    nSamples = 0
+    start = time.perf_counter_ns()
+    for i, (call, n) in enumerate(calls):
+        callStart = time.perf_counter_ns()
+        call()
+        latencies[i] = time.perf_counter_ns() - callStart
+        nSamples += n
+    return nSamples, (time.perf_counter_ns() - start) / 1e9, latencies
+
+
+def peakMemory(makeCalls, parameter):
+    """Return the peak memory in KiB allocated while running calls,
+    excluding the synthetic stream they are made with.
+    """
+    calls = makeCalls(parameter)
+    tracemalloc.start()
+    try:
+        for call, _ in calls:
+            call()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def result(name, parameter, unit, count, seconds, latencies, peakKib):
+    throughput = count / seconds if seconds else 0.0
+    entry = {
+        "name": name,
+        unit: parameter,
+        "throughput": throughput,
+        "p50_us": float(np.percentile(latencies, 50)) / 1000,
+        "p99_us": float(np.percentile(latencies, 99)) / 1000,
+        "peak_kib": peakKib,
+    }
+    if unit == "rate":
+        entry["load"] = parameter / throughput if throughput else float("inf")
+    return entry
+
+
+def benchmarkPipeline(name, rates):
+    makeCalls = pipelineBenchmarks[name]
+    results = []
+    for rate in rates:
+        count, seconds, latencies = run(makeCalls(rate))
+        results.append(
+            result(name, rate, "rate", count, seconds, latencies, peakMemory(makeCalls, rate))
+        )
+        print(formatResult(results[-1]))
+    return results
+
+
+def benchmarkRender(pointCounts, mode, nFrames=50):
+    """Time setData and painting of one line of up to maxBufferLength
+    points on the offscreen Qt platform with a render mode.
+
+    Each result also holds the capacity of the mode: the number of points
+    that could be drawn per frame in settings.targetPlotInterval ms, from
+    the median time per point of the largest frames.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    rendering.prepareRendering(settings.softwareOpenGL)
+    from PyQt5.QtWidgets import QApplication
+    import pyqtgraph as pg
+
+    app = QApplication.instance() or QApplication([])
+    renderMode, reason = rendering.resolveRenderMode(mode)
+    if renderMode != mode:
+        print(f"render_{mode:<7}skipped, {reason}")
+        return []
+
+    widget = pg.PlotWidget()
+    widget.useOpenGL(renderMode == rendering.OPENGL_MODE)
+    widget.resize(800, 400)
+    widget.show()
+    line = widget.plot([], [], skipFiniteCheck=True, pen=pg.mkPen(settings.lineColors[0], width=settings.penWidth))
+
+    def makeCalls(nPoints):
+        data = stream(1 / settings.axisScalingFactor, nPoints * settings.axisScalingFactor + 1)
+        frames = [data[1, i : i + nPoints].copy() for i in range(nFrames)]
+
+        def draw(y):
+            line.setData(y)
+            widget.grab()  # paints the scene
+            app.processEvents()
+
+        return [(lambda y=y: draw(y), 1) for y in frames]
+
+    results = []
+    for nPoints in pointCounts:
+        count, seconds, latencies = run(makeCalls(nPoints))
+        results.append(
+            result(f"render_{mode}", nPoints, "points", count, seconds, latencies, peakMemory(makeCalls, nPoints))
+        )
+        results[-1]["capacity"] = int(settings.targetPlotInterval * 1000 * nPoints / results[-1]["p50_us"])
+        print(formatResult(results[-1]))
+    widget.close()
+    return results
+
+
+def formatResult(entry):
+    parameter = f"{entry['rate']:>9,.0f} samples/s" if "rate" in entry else f"{entry['points']:>9,} points   "
+    line = (
+        f"{entry['name']:<14}{parameter}  {entry['throughput']:>14,.0f}/s  "
+        f"p50 {entry['p50_us']:>9.1f} us  p99 {entry['p99_us']:>9.1f} us  "
+        f"peak {entry['peak_kib']:>9.0f} KiB"
+    )
+    if "load" in entry:
+        line += f"  load {entry['load']:>7.1%}"
+    if "capacity" in entry:
+        line += f"  capacity {entry['capacity']:>11,} points/frame"
+    return line
+
+
+def compare(results, baselinePath):
+    """Print the change in throughput and p99 latency against a previous
+    run.
+    """
+    with open(baselinePath) as f:
+        baseline = json.load(f)
+
+    def key(entry):
+        return (entry["name"], entry.get("rate"), entry.get("points"))
+
+    previous = {key(entry): entry for entry in baseline["results"]}
+    print(f"\nCompared with {baseline['label']} ({baseline['timestamp']}):")
+    for entry in results:
+        old = previous.get(key(entry))
+        if old is None:
+            continue
+        parameter = entry.get("rate", entry.get("points"))
+        print(
+            f"{entry['name']:<14}{parameter:>9,}  "
+            f"throughput {entry['throughput'] / old['throughput'] - 1:>+7.1%}  "
+            f"p99 {entry['p99_us'] / old['p99_us'] - 1 if old['p99_us'] else 0:>+7.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the acquisition and plotting hot paths")
+    parser.add_argument("--label", default="dev", help="name of the run e.g. a release version")
+    parser.add_argument("--rates", default="1000,10000,100000", help="comma separated sample rates")
+    parser.add_argument("--points", default=f"100,1000,{settings.maxBufferLength}",
+                        help="comma separated numbers of points for render benchmarks")
+    parser.add_argument("--only", default=None, help="comma separated benchmarks to run")
+    parser.add_argument("--compare", default=None, help="results file of a previous run")
+    parser.add_argument("--render-modes", default=f"{rendering.RASTER_MODE},{rendering.OPENGL_MODE}",
+                        help="comma separated render modes for render benchmarks")
+    args = parser.parse_args()
+
+    rates = [int(rate) for rate in args.rates.split(",")]
+    pointCounts = [int(points) for points in args.points.split(",")]
+    names = args.only.split(",") if args.only else list(pipelineBenchmarks) + ["render"]
+
+    results = []
+    for name in names:
+        if name == "render":
+            for mode in args.render_modes.split(","):
+                results += benchmarkRender(pointCounts, mode)
+        else:
+            results += benchmarkPipeline(name, rates)
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    os.makedirs(settings.benchmarkDirectory, exist_ok=True)
+    path = os.path.join(settings.benchmarkDirectory, f"{args.label}-{timestamp}.json")
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "label": args.label,
+                "timestamp": timestamp,
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Saved results to {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
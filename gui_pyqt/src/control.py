@@ -0,0 +1,36 @@
+"""Control inputs sent from the GUI to the clients."""
+
+# Standard library imports
+import queue
+
+
+class ControlChannel:
+    """Control input values passed from the GUI thread to the acquisition
+    thread.
+
+    The GUI posts an update whenever an input changes. The acquisition
+    thread collects queued updates and only has to send the inputs that
+    changed, so it never reads Qt widgets and the values it sends are always
+    a consistent set.
+    """
+    def __init__(self, values) -> None:
+        self.updates = queue.SimpleQueue()
+        self.values = list(values)  # latest values, only modified by collect()
+
+    def post(self, index, value):
+        """Queue a new value of an input. May be called from any thread."""
+        self.updates.put((index, value))
+
+    def collect(self):
+        """Apply queued updates and return a bit mask of the inputs whose
+        values changed, with bit n set if input n changed.
+        """
+        changed = 0
+        while True:
+            try:
+                index, value = self.updates.get_nowait()
+            except queue.Empty:
+                return changed
+            if self.values[index] != value:
+                self.values[index] = value
+                changed |= 1 << index
@@ -0,0 +1,232 @@
+"""Multi-resolution min/max decimation of the sample store.
+
+Plotting every retained sample in history mode does not scale, since a plot
+can only show about one value per pixel anyway. The pyramid keeps min/max
+summaries of blocks of samples at several resolutions so that a view can
+fetch roughly one block per pixel whatever the length of the capture.
+
+The blocks also hold the sum and sum of squares of their samples, so the
+statistics of any range of samples can be combined from a few blocks of
+each level rather than from the samples themselves.
+"""
+# Standard library imports
+from collections import namedtuple
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from ringbuffer import RingBuffer
+
+N_SUMMARIES = 4  # min, max, sum and sum of squares
+
+# Statistics of every channel over a range of samples. All fields but count
+# are arrays with one value per channel.
+RangeStats = namedtuple("RangeStats", ["count", "min", "max", "mean", "rms"])
+
+
+def combineStats(count, mins, maxs, sums, sumSquares):
+    """Return the RangeStats of count samples from lists of summaries of the
+    parts of their range, each with shape (nChannels, nParts).
+    """
+    sums = np.concatenate(sums, axis=1).sum(axis=1)
+    sumSquares = np.concatenate(sumSquares, axis=1).sum(axis=1)
+    return RangeStats(
+        count,
+        np.concatenate(mins, axis=1).min(axis=1),
+        np.concatenate(maxs, axis=1).max(axis=1),
+        sums / count,
+        np.sqrt(np.maximum(sumSquares, 0) / count),
+    )
+
+
+class PyramidLevel:
+    """Min/max, sum and sum of squares summaries of consecutive blocks of
+    blockSize samples.
+
+    The four summaries of all channels are kept in a single ring buffer,
+    one after the other, so that a level is read and written in one go.
+    """
+    def __init__(self, nChannels, capacity, blockSize, ringBuffer=RingBuffer) -> None:
+        self.nChannels = nChannels
+        self.blockSize = blockSize
+        self.summaries = ringBuffer(N_SUMMARIES * nChannels, capacity)
+
+    @property
+    def nBlocks(self):
+        """Number of completed blocks summarised since creation."""
+        return self.summaries.totalWritten
+
+    @property
+    def oldestBlock(self):
+        """Index of the oldest block still retained."""
+        return self.summaries.oldestIndex
+
+    def read(self, start, stop):
+        """Return views of the mins, maxs, sums and sums of squares of blocks
+        [start, stop), each with shape (nChannels, nBlocks).
+        """
+        return self.summaries.read(start, stop).reshape(N_SUMMARIES, self.nChannels, -1)
+
+
+class MinMaxPyramid:
+    """Min/max pyramid maintained incrementally over a RingBuffer.
+
+    Level n summarises blocks of factor ** (n + 1) samples and is computed
+    from the blocks of level n - 1 (or from the samples for level 0), so the
+    cost of keeping the pyramid up to date is proportional to the number of
+    new samples. Each level retains the same time span as the sample store.
+
+    The ring buffers of the levels are created in order of level by calling
+    ringBuffer(nChannels, capacity).
+    """
+    def __init__(self, store, factor=4, minBlocks=2, ringBuffer=RingBuffer) -> None:
+        self.store = store
+        self.factor = factor
+
+        self.levels = []
+        blockSize = factor
+        while store.capacity // blockSize >= minBlocks:
+            self.levels.append(
+                PyramidLevel(store.nChannels, store.capacity // blockSize + 1, blockSize, ringBuffer)
+            )
+            blockSize *= factor
+
+    @property
+    def endIndex(self):
+        """Absolute index one past the most recent sample."""
+        return self.store.totalWritten
+
+    def update(self):
+        """Summarise blocks completed since the last update.
+
+        Must be called after every write to the sample store, or at least
+        before the store wraps around.
+        """
+        factor = self.factor
+        nChannels = self.store.nChannels
+        source = None  # level the blocks of the next level are made of, None for samples
+
+        for level in self.levels:
+            nBlocks = self.store.totalWritten // level.blockSize
+            done = level.nBlocks
+            if nBlocks == done:
+                # Higher levels cannot have completed blocks either
+                break
+
+            start = done * factor
+            stop = nBlocks * factor
+            if source is None:
+                data = self.store.read(start, stop)
+            else:
+                data = source.summaries.read(start, stop)
+            nNew = data.shape[1] // factor
+            if nNew < nBlocks - done:
+                # Source samples were overwritten before they were summarised
+                level.summaries.totalWritten = nBlocks - nNew
+                data = data[:, data.shape[1] - nNew * factor :]
+
+            if source is None:
+                blocks = data.reshape(nChannels, nNew, factor)
+                mins = maxs = sums = blocks
+                squares = np.square(blocks)
+            else:
+                mins, maxs, sums, squares = data.reshape(N_SUMMARIES, nChannels, nNew, factor)
+            level.summaries.write(
+                np.concatenate(
+                    (mins.min(axis=2), maxs.max(axis=2), sums.sum(axis=2), squares.sum(axis=2))
+                )
+            )
+            source = level
+
+    def query(self, channel, start, stop, nPoints):
+        """Return x and y data for plotting a channel over the absolute sample
+        range [start, stop) with about nPoints points.
+
+        If the range holds more samples than points, the coarsest level with
+        at least nPoints blocks in the range is used, and each block is
+        plotted as a vertical segment from its min to its max so that peaks
+        are never lost. Samples after the last completed block are appended
+        as they are.
+        """
+        store = self.store
+        start = max(int(start), store.oldestIndex)
+        stop = min(int(stop), store.totalWritten)
+        if stop <= start:
+            return np.empty(0), np.empty(0)
+
+        samplesPerPoint = (stop - start) / max(nPoints, 1)
+        level = None
+        for candidate in self.levels:
+            if candidate.blockSize > samplesPerPoint:
+                break
+            level = candidate
+
+        if level is None:
+            y = store.read(start, stop)[channel].copy()
+            return np.arange(start, start + len(y), dtype=np.float64), y
+
+        blockSize = level.blockSize
+        blockStart = max(start // blockSize, level.oldestBlock)
+        blockStop = min(-(-stop // blockSize), level.nBlocks)
+
+        mins, maxs, _, _ = level.read(blockStart, blockStop)[:, channel]
+
+        # Raw samples of the incomplete block at the end of the range
+        tailStart = max(blockStop * blockSize, start)
+        tail = store.read(tailStart, stop)[channel]
+
+        nBlocks = len(mins)
+        x = np.empty(2 * nBlocks + len(tail))
+        y = np.empty(2 * nBlocks + len(tail))
+
+        centres = (np.arange(blockStart, blockStart + nBlocks) + 0.5) * blockSize
+        x[0 : 2 * nBlocks : 2] = centres
+        x[1 : 2 * nBlocks : 2] = centres
+        y[0 : 2 * nBlocks : 2] = mins
+        y[1 : 2 * nBlocks : 2] = maxs
+
+        x[2 * nBlocks :] = np.arange(tailStart, tailStart + len(tail))
+        y[2 * nBlocks :] = tail
+        return x, y
+
+    def summaries(self, level, start, stop):
+        """Return the mins, maxs, sums and sums of squares of blocks [start,
+        stop) of a level, or of samples [start, stop) if level is None.
+        """
+        if level is None:
+            samples = self.store.read(start, stop)
+            return samples, samples, samples, np.square(samples)
+        return level.read(start, stop)
+
+    def stats(self, start, stop):
+        """Return the RangeStats of the absolute sample range [start, stop),
+        or None if no samples of the range are retained.
+
+        The range is covered by the largest blocks that fit in it: samples
+        up to the first and after the last block of level 0, then blocks of
+        each level up to the first and after the last block of the next, so
+        at most 2 * factor summaries of every level are combined and the
+        cost grows with the logarithm of the length of the range.
+        """
+        store = self.store
+        start = max(int(start), store.oldestIndex)
+        stop = min(int(stop), store.totalWritten)
+        if stop <= start:
+            return None
+
+        parts = []
+        source = None  # level whose blocks first and last count, None for samples
+        first, last = start, stop
+        for level in self.levels:
+            blockFirst = max(-(-first // self.factor), level.oldestBlock)
+            blockLast = min(last // self.factor, level.nBlocks)
+            if blockLast <= blockFirst:
+                break
+            parts.append(self.summaries(source, first, blockFirst * self.factor))
+            parts.append(self.summaries(source, blockLast * self.factor, last))
+            source = level
+            first, last = blockFirst, blockLast
+        parts.append(self.summaries(source, first, last))
+
+        return combineStats(stop - start, *zip(*parts))
@@ -0,0 +1,133 @@
+"""Compact encodings of framed protocol payloads.
+
+The flags field of a sample frame header selects how its payload is
+encoded on top of the sample types of the channel schema:
+
+    FLAG_DELTA   integer channels are sent as the zigzag encoded differences
+                 between consecutive samples, as LEB128 varints. The first
+                 difference of a frame is from zero.
+    FLAG_ZLIB    the payload is compressed with zlib
+    FLAG_LZ4     the payload is compressed with LZ4 (block format). Only
+                 supported if the lz4 package is installed.
+
+Compression is applied after delta encoding. A frame with any flag set has
+a variable length payload, so the payload starts with its length in bytes
+as a little-endian uint32.
+
+Encoding and decoding are vectorised with NumPy, so the cost per frame does
+not grow with the number of Python operations per sample.
+"""
+# Standard library imports
+import struct
+import zlib
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import protocol
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+FLAG_DELTA = 0x1
+FLAG_ZLIB = 0x2
+FLAG_LZ4 = 0x4
+COMPRESSION_FLAGS = FLAG_ZLIB | FLAG_LZ4
+
+# Flags the server can decode, advertised in the flags field of its control frames
+SUPPORTED_FLAGS = FLAG_DELTA | FLAG_ZLIB | (FLAG_LZ4 if lz4 is not None else 0)
+
+payloadLength = struct.Struct("<I")  # prefix of payloads of frames with flags set
+
+MAX_VARINT_BYTES = 5  # bytes of the longest varint of a 32 bit value
+
+
+class EncodingError(protocol.ProtocolError):
+    """Raised when a payload cannot be encoded or decoded."""
+
+
+def zigzag(values):
+    """Map signed integers to unsigned integers, small magnitudes first."""
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def unzigzag(values):
+    """Invert zigzag."""
+    values = values.astype(np.int64)
+    return (values >> 1) ^ -(values & 1)
+
+
+def encodeVarints(values):
+    """Return unsigned integers below 2**35 as LEB128 varints."""
+    values = np.asarray(values, dtype=np.uint64)
+    shifts = 7 * np.arange(MAX_VARINT_BYTES, dtype=np.uint64)
+    groups = ((values[:, np.newaxis] >> shifts) & 0x7F).astype(np.uint8)
+
+    # Number of bytes of each varint: one, plus one per further 7 bits
+    nBytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, MAX_VARINT_BYTES):
+        nBytes += values >= (1 << (7 * k))
+
+    present = np.arange(MAX_VARINT_BYTES) < nBytes[:, np.newaxis]
+    groups[np.arange(MAX_VARINT_BYTES) < (nBytes - 1)[:, np.newaxis]] |= 0x80  # continuation bits
+    return groups[present].tobytes()
+
+
+def decodeVarints(data, count):
+    """Decode the first count LEB128 varints of a uint8 array. Returns the
+    values and the number of bytes they took.
+    """
+    ends = np.flatnonzero(data < 0x80)[:count]
+    if len(ends) < count:
+        raise EncodingError(f"Expected {count} varints, found {len(ends)}")
+    if not count:
+        return np.zeros(0, dtype=np.uint64), 0
+    nBytes = int(ends[-1]) + 1
+    data = data[:nBytes]
+
+    # Position of each byte in its varint
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends + 1 - starts
+    if lengths.max() > MAX_VARINT_BYTES:
+        raise EncodingError("Varint too long")
+    position = np.arange(nBytes) - np.repeat(starts, lengths)
+
+    # The 7 bit groups of a varint do not overlap, so OR them together
+    groups = (data & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.bitwise_or.reduceat(groups, starts), nBytes
+
+
+def encodeDelta(values):
+    """Return integer samples of a channel delta and varint encoded. The
+    inverse is the cumulative sum of unzigzag of the decoded varints.
+    """
+    return encodeVarints(zigzag(np.diff(values.astype(np.int64), prepend=0)))
+
+
+def compress(payload, flags):
+    """Compress a payload with the compression selected by flags."""
+    if flags & FLAG_ZLIB:
+        return zlib.compress(payload, 1)
+    if flags & FLAG_LZ4:
+        if lz4 is None:
+            raise EncodingError("LZ4 compression requires the lz4 package")
+        return lz4.block.compress(payload, store_size=True)
+    return payload
+
+
+def decompress(payload, flags):
+    """Decompress a payload with the compression selected by flags."""
+    try:
+        if flags & FLAG_ZLIB:
+            return zlib.decompress(payload)
+        if flags & FLAG_LZ4:
+            if lz4 is None:
+                raise EncodingError("LZ4 compression requires the lz4 package")
+            return lz4.block.decompress(payload)
+    except (zlib.error, RuntimeError) as e:
+        raise EncodingError(f"Corrupt compressed payload: {e}") from e
+    return payload
@@ -0,0 +1,377 @@
+"""Streaming detection of power quality events.
+
+Every half cycle of the nominal frequency, the RMS and mean of every
+channel over the last cycle and the rate of change of the mean from one
+cycle to the next are computed from the sample store, and checked against
+a list of rules such as
+
+    ("sag", "V", "rms", "below", 207.0)
+
+which reads: a sag starts when the one cycle RMS of a channel named "V",
+or in group or with unit "V", falls below 207 V. It ends when the RMS
+recovers past the threshold by a fraction, the hysteresis, of it.
+Quantities are "rms", "mean" or "rate" (units per second) and conditions
+"below", "above" or "beyond" (magnitude above).
+
+When an event starts, a window of samples of every channel around its
+start is copied out of the sample store into the event store, as floats,
+once the samples after the start have arrived. Events therefore keep
+their samples after the sample store has moved on, and history mode can
+show them at any time.
+"""
+# Standard library imports
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from decimation import MinMaxPyramid
+from ringbuffer import RingBuffer
+
+QUANTITIES = ("rms", "mean", "rate")
+CONDITIONS = ("below", "above", "beyond")
+
+EventRule = namedtuple("EventRule", ["kind", "channels", "quantity", "condition", "threshold"])
+
+# An event of one channel of a session. stopIndex and extreme (the value of
+# the quantity furthest past the threshold) are updated until the event
+# ends. samples holds every channel from windowStart, or is None until the
+# samples after the start have arrived.
+Event = namedtuple(
+    "Event",
+    [
+        "id",
+        "session",
+        "kind",
+        "channel",
+        "unit",
+        "quantity",
+        "threshold",
+        "extreme",
+        "startIndex",
+        "stopIndex",
+        "time",
+        "windowStart",
+        "samples",
+    ],
+)
+
+
+class EventStore:
+    """The latest maxEvents events of a session, by id.
+
+    Written by the event detector and read from other threads. Every change
+    bumps revision, so a reader can tell whether there is anything new and
+    fetch only the events changed since it last looked.
+    """
+    def __init__(self, maxEvents) -> None:
+        self.maxEvents = maxEvents
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (revision, Event) by id, oldest event first
+        self.revision = 0
+
+    def put(self, event):
+        """Add an event, or replace the event with the same id."""
+        with self.lock:
+            self.revision += 1
+            self.entries[event.id] = (self.revision, event)
+            while len(self.entries) > self.maxEvents:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.revision += 1
+            self.entries.clear()
+
+    def events(self):
+        """Return a list of the events, oldest first."""
+        with self.lock:
+            return [event for _, event in self.entries.values()]
+
+    def get(self, id):
+        """Return the event with an id, or None if it is no longer kept."""
+        with self.lock:
+            entry = self.entries.get(id)
+        return None if entry is None else entry[1]
+
+    def changedSince(self, revision):
+        """Return the events changed after a revision, and the current
+        revision.
+        """
+        with self.lock:
+            return [event for changed, event in self.entries.values() if changed > revision], self.revision
+
+
+def rulesFor(rules, schema):
+    """Return (rule, channel indexes) for every rule that applies to some
+    channel of a schema.
+    """
+    applied = []
+    for rule in map(EventRule._make, rules):
+        if rule.quantity not in QUANTITIES or rule.condition not in CONDITIONS:
+            raise ValueError(f"Invalid event rule {tuple(rule)}")
+        channels = [
+            index for index, channel in enumerate(schema.channels)
+            if rule.channels in (channel.name, channel.group, channel.unit)
+        ]
+        if channels:
+            applied.append((rule, channels))
+    return applied
+
+
+class EventDetector:
+    """Detect events of a session on a worker thread.
+
+    Every interval seconds the half cycle boundaries passed since the last
+    pass are evaluated in one go, so the cost is proportional to the number
+    of new samples and the detector keeps up with the full sample rate
+    without touching the acquisition or GUI threads.
+    """
+    def __init__(
+                    self,
+                    store,
+                    schema,
+                    rules,
+                    eventStore,
+                    sessionName,
+                    sampleRate,
+                    nominalFrequency=50.0,
+                    hysteresis=0.02,
+                    preSeconds=0.1,
+                    postSeconds=0.3,
+                    interval=0.1,
+                    receivedChannels=None
+                ) -> None:
+        self.store = store
+        self.schema = schema
+        self.rules = rulesFor(rules, schema)
+        self.eventStore = eventStore
+        self.sessionName = sessionName
+        self.sampleRate = sampleRate
+        self.hysteresis = hysteresis
+        self.interval = interval
+        self.receivedChannels = receivedChannels  # flags of channels sent by the client, if known
+
+        self.cycleSamples = max(2, int(round(sampleRate / nominalFrequency)) // 2 * 2)
+        self.halfCycle = self.cycleSamples // 2
+        self.preSamples = int(preSeconds * sampleRate)
+        self.postSamples = int(postSeconds * sampleRate)
+
+        # Next half cycle boundary to evaluate. Boundaries are multiples of
+        # halfCycle, and two cycles before a boundary are needed to evaluate
+        # it. Set when started, so samples restored before are not evaluated.
+        self.nextBoundary = 2 * self.cycleSamples
+        self.active = {}  # Event in progress by (rule index, channel)
+        self.pendingCaptures = []  # ids of events whose samples have not been captured
+        self.nextId = 0
+
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start detecting events on a worker thread."""
+        if self.thread is None and self.rules:
+            self.stopEvent.clear()
+            self.nextBoundary = max(
+                2 * self.cycleSamples, -(-self.store.totalWritten // self.halfCycle) * self.halfCycle
+            )
+            self.thread = threading.Thread(target=self.run, name="EventDetector", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the worker thread, ending the events in progress and
+        capturing the samples received so far of events still waiting for
+        theirs, since no more may arrive.
+        """
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        totalWritten = self.store.totalWritten
+        for event in self.active.values():
+            self.publish(event._replace(stopIndex=totalWritten))
+        self.active = {}
+        self.capture(totalWritten, final=True)
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.update()
+
+    def update(self):
+        """Evaluate new half cycle boundaries and capture the samples of
+        events whose window has been received.
+        """
+        store = self.store
+        cycle = self.cycleSamples
+        totalWritten = store.totalWritten
+
+        # Skip boundaries whose samples were overwritten before being evaluated
+        oldest = store.oldestIndex + 2 * cycle
+        if self.nextBoundary < oldest:
+            self.nextBoundary = -(-oldest // self.halfCycle) * self.halfCycle
+        lastBoundary = totalWritten // self.halfCycle * self.halfCycle
+        if lastBoundary >= self.nextBoundary:
+            start = self.nextBoundary - 2 * cycle
+            block = store.snapshot(start, lastBoundary)
+            if block is not None and block.shape[1] == lastBoundary - start:
+                self.evaluate(block, start)
+                self.nextBoundary = lastBoundary + self.halfCycle
+
+        self.capture(totalWritten)
+
+    def evaluate(self, block, start):
+        """Check the rules at the boundaries of a block of samples from
+        absolute index start, which begins two cycles before the first
+        boundary and ends at the last.
+        """
+        cycle = self.cycleSamples
+        sums = np.zeros((block.shape[0], block.shape[1] + 1))
+        np.cumsum(block, axis=1, out=sums[:, 1:])
+        squares = np.zeros_like(sums)
+        np.cumsum(np.square(block), axis=1, out=squares[:, 1:])
+
+        # Offsets of the boundaries in the block, and of the previous cycle
+        ends = np.arange(2 * cycle, block.shape[1] + 1, self.halfCycle)
+        quantities = {
+            "rms": np.sqrt(np.maximum(squares[:, ends] - squares[:, ends - cycle], 0) / cycle),
+            "mean": (sums[:, ends] - sums[:, ends - cycle]) / cycle,
+        }
+        previousMean = (sums[:, ends - cycle] - sums[:, ends - 2 * cycle]) / cycle
+        quantities["rate"] = (quantities["mean"] - previousMean) * self.sampleRate / cycle
+
+        boundaries = start + ends
+        received = self.receivedChannels
+        for ruleIndex, (rule, channels) in enumerate(self.rules):
+            values = quantities[rule.quantity]
+            for channel in channels:
+                if received is not None and not received[channel]:
+                    continue  # never sent, holds no data
+                self.track(ruleIndex, rule, channel, values[channel], boundaries)
+
+    def track(self, ruleIndex, rule, channel, values, boundaries):
+        """Start and end the events of a rule and channel over the values of
+        its quantity at consecutive boundaries.
+        """
+        threshold = rule.threshold
+        margin = abs(threshold) * self.hysteresis
+        magnitudes = np.abs(values) if rule.condition == "beyond" else values
+        if rule.condition == "below":
+            starts, ends = magnitudes < threshold, magnitudes >= threshold + margin
+            worst = np.minimum
+        else:
+            starts, ends = magnitudes > threshold, magnitudes <= threshold - margin
+            worst = np.maximum
+
+        key = (ruleIndex, channel)
+        position = 0
+        n = len(values)
+        while position < n:
+            previous = event = self.active.pop(key, None)
+            if event is None:
+                found = np.flatnonzero(starts[position:])
+                if not len(found):
+                    return
+                position += found[0]
+                event = self.startEvent(rule, channel, int(boundaries[position]), float(magnitudes[position]))
+
+            found = np.flatnonzero(ends[position:])
+            stop = position + found[0] if len(found) else n
+            if stop > position:
+                event = event._replace(extreme=float(worst(event.extreme, worst.reduce(magnitudes[position:stop]))))
+            if len(found):
+                event = event._replace(stopIndex=int(boundaries[stop]))
+            else:
+                self.active[key] = event
+
+            if event != previous:
+                self.publish(event)
+            position = stop
+
+    def startEvent(self, rule, channel, index, value):
+        """Return a new event of a rule and channel detected at the boundary
+        with absolute index index.
+        """
+        self.nextId += 1
+        self.pendingCaptures.append(self.nextId)
+        return Event(
+            self.nextId,
+            self.sessionName,
+            rule.kind,
+            self.schema.names[channel],
+            self.schema.channels[channel].unit,
+            rule.quantity,
+            rule.threshold,
+            value,
+            index,
+            None,
+            time.time() - (self.store.totalWritten - index) / self.sampleRate,
+            index - self.preSamples,
+            None,
+        )
+
+    def publish(self, event):
+        """Put an event in the store, keeping its samples if already captured."""
+        stored = self.eventStore.get(event.id)
+        if stored is not None and stored.samples is not None:
+            event = event._replace(windowStart=stored.windowStart, samples=stored.samples)
+        self.eventStore.put(event)
+
+    def capture(self, totalWritten, final=False):
+        """Copy the windows of events whose samples after the start have all
+        been received, or if final of every event still waiting, from the
+        sample store.
+
+        Events whose window was overwritten while being copied are tried
+        again on the next pass, until the sample store no longer holds their
+        start.
+        """
+        pending = []
+        for id in self.pendingCaptures:
+            event = self.eventStore.get(id)
+            if event is None:
+                continue  # dropped from the store already
+            if event.startIndex < self.store.oldestIndex:
+                continue  # overwritten before it could be copied
+            if totalWritten < event.startIndex + self.postSamples and not final:
+                pending.append(id)
+                continue
+            windowStart = max(event.windowStart, self.store.oldestIndex)
+            samples = self.store.snapshot(windowStart, min(event.startIndex + self.postSamples, totalWritten))
+            if samples is None:
+                pending.append(id)
+                continue
+            event = self.eventStore.get(id) or event  # may have ended meanwhile
+            self.eventStore.put(event._replace(windowStart=windowStart, samples=samples.astype(np.float32)))
+        self.pendingCaptures = [] if final else pending
+
+
+class CapturedWindow:
+    """The samples captured around an event, browsed in history mode like a
+    recording.
+    """
+    def __init__(self, event, decimationFactor=4) -> None:
+        nChannels, nSamples = event.samples.shape
+        self.store = RingBuffer(nChannels, max(nSamples, 1))
+        self.store.totalWritten = self.store.writeEnd = event.windowStart
+        self.store.write(event.samples.astype(np.float64))
+        self.pyramid = MinMaxPyramid(self.store, decimationFactor)
+        self.pyramid.update()
+
+        self.firstIndex = event.windowStart
+        self.endIndex = event.windowStart + nSamples
+
+    def query(self, channel, start, stop, nPoints):
+        return self.pyramid.query(channel, start, stop, nPoints)
+
+    def stats(self, start, stop):
+        return self.pyramid.stats(start, stop)
+
+    def read(self, start, stop):
+        return self.store.read(start, stop)
+
+    def close(self):
+        pass
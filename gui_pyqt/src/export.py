@@ -0,0 +1,166 @@
+"""Export of ranges of samples to CSV, NPZ and Parquet files.
+
+Samples are written block by block as they are read, so a range of a
+recording much larger than the available RAM can be exported. The format
+is chosen by the extension of the file:
+
+    .csv      one row per sample: index, time and one column per channel
+    .npz      arrays "index", "time" and "samples" (one row per sample, one
+              column per channel) and "names", readable with numpy.load
+    .parquet  the columns of the CSV, one row group per block. Needs the
+              optional pyarrow package.
+
+index is the absolute sample index and time the seconds since the first
+sample of the source, as on the x axis of the plot.
+
+Usage:
+    python export.py RECORDING OUTPUT [--start 10] [--stop 20]
+"""
+# Standard library imports
+import argparse
+import os
+import zipfile
+
+# Third-party library imports
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None  # Parquet export unavailable
+
+# Local application imports
+from recorder import RecordingReader
+
+EXPORT_FORMATS = (".csv", ".npz", ".parquet")
+
+
+class ExportError(Exception):
+    """Raised when samples cannot be exported in the format asked for."""
+
+
+def recordingBlocks(reader, start, stop):
+    """Return (firstIndex, block) for the samples of a RecordingReader in
+    the absolute range [start, stop), with a memory-mapped view of each
+    chunk, so nothing is read until the block is written. Ranges lost to
+    dropped chunks are skipped.
+    """
+    start = max(int(start), reader.firstIndex)
+    stop = min(int(stop), reader.endIndex)
+    if stop <= start:
+        return []
+
+    blocks = []
+    for i in range(reader.findChunk(start), reader.findChunk(stop - 1) + 1):
+        chunkStart = int(reader.firstIndexes[i])
+        begin = max(start - chunkStart, 0)
+        end = min(stop - chunkStart, int(reader.sampleCounts[i]))
+        if end > begin:
+            blocks.append((chunkStart + begin, reader.chunk(i)[:, begin:end]))
+    return blocks
+
+
+def exportSamples(path, blocks, names, samplePeriod):
+    """Write the samples of the channels in names, given as a list of
+    (firstIndex, block) with blocks of shape (nChannels, n), to path.
+    Returns the number of samples written.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return exportCsv(path, blocks, names, samplePeriod)
+    if extension == ".npz":
+        return exportNpz(path, blocks, names, samplePeriod)
+    if extension == ".parquet":
+        return exportParquet(path, blocks, names, samplePeriod)
+    raise ExportError(f"Unknown export format {extension!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+
+
+def exportCsv(path, blocks, names, samplePeriod):
+    nWritten = 0
+    with open(path, "w", newline="") as f:
+        f.write(",".join(["index", "time"] + list(names)) + "\n")
+        for firstIndex, block in blocks:
+            indexes = np.arange(firstIndex, firstIndex + block.shape[1])
+            rows = np.vstack((indexes, indexes * samplePeriod, block)).T
+            np.savetxt(f, rows, fmt=["%d", "%.9g"] + ["%.17g"] * len(names), delimiter=",")
+            nWritten += block.shape[1]
+    return nWritten
+
+
+def exportNpz(path, blocks, names, samplePeriod):
+    """Stream the samples into the .npy members of the archive, whose
+    shapes are known up front from the sizes of the blocks.
+    """
+    nSamples = sum(block.shape[1] for _, block in blocks)
+    indexes = np.concatenate(
+        [np.arange(firstIndex, firstIndex + block.shape[1]) for firstIndex, block in blocks]
+        + [np.empty(0, dtype=np.int64)]
+    )
+    with zipfile.ZipFile(path, "w", allowZip64=True) as archive:
+        with archive.open("samples.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array_header_1_0(
+                f, {"descr": "<f8", "fortran_order": False, "shape": (nSamples, len(names))}
+            )
+            for _, block in blocks:
+                f.write(np.ascontiguousarray(block.T, dtype="<f8").tobytes())
+
+        for name, array in (("index", indexes), ("time", indexes * samplePeriod), ("names", np.array(names))):
+            with archive.open(f"{name}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+    return nSamples
+
+
+def exportParquet(path, blocks, names, samplePeriod):
+    if pyarrow is None:
+        raise ExportError("Parquet export needs the pyarrow package")
+
+    schema = pyarrow.schema(
+        [("index", pyarrow.int64()), ("time", pyarrow.float64())]
+        + [(name, pyarrow.float64()) for name in names]
+    )
+    nWritten = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for firstIndex, block in blocks:
+            indexes = np.arange(firstIndex, firstIndex + block.shape[1], dtype=np.int64)
+            writer.write_table(
+                pyarrow.Table.from_arrays(
+                    [indexes, indexes * samplePeriod] + [np.ascontiguousarray(row) for row in block],
+                    schema=schema
+                )
+            )
+            nWritten += block.shape[1]
+    return nWritten
+
+
+def channelNames(reader):
+    """Return the names of the channels of a recording."""
+    if reader.schema is not None:
+        return list(reader.schema.names)
+    return [f"channel{n}" for n in range(reader.nChannels)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a range of a recording")
+    parser.add_argument("recording", help="recording file (.gptrec)")
+    parser.add_argument("output", help=f"file to export to, ending in {', '.join(EXPORT_FORMATS)}")
+    parser.add_argument("--start", type=float, default=None,
+                        help="seconds from the start of the recording to export from")
+    parser.add_argument("--stop", type=float, default=None,
+                        help="seconds from the start of the recording to export to")
+    args = parser.parse_args()
+
+    reader = RecordingReader(args.recording)
+    start = reader.firstIndex if args.start is None else reader.firstIndex + round(args.start / reader.samplePeriod)
+    stop = reader.endIndex if args.stop is None else reader.firstIndex + round(args.stop / reader.samplePeriod)
+    try:
+        nSamples = exportSamples(
+            args.output, recordingBlocks(reader, start, stop), channelNames(reader), reader.samplePeriod
+        )
+    except ExportError as e:
+        parser.error(str(e))
+    print(f"Exported {nSamples} samples to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Run the acquisition pipeline without a GUI.
+
+Clients are received, triggered, measured and optionally recorded exactly
+as in the GUI, and pipeline statistics are printed periodically. Together
+with simulator.py this gives a reproducible benchmark of the maximum
+sustained sample rate and latency of the pipeline.
+
+Latency is the age of the most recent sample, taken from the
+time.monotonic() timestamp that simulator.py puts in the debug channel.
+
+Usage:
+    python headless.py [--protocol legacy|framed] [--duration 60] [--record]
+                       [--metrics metrics.csv] [--interval 1]
+"""
+# Standard library imports
+import argparse
+import json
+import threading
+import time
+
+# Local application imports
+import protocol
+import settings
+from instrumentation import LatencyHistogram
+from server import TcpServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless General Power Theory acquisition server")
+    parser.add_argument("--protocol", choices=(protocol.LEGACY_MODE, protocol.FRAMED_MODE),
+                        default=settings.protocolMode)
+    parser.add_argument("--duration", type=float, default=None,
+                        help="seconds to run for. Runs until interrupted if not given.")
+    parser.add_argument("--record", action="store_true", help="record every source to disk")
+    parser.add_argument("--metrics", default=settings.metricsDumpPath,
+                        help="file metrics are appended to, as CSV if it ends in .csv else JSON lines")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between printed statistics")
+    args = parser.parse_args()
+
+    settings.protocolMode = args.protocol
+    settings.recordingEnabled = args.record
+    settings.metricsDumpPath = args.metrics
+
+    server = TcpServer([0.0] * protocol.N_CONTROL_INPUTS)
+    serverThread = threading.Thread(target=server.runServer, name="TcpServer", daemon=True)
+    serverThread.start()
+    print(f"Listening on {settings.HOST}:{settings.PORT} ({args.protocol} protocol)")
+
+    latencies = {}  # LatencyHistogram of each session
+    start = time.monotonic()
+    lastPrint = start
+    try:
+        while args.duration is None or time.monotonic() - start < args.duration:
+            time.sleep(0.01)
+            now = time.monotonic()
+            for name, session in list(server.sessions.items()):
+                debug = session.schema.index.get("debug")
+                if not session.connected or not session.sampleStore.totalWritten or debug is None:
+                    continue
+                age = now - session.sampleStore.latest()[debug]
+                if 0 <= age < 60:  # debug channel holds timestamps
+                    latencies.setdefault(name, LatencyHistogram()).record(int(age * 1e9))
+
+            if now - lastPrint >= args.interval:
+                lastPrint = now
+                for name, summary in server.metricsSummaries().items():
+                    print(formatLine(name, summary, latencies.get(name)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stopServer()
+        serverThread.join(2)
+
+    for name, summary in server.metricsSummaries().items():
+        if name in latencies:
+            summary.update(
+                {f"latency_{key}": value for key, value in latencies[name].summary().items()}
+            )
+        print(json.dumps({"source": name, **summary}, indent=2))
+
+
+def formatLine(name, summary, latency):
+    """Return one line of statistics of a source."""
+    line = (
+        f"{name}: {summary['samples']} samples  {summary['samples_per_s']:,.0f} samples/s  "
+        f"{summary['bytes_per_s'] / 1e6:.2f} MB/s  gaps {summary['sequence_gaps']}  "
+        f"decode p99 {summary['decode_p99_us']:.0f} us"
+    )
+    if latency is not None and latency.count:
+        line += (
+            f"  latency p50 {latency.percentile(0.5) / 1e6:.2f} ms"
+            f"  p99 {latency.percentile(0.99) / 1e6:.2f} ms"
+        )
+    return line
+
+
+if __name__ == "__main__":
+    main()
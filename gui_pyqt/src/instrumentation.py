@@ -0,0 +1,233 @@
+"""Instrumentation of the acquisition and plotting pipeline.
+
+Durations are recorded in nanoseconds into histograms with power of two
+buckets, so recording is a couple of integer operations and the memory
+used is fixed. Each histogram has a single writer thread. Readers on other
+threads may see a histogram mid-update, which only skews statistics by one
+recording.
+"""
+# Standard library imports
+import csv
+import json
+import os
+import threading
+import time
+
+N_BUCKETS = 48  # bucket k counts durations d with d.bit_length() == k, so up to ~39 hours
+
+
+class LatencyHistogram:
+    """Histogram of durations with power of two buckets."""
+    def __init__(self) -> None:
+        self.buckets = [0] * N_BUCKETS
+        self.count = 0
+        self.totalNs = 0
+        self.maxNs = 0
+
+    def record(self, ns):
+        """Record a duration in nanoseconds."""
+        self.buckets[min(ns.bit_length(), N_BUCKETS - 1)] += 1
+        self.count += 1
+        self.totalNs += ns
+        if ns > self.maxNs:
+            self.maxNs = ns
+
+    def percentile(self, fraction):
+        """Return an upper bound in nanoseconds of the given fraction of
+        durations.
+        """
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        cumulative = 0
+        for k, n in enumerate(self.buckets):
+            cumulative += n
+            if cumulative >= target:
+                return min(1 << k, self.maxNs)
+        return self.maxNs
+
+    def summary(self):
+        """Return count and mean, median, 99th percentile and maximum in
+        microseconds.
+        """
+        return {
+            "count": self.count,
+            "mean_us": self.totalNs / self.count / 1000 if self.count else 0.0,
+            "p50_us": self.percentile(0.5) / 1000,
+            "p99_us": self.percentile(0.99) / 1000,
+            "max_us": self.maxNs / 1000,
+        }
+
+
+class PipelineMetrics:
+    """Counters and latency histograms of one acquisition session.
+
+    Receive, decode, write and trigger times are recorded by the acquisition
+    thread. Plot frame and snapshot times are recorded by the GUI thread.
+    Rates are averaged over about a second and updated both when data
+    arrives and when a summary is taken, so they fall to zero when data
+    stops arriving. The first window starts when data first arrives after
+    the client attached, so idle time before is not averaged in, and rates
+    are zero until it has elapsed.
+    """
+    histogramNames = ("receive", "decode", "write", "trigger", "plotFrame", "snapshot")
+
+    def __init__(self) -> None:
+        self.histograms = {name: LatencyHistogram() for name in self.histogramNames}
+
+        self.samples = 0  # samples received
+        self.bytes = 0  # bytes received
+        self.frames = 0  # framed protocol frames received
+        self.sequenceGaps = 0  # discontinuities in frame sequence numbers
+        self.lostFrames = 0  # frames missing according to sequence numbers
+        self.nextSequence = None  # sequence number expected of the next frame
+
+        self.samplesPerSecond = 0.0
+        self.bytesPerSecond = 0.0
+        self.rateStart = None  # start of the rate window, None until data arrives
+        self.rateSamples = 0
+        self.rateBytes = 0
+
+    def record(self, name, ns):
+        """Record a duration in nanoseconds in the named histogram."""
+        self.histograms[name].record(ns)
+
+    def addReceived(self, nSamples, nBytes):
+        """Count received samples and bytes and update the rates."""
+        self.samples += nSamples
+        self.bytes += nBytes
+        if self.rateStart is None:
+            self.startRates()
+        else:
+            self.updateRates()
+
+    def startRates(self):
+        """Start a rate window now, from the samples and bytes counted so far."""
+        self.rateStart = time.perf_counter()
+        self.rateSamples = self.samples
+        self.rateBytes = self.bytes
+
+    def resetRates(self):
+        """Zero the rates and start the next window when data next arrives,
+        e.g. when a client attaches.
+        """
+        self.rateStart = None
+        self.samplesPerSecond = 0.0
+        self.bytesPerSecond = 0.0
+
+    def updateRates(self):
+        """Update the rates if a second has passed since the last update."""
+        if self.rateStart is None:
+            return
+        now = time.perf_counter()
+        elapsed = now - self.rateStart
+        if elapsed >= 1.0:
+            self.samplesPerSecond = (self.samples - self.rateSamples) / elapsed
+            self.bytesPerSecond = (self.bytes - self.rateBytes) / elapsed
+            self.rateStart = now
+            self.rateSamples = self.samples
+            self.rateBytes = self.bytes
+
+    def checkSequence(self, sequence):
+        """Count a frame and detect gaps in sequence numbers."""
+        self.frames += 1
+        if self.nextSequence is not None and sequence != self.nextSequence:
+            self.sequenceGaps += 1
+            self.lostFrames += (sequence - self.nextSequence) & 0xFFFFFFFF
+        self.nextSequence = (sequence + 1) & 0xFFFFFFFF
+
+    def summary(self):
+        """Return all counters, rates and histogram summaries in a flat
+        dictionary.
+        """
+        self.updateRates()
+        summary = {
+            "samples": self.samples,
+            "bytes": self.bytes,
+            "frames": self.frames,
+            "sequence_gaps": self.sequenceGaps,
+            "lost_frames": self.lostFrames,
+            "samples_per_s": self.samplesPerSecond,
+            "bytes_per_s": self.bytesPerSecond,
+        }
+        for name, histogram in self.histograms.items():
+            for key, value in histogram.summary().items():
+                summary[f"{name}_{key}"] = value
+        return summary
+
+
+def formatSummary(summary):
+    """Return a summary as lines of text for display."""
+    lines = [
+        f"{summary['samples_per_s']:,.0f} samples/s  {summary['bytes_per_s'] / 1e6:.2f} MB/s",
+        f"{summary['frames']} frames  {summary['sequence_gaps']} gaps  "
+        f"{summary['lost_frames']} lost",
+        f"snapshot retries {summary.get('snapshot_retries', 0)}",
+    ]
+    for name in PipelineMetrics.histogramNames:
+        lines.append(
+            f"{name:<10}p50 {summary[f'{name}_p50_us']:>9.1f} us  "
+            f"p99 {summary[f'{name}_p99_us']:>9.1f} us  max {summary[f'{name}_max_us']:>9.1f} us"
+        )
+    return "\n".join(lines)
+
+
+class MetricsDump:
+    """Periodically append metrics summaries to a file from a worker thread.
+
+    Files ending in .csv get one row per source per dump. Any other file
+    gets one JSON object per line.
+    """
+    def __init__(self, path, summaries, interval=10.0) -> None:
+        self.path = path
+        self.summaries = summaries  # callable returning {source name: summary}
+        self.interval = interval
+        self.csv = path.lower().endswith(".csv")
+        self.csvFields = None
+
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start dumping metrics on a worker thread."""
+        if self.thread is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name="MetricsDump", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Write a final dump and stop the worker thread."""
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.dump()
+        self.dump()
+
+    def dump(self):
+        """Append the current summaries of all sources to the file."""
+        timestamp = time.time()
+        rows = [
+            dict(time=timestamp, source=name, **summary)
+            for name, summary in self.summaries().items()
+        ]
+        if not rows:
+            return
+
+        with open(self.path, "a", newline="") as f:
+            if not self.csv:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+                return
+
+            if self.csvFields is None:
+                self.csvFields = list(rows[0])
+                if f.tell() == 0:
+                    csv.writer(f).writerow(self.csvFields)
+            writer = csv.DictWriter(f, self.csvFields, extrasaction="ignore")
+            writer.writerows(rows)
@@ -1,23 +1,52 @@
 """Graphical User Interface implementation for General Power Theory."""
 
 # Standard library imports
+from collections import namedtuple
+import multiprocessing
 import sys
+import threading
+import time
 
 # Third-party library imports
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import QThread, QTimer
-from PyQt5.QtWidgets import QApplication, QMainWindow
-from PyQt5 import uic
+from PyQt5.QtWidgets import (
+    QActionGroup, QApplication, QCheckBox, QDockWidget, QFileDialog, QInputDialog, QLabel, QListWidget,
+    QListWidgetItem, QMainWindow, QMessageBox
+)
 
 import pyqtgraph as pg
-from pyqtgraph import PlotWidget
 
 import numpy as np
 
 # Local application imports
+import protocol
+import rendering
+import sessioncache
 import settings
-
+import trigger
+import uicache
+
+from acquisition import AcquisitionProxy
+from events import CapturedWindow
+from export import EXPORT_FORMATS, ExportError, channelNames, exportSamples, recordingBlocks
+from instrumentation import formatSummary
+from recorder import RecordingError, RecordingReader
+from replay import REPLAY_SPEEDS, replayClient
+from scheduler import FrameScheduler
+from schema import CURRENT_GROUP, VOLTAGE_GROUP
 from server import TcpServer
+from spectrum import SpectrumAnalyser
+from stripchart import StripChart
+
+# Describes the channel plotted by a line for a plot type
+LineDescriptor = namedtuple(
+    "LineDescriptor",
+    ["lineIndex", "line", "checkBox", "channelName", "storeIndex", "triggerIndex"],
+)
+
+# History sources with samples of their own, browsed instead of the live sample store
+SAVED_SOURCES = (RecordingReader, CapturedWindow)
 
 __author__ = "Thomas Gwasira"
 __date__ = "March 2022"
@@ -30,31 +59,34 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__()
 
-        # Load QtDesigner file
-        uic.loadUi("gpt_gui.ui", self)
+        # Load QtDesigner file, compiled to a module on first load
+        uicache.loadUi("gpt_gui.ui", self)
 
         # ----------
         # Plot setup
         # ----------
+        self.renderMode = rendering.applyRenderMode(self.plotGraphicsView, settings.renderMode)
         self.plotGraphicsView.setBackground(settings.plotBackground)
         self.plotGraphicsView.showGrid(x=True, y=True)
-        self.line1 = self.plotGraphicsView.plot(
-            [],
-            [],
-            skipFiniteCheck=True,
-            pen=pg.mkPen(settings.line1Color, width=settings.penWidth),
-        )
-        self.line2 = self.plotGraphicsView.plot(
-            [],
-            [],
-            skipFiniteCheck=True,
-            pen=pg.mkPen(settings.line2Color, width=settings.penWidth),
-        )
-        self.line3 = self.plotGraphicsView.plot(
-            [],
-            [],
-            skipFiniteCheck=True,
-            pen=pg.mkPen(settings.line3Color, width=settings.penWidth),
+
+        # Lines and their check boxes are created for the channel schema of the
+        # plotted source by buildLines, one per channel of the largest group
+        self.lines = []
+        self.lineCheckBoxes = []
+        self.schema = None  # schema the lines were built for
+
+        # Channel group plotted by the lines for every plot type
+        self.lineGroups = {
+            settings.vComboBoxIndex: VOLTAGE_GROUP,
+            settings.iComboBoxIndex: CURRENT_GROUP,
+            settings.vSpectrumComboBoxIndex: VOLTAGE_GROUP,
+            settings.iSpectrumComboBoxIndex: CURRENT_GROUP,
+        }
+        self.spectrumPlotTypes = (settings.vSpectrumComboBoxIndex, settings.iSpectrumComboBoxIndex)
+
+        # Re-fetch history at the right resolution when panning or zooming
+        self.plotGraphicsView.getViewBox().sigXRangeChanged.connect(
+            self.onHistoryRangeChanged
         )
 
         # Disable autorange which causes the view to automatically auto-range whenever
@@ -70,14 +102,33 @@ class MainWindow(QMainWindow):
         # QThread setup
         # -------------
         # Create worker objects
-        self.server = TcpServer(
-                                inputGroup1DoubleSpinBox_1=self.inputGroup1DoubleSpinBox_1,
-                                inputGroup1DoubleSpinBox_2=self.inputGroup1DoubleSpinBox_2,
-                                inputGroup1DoubleSpinBox_3=self.inputGroup1DoubleSpinBox_3,
-                                inputGroup2DoubleSpinBox_1=self.inputGroup2DoubleSpinBox_1,
-                                inputGroup2DoubleSpinBox_2=self.inputGroup2DoubleSpinBox_2,
-                                inputGroup2DoubleSpinBox_3=self.inputGroup2DoubleSpinBox_3
-                            )
+        controlSpinBoxes = (
+            self.inputGroup1DoubleSpinBox_1,
+            self.inputGroup1DoubleSpinBox_2,
+            self.inputGroup1DoubleSpinBox_3,
+            self.inputGroup2DoubleSpinBox_1,
+            self.inputGroup2DoubleSpinBox_2,
+            self.inputGroup2DoubleSpinBox_3
+        )
+        # Acquisition runs on the receive thread, or in a separate process
+        # with the server accessed through a proxy
+        controlInputs = [spinBox.value() for spinBox in controlSpinBoxes]
+        if settings.acquisitionMode == "process":
+            self.server = AcquisitionProxy(controlInputs)
+        else:
+            self.server = TcpServer(controlInputs)
+
+        # Samples and view saved by the previous run
+        self.sessionCache = sessioncache.load() if settings.sessionCacheEnabled else None
+        if self.sessionCache is not None:
+            self.server.restoreSessions(self.sessionCache)
+
+        # Control inputs are posted to the server when they change, so the
+        # server never reads the spin boxes
+        for index, spinBox in enumerate(controlSpinBoxes):
+            spinBox.valueChanged.connect(
+                lambda value, index=index: self.server.postControl(index, value)
+            )
 
         # Create QThread objects
         self.receiveThread = QThread()
@@ -91,297 +142,793 @@ class MainWindow(QMainWindow):
         # Start threads
         self.receiveThread.start()
 
+        # Spectra of all phase channels, updated while a spectrum plot type is selected
+        self.spectrumAnalyser = SpectrumAnalyser(
+            self.server.sampleStore,
+            self.server.trigger.channels,
+            settings.axisScalingFactor,
+            fftSize=settings.fftSize,
+            overlap=settings.spectrumOverlap,
+            window=settings.spectrumWindow,
+            averaging=settings.spectrumAveraging,
+            maxFrames=settings.maxSpectrumFrames
+        )
+
         # ------------
         # QTimer setup
         # ------------
         # Create timers
         self.plotTimer = QTimer()
         self.measurementsTimer = QTimer()
+        self.statsTimer = QTimer()
+        self.eventsTimer = QTimer()
+
+        # The plot timer is driven by a scheduler which adapts its interval to
+        # the time taken to plot and skips frames when no new data has arrived
+        self.plotScheduler = FrameScheduler(
+            self.plotTimer,
+            self.drawFrame,
+            lambda: self.server.latestFrame.endIndex,
+            settings.plotRefreshRate,
+            settings.targetPlotInterval,
+            settings.maxPlotInterval,
+            settings.plotCpuCeiling
+        )
 
         # Connect timer signals
-        self.plotTimer.timeout.connect(self.updatePlot)
         self.measurementsTimer.timeout.connect(self.updateMeasurements)
+        self.statsTimer.timeout.connect(self.updateStatsOverlay)
+        self.eventsTimer.timeout.connect(self.updateEvents)
 
         # Start timers
-        self.plotTimer.start(settings.plotRefreshRate)
+        self.plotScheduler.start()
         self.measurementsTimer.start(settings.measurementsRefreshRate)
+        self.eventsTimer.start(settings.eventsRefreshRate)
+
+        # Redraw when what is plotted changes even if no new data arrives
+        self.plotTypeComboBox.currentIndexChanged.connect(self.plotScheduler.requestFrame)
+        self.historyButton.toggled.connect(self.plotScheduler.requestFrame)
+        self.rollButton.toggled.connect(self.plotScheduler.requestFrame)
+
+        # Report achieved frame rate
+        self.frameRateLabel = QLabel()
+        self.statusbar.addPermanentWidget(self.frameRateLabel)
+        self.plotScheduler.statsChanged.connect(self.onPlotStatsChanged)
+
+        # Source of data plotted in history mode. Either the min/max pyramid of
+        # the live sample store, an opened recording or the samples captured
+        # around an event.
+        self.historySource = self.server.historyPyramid
+
+        # Min/max columns of the plotted session scrolled through in roll
+        # mode, created when roll mode is entered
+        self.stripChart = None
 
         # ----------------------
         # Widget initialisations
         # ----------------------
+        self.buildLines()
         self.onPlotTypeComboBoxSelect(self.plotTypeComboBox.currentIndex())
 
+        # Pipeline statistics shown over the plot by the plot info button
+        self.statsOverlay = QLabel(self.plotGraphicsView)
+        self.statsOverlay.setStyleSheet(
+            "background-color: rgba(255, 255, 255, 200); font-family: monospace; padding: 4px;"
+        )
+        self.statsOverlay.move(60, 10)
+        self.statsOverlay.setHidden(True)
+
+        # Measurement cursors shown by the cursors button, with a readout of
+        # the samples between them
+        self.cursors = [
+            pg.InfiniteLine(
+                movable=True, pen=pg.mkPen(settings.cursorColor, style=QtCore.Qt.DashLine)
+            )
+            for _ in range(2)
+        ]
+        for cursor in self.cursors:
+            cursor.sigPositionChanged.connect(self.updateCursorReadout)
+        self.cursorReadout = QLabel(self.plotGraphicsView)
+        self.cursorReadout.setStyleSheet(self.statsOverlay.styleSheet())
+        self.cursorReadout.setHidden(True)
+
+        # Power quality events of every source, newest first. Clicking one
+        # browses its samples in history mode.
+        self.eventsList = QListWidget()
+        self.eventsList.setStyleSheet("font-family: monospace;")
+        self.eventsList.itemClicked.connect(self.onEventClicked)
+        self.eventsDock = QDockWidget("Events", self)
+        self.eventsDock.setObjectName("eventsDock")
+        self.eventsDock.setWidget(self.eventsList)
+        self.addDockWidget(QtCore.Qt.BottomDockWidgetArea, self.eventsDock)
+        self.eventRevisions = None  # event stores and revisions of the sources listed
+
         # Hide plot measurements
         self.channel1Measurements.setHidden(True)
         self.channel2Measurements.setHidden(True)
         self.channel3Measurements.setHidden(True)
 
+        # ----------
+        # Menu setup
+        # ----------
+        fileMenu = self.menubar.addMenu("&File")
+        self.recordAction = fileMenu.addAction("&Record")
+        self.recordAction.setCheckable(True)
+        self.recordAction.toggled.connect(self.onRecordActionToggled)
+        fileMenu.addSeparator()
+        fileMenu.addAction("&Open recording...").triggered.connect(self.onOpenRecording)
+        fileMenu.addAction("&Close recording").triggered.connect(self.onCloseRecording)
+        fileMenu.addAction("Re&play recording...").triggered.connect(self.onReplayRecording)
+        fileMenu.addAction("&Export...").triggered.connect(self.onExport)
+
+        viewMenu = self.menubar.addMenu("&View")
+        viewMenu.addAction(self.eventsDock.toggleViewAction())
+
+        triggerMenu = self.menubar.addMenu("&Trigger")
+        triggerModeGroup = QActionGroup(self)
+        for mode in (trigger.AUTO_MODE, trigger.NORMAL_MODE, trigger.SINGLE_MODE):
+            action = triggerMenu.addAction(mode.capitalize())
+            action.setCheckable(True)
+            action.setChecked(mode == self.server.triggerMode)
+            action.triggered.connect(lambda checked, mode=mode: self.server.setTriggerMode(mode))
+            triggerModeGroup.addAction(action)
+        triggerMenu.addSeparator()
+        triggerSlopeGroup = QActionGroup(self)
+        for slope in (trigger.RISING_SLOPE, trigger.FALLING_SLOPE):
+            action = triggerMenu.addAction(f"{slope.capitalize()} edge")
+            action.setCheckable(True)
+            action.setChecked(slope == self.server.triggerSlope)
+            action.triggered.connect(lambda checked, slope=slope: self.server.setTriggerSlope(slope))
+            triggerSlopeGroup.addAction(action)
+        triggerMenu.addSeparator()
+        triggerMenu.addAction("&Re-arm").triggered.connect(self.server.rearmTrigger)
+
+        # Data sources, listed again whenever a client connects or disconnects
+        self.sourceMenu = self.menubar.addMenu("&Source")
+        self.sourceActionGroup = QActionGroup(self)
+        self.server.sessionsChanged.connect(self.onSessionsChanged)
+        self.onSessionsChanged()
+
+        if self.sessionCache is not None:
+            self.restoreView(self.sessionCache.view)
+
+    def buildLines(self):
+        """Create the lines and check boxes for the channel schema of the
+        plotted source, and describe what each line shows for every plot
+        type.
+
+        Does nothing if the schema has not changed since the lines were
+        built.
+        """
+        schema = self.server.activeSession.schema
+        if schema == self.schema:
+            return
+        self.schema = schema
+
+        nLines = max(len(schema.group(group)) for group in set(self.lineGroups.values()))
+        while len(self.lines) < nLines:
+            lineIndex = len(self.lines)
+            self.lines.append(
+                self.plotGraphicsView.plot(
+                    [],
+                    [],
+                    skipFiniteCheck=True,
+                    pen=pg.mkPen(
+                        settings.lineColors[lineIndex % len(settings.lineColors)],
+                        width=settings.penWidth
+                    ),
+                )
+            )
+            checkBox = QCheckBox(f"Line {lineIndex + 1}")
+            checkBox.setChecked(True)
+            checkBox.toggled.connect(self.onHistoryRangeChanged)
+            checkBox.toggled.connect(self.plotScheduler.requestFrame)
+            self.verticalLayout.addWidget(checkBox, alignment=QtCore.Qt.AlignRight)
+            self.lineCheckBoxes.append(checkBox)
+        while len(self.lines) > nLines:
+            self.plotGraphicsView.removeItem(self.lines.pop())
+            checkBox = self.lineCheckBoxes.pop()
+            self.verticalLayout.removeWidget(checkBox)
+            checkBox.deleteLater()
+
+        # What each line shows for every plot type. Trigger windows are in
+        # the order of the trigger channels of the session: voltages, then
+        # currents.
+        triggerChannels = schema.group(VOLTAGE_GROUP) + schema.group(CURRENT_GROUP)
+        self.lineDescriptors = {
+            plotType: tuple(
+                LineDescriptor(
+                    lineIndex,
+                    self.lines[lineIndex],
+                    self.lineCheckBoxes[lineIndex],
+                    schema.names[channel],
+                    channel,
+                    triggerChannels.index(channel),
+                )
+                for lineIndex, channel in enumerate(schema.group(group))
+            )
+            for plotType, group in self.lineGroups.items()
+        }
+        self.renderedWindows = [None] * len(self.lines)  # (store index, window) shown by each line
+        self.spectrumAnalyser.channels = triggerChannels
+
+    def drawFrame(self):
+        """Update the plot and record how long it took."""
+        frameStart = time.perf_counter_ns()
+        self.updatePlot()
+        self.updateCursorReadout()
+        self.server.activeSession.metrics.record("plotFrame", time.perf_counter_ns() - frameStart)
+
     def updatePlot(self):
         """Update plot widget.
 
-        This method is called at regular intervals by a QTimer object.
-        
+        This method is called by the plot scheduler, at intervals adapted to
+        the time it takes, whenever new data has arrived.
+
         Data plotted for each buffer is just a slice of the buffer to reduce
         execution time of this function; hence, keeping the GUI responsive.
         Additionally, the slices are created in such a way as to implement the
         trigger function of an oscilloscope.
 
-        After every line update, a call is made to QApplication.processEvents()
-        to keep the GUI responsive.
-
-        A mutex lock is used during every line update as certain variables used
-        are shared with the server thread, therefore, this is required to prevent
-        data races.
+        All lines are updated in a single pass over the line descriptors of
+        the selected plot type, from the latest frame published by the server.
+        Samples are copied with snapshots of the sample store, so the server
+        thread is never blocked. Lines whose plotted window has not changed
+        since they were last drawn are skipped.
         """
-        # Check which plot type is selected in combo box then display the lines
-        # corresponding to selected check boxes.
-        comboBoxCurrentIndex = self.plotTypeComboBox.currentIndex()
+        if self.historyButton.isChecked():
+            return
 
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
-            if not self.historyButton.isChecked():
-                if self.line1CheckBox.isChecked():
-                    self.server.mutex.lock()
-                    self.line1.setData(
-                        self.server.v1Buffer[
-                            self.server.v1LowerLimit : self.server.v1UpperLimit
-                        ]
-                    )
-                    self.server.mutex.unlock()
-                else:
-                    self.line1.clear()
-                QApplication.processEvents()
-
-            if not self.historyButton.isChecked():
-                if self.line2CheckBox.isChecked():
-                    self.server.mutex.lock()
-                    self.line2.setData(
-                        self.server.v2Buffer[
-                            self.server.v2LowerLimit : self.server.v2UpperLimit
-                        ]
-                    )
-                    self.server.mutex.unlock()
-                else:
-                    self.line2.clear()
-                QApplication.processEvents()
-
-            if not self.historyButton.isChecked():
-                if self.line3CheckBox.isChecked():
-                    self.server.mutex.lock()
-                    self.line3.setData(
-                        self.server.v3Buffer[
-                            self.server.v3LowerLimit : self.server.v3UpperLimit
-                        ]
-                    )
-                    self.server.mutex.unlock()
-                else:
-                    self.line3.clear()
-                QApplication.processEvents()
-
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            if not self.historyButton.isChecked():
-                if self.line1CheckBox.isChecked():
-                    self.server.mutex.lock()
-                    self.line1.setData(
-                        self.server.i1Buffer[
-                            self.server.i1LowerLimit : self.server.i1UpperLimit
-                        ]
-                    )
-                    self.server.mutex.unlock()
-                else:
-                    self.line1.clear()
-                QApplication.processEvents()
-
-            if not self.historyButton.isChecked():
-                if self.line2CheckBox.isChecked():
-                    self.server.mutex.lock()
-                    self.line2.setData(
-                        self.server.i2Buffer[
-                            self.server.i2LowerLimit : self.server.i2UpperLimit
-                        ]
-                    )
-                    self.server.mutex.unlock()
-                else:
-                    self.line2.clear()
-                QApplication.processEvents()
-
-            if not self.historyButton.isChecked():
-                if self.line3CheckBox.isChecked():
-                    self.server.mutex.lock()
-                    self.line3.setData(
-                        self.server.i3Buffer[
-                            self.server.i3LowerLimit : self.server.i3UpperLimit
-                        ]
-                    )
-                    self.server.mutex.unlock()
-                else:
-                    self.line3.clear()
-                QApplication.processEvents()
+        if self.plotTypeComboBox.currentIndex() in self.spectrumPlotTypes:
+            self.updateSpectrumPlot()
+            return
+
+        if self.rollButton.isChecked():
+            self.updateRollPlot()
+            return
+
+        frame = self.server.latestFrame
+        store = self.server.sampleStore
+
+        for descriptor in self.lineDescriptors[self.plotTypeComboBox.currentIndex()]:
+            if not descriptor.checkBox.isChecked():
+                if self.renderedWindows[descriptor.lineIndex] is not None:
+                    descriptor.line.clear()
+                    self.renderedWindows[descriptor.lineIndex] = None
+                continue
+
+            window = frame.windows[descriptor.triggerIndex]
+            renderedWindow = (descriptor.storeIndex, window)
+            if self.renderedWindows[descriptor.lineIndex] == renderedWindow:
+                continue  # already showing these samples
+
+            snapshotStart = time.perf_counter_ns()
+            data = store.snapshot(*window, descriptor.storeIndex)
+            self.server.activeSession.metrics.record("snapshot", time.perf_counter_ns() - snapshotStart)
+            if data is None:
+                continue  # overwritten while copying, try again next time
+
+            descriptor.line.setData(data)
+            self.renderedWindows[descriptor.lineIndex] = renderedWindow
+
+    def updateSpectrumPlot(self):
+        """Plot the spectra of the selected lines.
+
+        Only frames completed since the last refresh are transformed, and
+        lines are only redrawn when their spectrum has changed.
+        """
+        analyser = self.spectrumAnalyser
+        analyser.update()
+
+        for descriptor in self.lineDescriptors[self.plotTypeComboBox.currentIndex()]:
+            if not descriptor.checkBox.isChecked():
+                if self.renderedWindows[descriptor.lineIndex] is not None:
+                    descriptor.line.clear()
+                    self.renderedWindows[descriptor.lineIndex] = None
+                continue
+
+            renderedSpectrum = (descriptor.storeIndex, ("spectrum", analyser.frameCount))
+            if self.renderedWindows[descriptor.lineIndex] == renderedSpectrum:
+                continue
+
+            descriptor.line.setData(analyser.frequencies, analyser.magnitude(descriptor.storeIndex))
+            self.renderedWindows[descriptor.lineIndex] = renderedSpectrum
+
+    def updateRollPlot(self):
+        """Append the samples received since the last refresh to the strip
+        chart and scroll the plot to show the latest settings.rollSeconds.
+
+        Only the new samples are decimated, and the lines are plotted from
+        views of the fixed size buffer of the strip chart. The cursors
+        scroll along so that they stay put on the screen.
+        """
+        chart = self.stripChart
+        if chart is None or chart.store is not self.server.sampleStore:
+            chart = self.stripChart = StripChart(
+                self.server.sampleStore,
+                int(settings.rollSeconds / settings.axisScalingFactor),
+                int(self.plotGraphicsView.getViewBox().width())
+            )
+            self.clearLines()
+        previousIndex = chart.processedIndex
+        chart.update()
+
+        for descriptor in self.lineDescriptors[self.plotTypeComboBox.currentIndex()]:
+            if not descriptor.checkBox.isChecked():
+                if self.renderedWindows[descriptor.lineIndex] is not None:
+                    descriptor.line.clear()
+                    self.renderedWindows[descriptor.lineIndex] = None
+                continue
+
+            renderedColumns = (descriptor.storeIndex, ("roll", chart.processedIndex))
+            if self.renderedWindows[descriptor.lineIndex] == renderedColumns:
+                continue
+
+            descriptor.line.setData(*chart.lineData(descriptor.storeIndex))
+            self.renderedWindows[descriptor.lineIndex] = renderedColumns
+
+        self.plotGraphicsView.setXRange(
+            chart.processedIndex - chart.spanSamples, chart.processedIndex, padding=0
+        )
+        if self.cursorsButton.isChecked() and chart.processedIndex != previousIndex:
+            for cursor in self.cursors:
+                cursor.setValue(cursor.value() + chart.processedIndex - previousIndex)
+
+    def clearLines(self):
+        """Clear all lines and forget what they were showing."""
+        for line in self.lines:
+            line.clear()
+        self.renderedWindows = [None] * len(self.lines)
+
+    def onPlotStatsChanged(self, fps, droppedFrames):
+        """Display the achieved plot frame rate."""
+        self.frameRateLabel.setText(
+            f"{fps:.1f} FPS ({self.renderMode}), {droppedFrames} dropped, every {self.plotScheduler.interval:.0f} ms"
+        )
 
     def updateMeasurements(self):
-        """Update measurement labels.
+        """Update measurement labels with the latest results of the
+        measurements engine.
 
         This method is called at regular intervals by a QTimer object.
         """
         comboBoxCurrentIndex = self.plotTypeComboBox.currentIndex()
-
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
-            self.channel1Measurements.setText(f"f0_V1: {self.server.f0_V1:.3f} Hz")
-            self.channel2Measurements.setText(f"f0_V2: {self.server.f0_V2:.3f} Hz")
-            self.channel3Measurements.setText(f"f0_V3: {self.server.f0_V3:.3f} Hz")
-
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            self.channel1Measurements.setText(f"f0_I1: {self.server.f0_I1:.3f} Hz")
-            self.channel2Measurements.setText(f"f0_I2: {self.server.f0_I2:.3f} Hz")
-            self.channel3Measurements.setText(f"f0_I3: {self.server.f0_I3:.3f} Hz")
+        labels = (self.channel1Measurements, self.channel2Measurements, self.channel3Measurements)
+        names = self.schema.names
+        phases = zip(labels, self.schema.phases(), self.server.measurements.results)
+
+        if comboBoxCurrentIndex in (settings.vComboBoxIndex, settings.vSpectrumComboBoxIndex):
+            for label, (v, i), m in phases:
+                label.setText(
+                    f"{names[v]}: {m.vRms:.2f} V  f0: {m.f0V:.3f} Hz  THD: {m.thdV:.1f} %"
+                )
+
+        elif comboBoxCurrentIndex in (settings.iComboBoxIndex, settings.iSpectrumComboBoxIndex):
+            for label, (v, i), m in phases:
+                label.setText(
+                    f"{names[i]}: {m.iRms:.3f} A  f0: {m.f0I:.3f} Hz  THD: {m.thdI:.1f} %  "
+                    f"P: {m.activePower:.1f} W  PF: {m.powerFactor:.3f}"
+                )
+                label.setToolTip(
+                    f"Q: {m.reactivePower:.1f} var\nS: {m.apparentPower:.1f} VA"
+                )
 
     def onPlotTypeComboBoxSelect(self, comboBoxCurrentIndex):
         """Handle any changes that need to be done to GUI elements when a different
         plot type is selected.
+
+        Spectra are plotted against frequency in Hz, so the bottom axis is
+        not scaled and history mode is unavailable.
         """
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
-            self.line1CheckBox.setText("V1")
-            self.line2CheckBox.setText("V2")
-            self.line3CheckBox.setText("V3")
+        descriptors = self.lineDescriptors[comboBoxCurrentIndex]
+        for lineIndex, checkBox in enumerate(self.lineCheckBoxes):
+            checkBox.setVisible(lineIndex < len(descriptors))
+        for descriptor in descriptors:
+            descriptor.checkBox.setText(descriptor.channelName)
+
+        bottomAxis = self.plotGraphicsView.getAxis("bottom")
+        if comboBoxCurrentIndex in self.spectrumPlotTypes:
+            self.historyButton.setChecked(False)
+            self.historyButton.setEnabled(False)
+            self.rollButton.setChecked(False)
+            self.rollButton.setEnabled(False)
+            self.stripChart = None
+            if self.cursorsButton.isChecked():
+                self.cursorsButton.setChecked(False)
+                self.onCursorsButtonClicked(False)
+            self.cursorsButton.setEnabled(False)
+            bottomAxis.setScale(1)
+            bottomAxis.setLabel("Frequency", units="Hz")
+            self.plotGraphicsView.getAxis("left").setLabel("Magnitude", units="dB")
+        else:
+            self.historyButton.setEnabled(True)
+            self.rollButton.setEnabled(True)
+            self.cursorsButton.setEnabled(True)
+            bottomAxis.setScale(settings.axisScalingFactor)
+            bottomAxis.setLabel("")
+            self.plotGraphicsView.getAxis("left").setLabel("")
 
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            self.line1CheckBox.setText("I1")
-            self.line2CheckBox.setText("I2")
-            self.line3CheckBox.setText("I3")
+        self.clearLines()
+        self.plotGraphicsView.enableAutoRange()
 
     def onHistoryButtonClicked(self, isChecked):
         """Plot buffers in their entirety rather than just slices when the
         history button is clicked.
+
+        Only min/max summaries matching the width of the plot are plotted,
+        and they are fetched again whenever the x range changes.
         """
         if self.historyButton.isChecked():
+            self.rollButton.setChecked(False)
+            self.stripChart = None
+
             # Disable autorange before plotting
             self.plotGraphicsView.disableAutoRange()
-            
-            self.server.mutex.lock()
-            self.plotGraphicsView.setXRange(len(self.server.v1Buffer)-settings.nSamplesInView, len(self.server.v1Buffer), padding=0)
-            self.server.mutex.unlock()
+
+            endIndex = self.historySource.endIndex
+            self.plotGraphicsView.setXRange(endIndex-settings.nSamplesInView, endIndex, padding=0)
+            self.updateHistoryPlot()
         else:
             # Re-enable autorange if history button unchecked
             self.plotGraphicsView.enableAutoRange()
-            self.line1.clear()
-            self.line2.clear()
-            self.line3.clear()
+            self.clearLines()
 
-        comboBoxCurrentIndex = self.plotTypeComboBox.currentIndex()
-
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
-            if isChecked == True:
-                if self.line1CheckBox.isChecked():
-                    self.line1.setData(self.server.v1Buffer, clipToView=True)
-                else:
-                    self.line1.clear()
-                QApplication.processEvents()
-
-            if isChecked == True:
-                if self.line2CheckBox.isChecked():
-                    self.line2.setData(self.server.v2Buffer, clipToView=True)
-                else:
-                    self.line2.clear()
-                QApplication.processEvents()
-
-            if isChecked == True:
-                if self.line3CheckBox.isChecked():
-                    self.line3.setData(self.server.v3Buffer, clipToView=True)
-                else:
-                    self.line3.clear()
-                QApplication.processEvents()
-
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            if isChecked == True:
-                if self.line1CheckBox.isChecked():
-                    self.line1.setData(self.server.i1Buffer, clipToView=True)
-                else:
-                    self.line1.clear()
-                QApplication.processEvents()
-
-            if isChecked == True:
-                if self.line2CheckBox.isChecked():
-                    self.line2.setData(self.server.i2Buffer, clipToView=True)
-                else:
-                    self.line2.clear()
-                QApplication.processEvents()
-
-            if isChecked == True:
-                if self.line3CheckBox.isChecked():
-                    self.line3.setData(self.server.i3Buffer, clipToView=True)
-                else:
-                    self.line3.clear()
-                QApplication.processEvents()
-
-            # setXRange(5, 20, padding=0)
+        if self.cursorsButton.isChecked():
+            self.placeCursors()
 
         # Let updatePlot handle the else so that there is no race condition
 
-    def onLine1CheckBoxClickedHistoryPlot(self):
-        """Display or hide line 1 when in history mode and the check button
-        corresponding to the line is toggled.
-        """
-        comboBoxCurrentIndex = self.plotTypeComboBox.currentIndex()
+    def onRollButtonClicked(self, isChecked):
+        """Scroll through the latest settings.rollSeconds of samples rather
+        than plotting triggered slices when the roll button is clicked.
 
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
+        The strip chart is filled again from the samples still retained by
+        the sample store every time roll mode is entered.
+        """
+        self.stripChart = None
+        self.clearLines()
+        if isChecked:
             if self.historyButton.isChecked():
-                if self.line1CheckBox.isChecked():
-                    self.line1.setData(self.server.v1Buffer)
-                else:
-                    self.line1.clear()
-                QApplication.processEvents()
+                self.historyButton.setChecked(False)
+                self.onHistoryButtonClicked(False)
+            self.plotGraphicsView.enableAutoRange(x=False, y=True)
+            self.updateRollPlot()
+        else:
+            self.plotGraphicsView.enableAutoRange()
 
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            if self.historyButton.isChecked():
-                if self.line1CheckBox.isChecked():
-                    self.line1.setData(self.server.i1Buffer)
-                else:
-                    self.line1.clear()
-                QApplication.processEvents()
-
-    def onLine2CheckBoxClickedHistoryPlot(self):
-        """Display or hide line 2 when in history mode and the check button
-        corresponding to the line is toggled.
+        if self.cursorsButton.isChecked():
+            self.placeCursors()
+
+    def onHistoryRangeChanged(self):
+        """Fetch history data for the new x range after panning or zooming."""
+        if self.historyButton.isChecked():
+            self.updateHistoryPlot()
+
+    def updateHistoryPlot(self):
+        """Plot the part of the history in the current x range of the plot at
+        the resolution of the plot.
         """
-        comboBoxCurrentIndex = self.plotTypeComboBox.currentIndex()
+        viewBox = self.plotGraphicsView.getViewBox()
+        (xMin, xMax), _ = viewBox.viewRange()
+        nPixels = int(viewBox.width())
+
+        for descriptor in self.lineDescriptors[self.plotTypeComboBox.currentIndex()]:
+            if descriptor.checkBox.isChecked():
+                descriptor.line.setData(
+                    *self.historySource.query(
+                        descriptor.storeIndex,
+                        np.floor(xMin),
+                        np.ceil(xMax) + 1,
+                        nPixels
+                    )
+                )
+            else:
+                descriptor.line.clear()
 
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
-            if self.historyButton.isChecked():
-                if self.line2CheckBox.isChecked():
-                    self.line2.setData(self.server.v2Buffer)
-                else:
-                    self.line2.clear()
-                QApplication.processEvents()
+    def onRecordActionToggled(self, isChecked):
+        """Start or stop recording received data to disk."""
+        if isChecked:
+            path = self.server.startRecording()
+            self.statusbar.showMessage(f"Recording to {path}")
+        else:
+            self.server.stopRecording()
+            self.statusbar.showMessage("Recording stopped", 5000)
 
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            if self.historyButton.isChecked():
-                if self.line2CheckBox.isChecked():
-                    self.line2.setData(self.server.i2Buffer)
-                else:
-                    self.line2.clear()
-                QApplication.processEvents()
-
-    def onLine3CheckBoxClickedHistoryPlot(self):
-        """Display or hide line 3 when in history mode and the check button
-        corresponding to the line is toggled.
+    def onOpenRecording(self):
+        """Browse a recording in history mode."""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Open recording", settings.recordingDirectory, "Recordings (*.gptrec)"
+        )
+        if not path:
+            return
+
+        try:
+            reader = RecordingReader(path)
+        except (OSError, RecordingError) as e:
+            QMessageBox.warning(self, "Open recording", str(e))
+            return
+
+        self.onCloseRecording()
+        self.historySource = reader
+        self.statusbar.showMessage(f"Browsing {path}")
+
+        self.historyButton.setChecked(True)
+        self.onHistoryButtonClicked(True)
+        self.plotGraphicsView.setXRange(reader.firstIndex, reader.endIndex, padding=0)
+        if self.cursorsButton.isChecked():
+            self.placeCursors()
+
+    def onCloseRecording(self):
+        """Return history mode to the live sample store."""
+        if isinstance(self.historySource, SAVED_SOURCES):
+            self.historySource.close()
+            self.historySource = self.server.historyPyramid
+            self.statusbar.clearMessage()
+            self.onHistoryRangeChanged()
+
+    def onReplayRecording(self):
+        """Stream a recording to the server as a new source, at a multiple
+        of the recorded sample rate or as fast as the server accepts.
         """
-        comboBoxCurrentIndex = self.plotTypeComboBox.currentIndex()
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Replay recording", settings.recordingDirectory, "Recordings (*.gptrec)"
+        )
+        if not path:
+            return
+        speed, accepted = QInputDialog.getItem(
+            self, "Replay recording", "Speed (multiple of the recorded rate):", REPLAY_SPEEDS, 0, False
+        )
+        if not accepted:
+            return
+
+        try:
+            reader = RecordingReader(path)
+            client = replayClient(
+                reader, speed, framed=settings.protocolMode == protocol.FRAMED_MODE
+            )
+        except (OSError, RecordingError, ValueError) as e:
+            QMessageBox.warning(self, "Replay recording", str(e))
+            return
+
+        def replay():
+            try:
+                client.run(settings.HOST, settings.PORT, float("inf"))
+            except OSError as e:
+                print(f"Replay of {path} stopped: {e}")
+            finally:
+                reader.close()
+
+        threading.Thread(target=replay, name="Replay", daemon=True).start()
+        self.statusbar.showMessage(f"Replaying {path} at {speed}x", 5000)
+
+    def onExport(self):
+        """Export the samples in view in history or roll mode, else all the
+        samples of the plotted source, to CSV, NPZ or Parquet.
+        """
+        saved = isinstance(self.historySource, SAVED_SOURCES)
+        if saved:
+            start, stop = self.historySource.firstIndex, self.historySource.endIndex
+        else:
+            store = self.server.sampleStore
+            start, stop = store.oldestIndex, store.totalWritten
+        if self.historyButton.isChecked() or self.rollButton.isChecked():
+            (xMin, xMax), _ = self.plotGraphicsView.getViewBox().viewRange()
+            start, stop = max(start, int(xMin)), min(stop, int(np.ceil(xMax)))
+        if stop <= start:
+            QMessageBox.warning(self, "Export", "There are no samples to export")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export",
+            settings.recordingDirectory,
+            ";;".join(f"{extension[1:].upper()} (*{extension})" for extension in EXPORT_FORMATS)
+        )
+        if not path:
+            return
+
+        if isinstance(self.historySource, RecordingReader):
+            blocks = recordingBlocks(self.historySource, start, stop)
+            names = channelNames(self.historySource)
+        elif saved:
+            blocks = [(start, self.historySource.read(start, stop))]
+            names = list(self.server.activeSession.schema.names)
+        else:
+            block = self.server.sampleStore.snapshot(start, stop)
+            blocks = [] if block is None else [(stop - block.shape[1], block)]
+            names = list(self.server.activeSession.schema.names)
 
-        if comboBoxCurrentIndex == settings.vComboBoxIndex:
-            if self.historyButton.isChecked():
-                if self.line3CheckBox.isChecked():
-                    self.line3.setData(self.server.v3Buffer)
-                else:
-                    self.line3.clear()
-                QApplication.processEvents()
+        try:
+            nSamples = exportSamples(path, blocks, names, settings.axisScalingFactor)
+        except (OSError, ExportError) as e:
+            QMessageBox.warning(self, "Export", str(e))
+            return
+        self.statusbar.showMessage(f"Exported {nSamples} samples to {path}", 5000)
 
-        elif comboBoxCurrentIndex == settings.iComboBoxIndex:
-            if self.historyButton.isChecked():
-                if self.line3CheckBox.isChecked():
-                    self.line3.setData(self.server.i3Buffer)
-                else:
-                    self.line3.clear()
-                QApplication.processEvents()
+    def updateEvents(self):
+        """List the events of every source, newest first, if any has changed.
 
+        This method is called at regular intervals by a QTimer object.
+        """
+        sessions = list(self.server.sessions.values())
+        revisions = [(session.events, session.events.revision) for session in sessions]
+        if revisions == self.eventRevisions:
+            return
+        self.eventRevisions = revisions
+
+        selected = self.eventsList.currentItem()
+        selected = None if selected is None else selected.data(QtCore.Qt.UserRole)
+
+        events = sorted(
+            (event for session in sessions for event in session.events.events()),
+            key=lambda event: event.time,
+            reverse=True
+        )
+        self.eventsList.clear()
+        for event in events:
+            if event.stopIndex is None:
+                duration = "ongoing"
+            else:
+                duration = f"{(event.stopIndex - event.startIndex) * settings.axisScalingFactor * 1000:.0f} ms"
+            unit = f"{event.unit}/s" if event.quantity == "rate" else event.unit
+            item = QListWidgetItem(
+                f"{time.strftime('%H:%M:%S', time.localtime(event.time))}.{int(event.time % 1 * 1000):03d}  "
+                f"{event.session:<10} {event.kind:<15} {event.channel:<8} "
+                f"{event.extreme:10.2f} {unit:<5} {duration}"
+            )
+            item.setData(QtCore.Qt.UserRole, (event.session, event.id))
+            self.eventsList.addItem(item)
+            if (event.session, event.id) == selected:
+                self.eventsList.setCurrentItem(item)
+        self.eventsDock.setWindowTitle(f"Events ({len(events)})")
+
+    def onEventClicked(self, item):
+        """Browse the samples around an event in history mode, in the live
+        sample store while it still holds them, else in the samples captured
+        with the event.
+        """
+        sessionName, id = item.data(QtCore.Qt.UserRole)
+        session = self.server.sessions.get(sessionName)
+        event = None if session is None else session.events.get(id)
+        if event is None:
+            self.statusbar.showMessage("The event is no longer kept", 5000)
+            return
+
+        if event.samples is not None:
+            start, stop = event.windowStart, event.windowStart + event.samples.shape[1]
+        else:
+            start = event.windowStart
+            stop = event.startIndex + int(settings.eventPostSeconds / settings.axisScalingFactor)
+        live = session.sampleStore.oldestIndex <= start
+        if not live and event.samples is None:
+            self.statusbar.showMessage("The samples of the event are no longer kept", 5000)
+            return
+
+        if session is not self.server.activeSession:
+            self.onSourceSelected(sessionName)
+        if event.unit == "A":
+            self.plotTypeComboBox.setCurrentIndex(settings.iComboBoxIndex)
+        elif event.unit == "V" or self.plotTypeComboBox.currentIndex() in self.spectrumPlotTypes:
+            self.plotTypeComboBox.setCurrentIndex(settings.vComboBoxIndex)
+
+        self.onCloseRecording()
+        if not live:
+            self.historySource = CapturedWindow(event, settings.decimationFactor)
+        self.statusbar.showMessage(f"Browsing {event.kind} of {event.channel} in {sessionName}")
+
+        self.historyButton.setChecked(True)
+        self.onHistoryButtonClicked(True)
+        self.plotGraphicsView.setXRange(start, stop, padding=0)
+        if self.cursorsButton.isChecked():
+            self.placeCursors()
+
+    def onSessionsChanged(self):
+        """List the data sources in the source menu.
+
+        Called through a queued connection when a client connects to or
+        disconnects from the server, or when a client announces a schema
+        which replaces the samples of its session.
+        """
+        if self.server.sampleStore is not self.spectrumAnalyser.store:
+            # The plotted session has been reconfigured
+            self.onSourceSelected(self.server.activeSession.name)
+
+        self.sourceMenu.clear()
+        for name, session in list(self.server.sessions.items()):
+            if session.host is None:
+                text = f"{name} (waiting)"
+            else:
+                text = f"{name} ({session.host}{'' if session.connected else ', disconnected'})"
+            action = self.sourceMenu.addAction(text)
+            action.setCheckable(True)
+            action.setChecked(session is self.server.activeSession)
+            action.triggered.connect(lambda checked, name=name: self.onSourceSelected(name))
+            self.sourceActionGroup.addAction(action)
+
+    def onSourceSelected(self, name):
+        """Plot the data of another source."""
+        self.server.setActiveSession(name)
+        if not isinstance(self.historySource, SAVED_SOURCES):
+            self.historySource = self.server.historyPyramid
+
+        self.buildLines()
+        self.spectrumAnalyser.store = self.server.sampleStore
+        self.spectrumAnalyser.configure(
+            settings.fftSize, settings.spectrumOverlap, settings.spectrumWindow, settings.spectrumAveraging
+        )
+
+        self.recordAction.blockSignals(True)
+        self.recordAction.setChecked(self.server.activeSession.recording)
+        self.recordAction.blockSignals(False)
+
+        self.onPlotTypeComboBoxSelect(self.plotTypeComboBox.currentIndex())
+        self.onHistoryRangeChanged()
+        self.plotScheduler.requestFrame()
+
+    def closeEvent(self, event):
+        """Disconnect clients and finalise any recordings in progress before
+        closing.
+        """
+        self.server.stopServer()
+        self.receiveThread.quit()
+        self.receiveThread.wait(1000)
+
+        if settings.sessionCacheEnabled:
+            try:
+                sessioncache.save(self.server, self.viewState())
+            except OSError as e:
+                print(f"Could not save session cache: {e}")
+        super(MainWindow, self).closeEvent(event)
+
+    def viewState(self):
+        """Return what is plotted, to be restored on the next run. The x
+        range is relative to the latest sample.
+        """
+        viewBox = self.plotGraphicsView.getViewBox()
+        (xMin, xMax), (yMin, yMax) = viewBox.viewRange()
+        endIndex = self.server.historyPyramid.endIndex
+        return {
+            "plotType": self.plotTypeComboBox.currentIndex(),
+            "history": self.historyButton.isChecked() and not isinstance(self.historySource, SAVED_SOURCES),
+            "roll": self.rollButton.isChecked(),
+            "xRange": [xMin - endIndex, xMax - endIndex],
+            "yRange": [yMin, yMax],
+        }
+
+    def restoreView(self, view):
+        """Plot what was plotted when the view state was saved."""
+        self.plotTypeComboBox.setCurrentIndex(view.get("plotType", settings.vComboBoxIndex))
+        if view.get("history") and self.historyButton.isEnabled():
+            self.historyButton.setChecked(True)
+            self.onHistoryButtonClicked(True)
+            endIndex = self.historySource.endIndex
+            xMin, xMax = view["xRange"]
+            self.plotGraphicsView.setXRange(endIndex + xMin, endIndex + xMax, padding=0)
+            self.plotGraphicsView.setYRange(*view["yRange"], padding=0)
+        elif view.get("roll") and self.rollButton.isEnabled():
+            self.rollButton.setChecked(True)
+            self.onRollButtonClicked(True)
+
+    def onPlotInfoButtonClicked(self, isChecked):
+        """Display or hide pipeline statistics when the plot info button is
+        clicked.
+        """
+        self.statsOverlay.setHidden(not isChecked)
+        if isChecked:
+            self.updateStatsOverlay()
+            self.statsTimer.start(settings.statsRefreshRate)
+        else:
+            self.statsTimer.stop()
+
+    def updateStatsOverlay(self):
+        """Show the latest metrics of the plotted session.
+
+        This method is called at regular intervals by a QTimer object while
+        the overlay is shown.
+        """
+        session = self.server.activeSession
+        self.statsOverlay.setText(f"{session.name}\n{formatSummary(session.metricsSummary())}")
+        self.statsOverlay.adjustSize()
 
     def onMeasurementsButtonClicked(self, isChecked):
         """Display or hide measurements when the measurements button is
@@ -397,6 +944,95 @@ class MainWindow(QMainWindow):
             self.channel2Measurements.setHidden(True)
             self.channel3Measurements.setHidden(True)
 
+    def onCursorsButtonClicked(self, isChecked):
+        """Display or hide the measurement cursors when the cursors button is
+        clicked.
+        """
+        if isChecked:
+            self.placeCursors()
+            for cursor in self.cursors:
+                self.plotGraphicsView.addItem(cursor, ignoreBounds=True)
+            self.cursorReadout.setHidden(False)
+            self.updateCursorReadout()
+        else:
+            for cursor in self.cursors:
+                self.plotGraphicsView.removeItem(cursor)
+            self.cursorReadout.setHidden(True)
+
+    def placeCursors(self):
+        """Move the cursors to a third and two thirds of the x range.
+
+        In history and roll mode this is the visible range of absolute
+        sample indexes, otherwise the plotted window.
+        """
+        if self.historyButton.isChecked() or self.rollButton.isChecked():
+            (xMin, xMax), _ = self.plotGraphicsView.getViewBox().viewRange()
+        else:
+            xMin, xMax = 0, settings.nSamplesInView
+        for fraction, cursor in zip((1 / 3, 2 / 3), self.cursors):
+            cursor.setValue(xMin + fraction * (xMax - xMin))
+
+    def updateCursorReadout(self):
+        """Show the time between the cursors and, for every plotted line, the
+        change in value and the min, max, mean and RMS of the samples from
+        one cursor to the other.
+
+        Statistics are combined from the block summaries of the history
+        pyramid, or of the open recording in history mode, so they can be
+        updated while a cursor is dragged however many samples lie between
+        the cursors. Outside history and roll mode the cursors are positions
+        in the plotted window of each line, which moves with the trigger.
+        """
+        if not self.cursorsButton.isChecked():
+            return
+
+        history = self.historyButton.isChecked()
+        source = self.historySource if history else self.server.historyPyramid
+        absolute = history or self.rollButton.isChecked()  # cursors at absolute sample indexes
+        x1, x2 = sorted(int(round(cursor.value())) for cursor in self.cursors)
+
+        dt = (x2 - x1) * settings.axisScalingFactor
+        text = f"Δt: {pg.siFormat(dt, precision=4, suffix='s')}"
+        if dt:
+            text += f"  1/Δt: {pg.siFormat(1 / dt, precision=4, suffix='Hz')}"
+        rows = [text]
+
+        # Statistics of all channels by first sample, shared by lines with
+        # the same window
+        results = {}
+        for descriptor in self.lineDescriptors[self.plotTypeComboBox.currentIndex()]:
+            if not descriptor.checkBox.isChecked():
+                continue
+            if absolute:
+                offset = 0
+            elif self.renderedWindows[descriptor.lineIndex] is not None:
+                offset = self.renderedWindows[descriptor.lineIndex][1][0]
+            else:
+                continue  # not drawn yet
+
+            if offset not in results:
+                results[offset] = (
+                    source.stats(offset + x1, offset + x2 + 1),
+                    source.stats(offset + x1, offset + x1 + 1),
+                    source.stats(offset + x2, offset + x2 + 1),
+                )
+            stats, first, last = results[offset]
+            if stats is None:
+                continue
+
+            channel = descriptor.storeIndex
+            unit = self.schema.channels[channel].unit
+            delta = last.mean[channel] - first.mean[channel] if first and last else np.nan
+            rows.append(
+                f"{descriptor.channelName}  Δ: {delta:.3f} {unit}  "
+                f"min: {stats.min[channel]:.3f}  max: {stats.max[channel]:.3f}  "
+                f"mean: {stats.mean[channel]:.3f}  RMS: {stats.rms[channel]:.3f} {unit}"
+            )
+
+        self.cursorReadout.setText("\n".join(rows))
+        self.cursorReadout.adjustSize()
+        self.cursorReadout.move(60, self.plotGraphicsView.height() - self.cursorReadout.height() - 30)
+
     def zoomInX(self):
         """Zoom in x-axis."""
         s = settings.zoomAmount
@@ -422,6 +1058,8 @@ class MainWindow(QMainWindow):
         self.plotGraphicsView.getViewBox().scaleBy(zoom)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # for the acquisition process of frozen executables
+    rendering.prepareRendering(settings.softwareOpenGL)
     app = QApplication([])
     window = MainWindow()
     window.show()
@@ -0,0 +1,251 @@
+"""Streaming power quality measurements.
+
+Measurements are computed per cycle of each phase voltage from the samples
+in the sample store:
+
+    * RMS voltage and current
+    * active power P = mean(v * i)
+    * apparent power S = Vrms * Irms
+    * non-active (reactive) power Q = sqrt(S^2 - P^2)
+    * power factor P / S
+    * fundamental frequency f0 of every channel, from the interval between
+      rising zero crossings located by linear interpolation
+    * total harmonic distortion from a Hann windowed FFT spanning a whole
+      number of cycles
+"""
+# Standard library imports
+from collections import namedtuple
+import functools
+import threading
+
+# Third-party library imports
+import numpy as np
+
+PhaseMeasurements = namedtuple(
+    "PhaseMeasurements",
+    [
+        "vRms",
+        "iRms",
+        "activePower",
+        "reactivePower",
+        "apparentPower",
+        "powerFactor",
+        "f0V",
+        "f0I",
+        "thdV",
+        "thdI",
+    ],
+)
+PhaseMeasurements.__new__.__defaults__ = (0.0,) * len(PhaseMeasurements._fields)
+
+
+@functools.lru_cache(maxsize=16)
+def hannWindow(length):
+    """Return a cached Hann window."""
+    window = np.hanning(length)
+    window.flags.writeable = False
+    return window
+
+
+class ZeroCrossingTracker:
+    """Locate rising zero crossings of a channel across consecutive blocks."""
+    def __init__(self, minCycleSamples) -> None:
+        self.minCycleSamples = minCycleSamples
+        self.previousValue = None  # last sample of previous block
+        self.lastCrossing = None  # fractional absolute index of last accepted crossing
+        self.period = 0.0  # samples between the last two crossings
+
+    def update(self, values, firstIndex):
+        """Return the fractional absolute indexes of crossings accepted in a
+        block of values starting at firstIndex.
+        """
+        if self.previousValue is None:
+            extended = values
+            offset = firstIndex
+        else:
+            extended = np.concatenate(([self.previousValue], values))
+            offset = firstIndex - 1
+        self.previousValue = values[-1]
+
+        k = np.flatnonzero((extended[:-1] < 0) & (extended[1:] >= 0))
+        before = extended[k]
+        after = extended[k + 1]
+        crossings = offset + k + before / (before - after)
+
+        accepted = []
+        for crossing in crossings.tolist():
+            if self.lastCrossing is not None:
+                period = crossing - self.lastCrossing
+                if period < self.minCycleSamples:
+                    continue  # noise around zero
+                self.period = period
+            self.lastCrossing = crossing
+            accepted.append(crossing)
+        return accepted
+
+
+class PhaseAccumulator:
+    """Accumulate per-cycle sums of a voltage and current pair."""
+    def __init__(self, minCycleSamples) -> None:
+        self.voltageCrossings = ZeroCrossingTracker(minCycleSamples)
+        self.currentCrossings = ZeroCrossingTracker(minCycleSamples)
+        self.sums = np.zeros(3)  # sum of v^2, i^2 and v * i since last cycle boundary
+        self.count = 0  # number of samples in sums
+        self.cycleStarted = False
+        self.lastCycle = None  # (Vrms, Irms, P) of last complete cycle
+
+    def update(self, v, i, firstIndex):
+        """Process a block of voltage and current samples."""
+        self.currentCrossings.update(i, firstIndex)
+        crossings = self.voltageCrossings.update(v, firstIndex)
+
+        products = np.empty((3, len(v) + 1))
+        products[:, 0] = 0
+        np.cumsum(v * v, out=products[0, 1:])
+        np.cumsum(i * i, out=products[1, 1:])
+        np.cumsum(v * i, out=products[2, 1:])
+
+        # Cycles are bounded by the first sample at or after each crossing
+        position = 0
+        for crossing in crossings:
+            boundary = min(max(int(np.ceil(crossing)) - firstIndex, 0), len(v))
+            if self.cycleStarted:
+                sums = self.sums + products[:, boundary] - products[:, position]
+                count = self.count + boundary - position
+                if count:
+                    vSquared, iSquared, vi = sums / count
+                    self.lastCycle = (np.sqrt(vSquared), np.sqrt(iSquared), vi)
+            self.cycleStarted = True
+            self.sums[:] = 0
+            self.count = 0
+            position = boundary
+
+        self.sums += products[:, len(v)] - products[:, position]
+        self.count += len(v) - position
+
+
+class PowerQualityEngine:
+    """Compute power quality measurements of three phases on a worker thread.
+
+    Every interval seconds the samples written to the store since the last
+    pass are processed as one block, so the cost is proportional to the
+    number of new samples. The latest measurements of every phase are
+    published in results, a tuple replaced as a whole.
+    """
+    def __init__(
+                    self,
+                    store,
+                    phases,
+                    sampleRate,
+                    interval=0.2,
+                    thdCycles=10,
+                    nHarmonics=40,
+                    maxFrequency=1000.0
+                ) -> None:
+        self.store = store
+        self.phases = list(phases)  # (voltage, current) channel indexes in the store
+        self.sampleRate = sampleRate
+        self.interval = interval
+        self.thdCycles = thdCycles
+        self.nHarmonics = nHarmonics
+
+        minCycleSamples = sampleRate / maxFrequency
+        self.accumulators = [PhaseAccumulator(minCycleSamples) for _ in self.phases]
+        self.processedIndex = 0
+
+        self.results = tuple(PhaseMeasurements() for _ in self.phases)
+
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start computing measurements on a worker thread."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="PowerQualityEngine", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the worker thread."""
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.update()
+
+    def update(self):
+        """Process new samples and publish the resulting measurements."""
+        stop = self.store.totalWritten
+        start = max(self.processedIndex, self.store.oldestIndex)
+        if stop <= start:
+            return
+
+        block = self.store.snapshot(start, stop)
+        if block is None:
+            # Overwritten while copying, so samples have been lost. Skip them.
+            self.processedIndex = stop
+            return
+        self.processedIndex = stop
+
+        results = []
+        for (vChannel, iChannel), accumulator, previous in zip(
+            self.phases, self.accumulators, self.results
+        ):
+            accumulator.update(block[vChannel], block[iChannel], start)
+
+            vPeriod = accumulator.voltageCrossings.period
+            iPeriod = accumulator.currentCrossings.period
+            f0V = self.sampleRate / vPeriod if vPeriod else 0.0
+            f0I = self.sampleRate / iPeriod if iPeriod else 0.0
+
+            if accumulator.lastCycle is None:
+                results.append(previous._replace(f0V=f0V, f0I=f0I))
+                continue
+
+            vRms, iRms, activePower = accumulator.lastCycle
+            apparentPower = vRms * iRms
+            reactivePower = np.sqrt(max(apparentPower ** 2 - activePower ** 2, 0.0))
+            powerFactor = activePower / apparentPower if apparentPower else 0.0
+
+            results.append(
+                PhaseMeasurements(
+                    float(vRms),
+                    float(iRms),
+                    float(activePower),
+                    float(reactivePower),
+                    float(apparentPower),
+                    float(powerFactor),
+                    f0V,
+                    f0I,
+                    self.totalHarmonicDistortion(vChannel, vPeriod, stop),
+                    self.totalHarmonicDistortion(iChannel, iPeriod, stop),
+                )
+            )
+
+        self.results = tuple(results)
+
+    def totalHarmonicDistortion(self, channel, period, stop):
+        """Return THD in percent of the last thdCycles cycles of a channel.
+
+        The FFT spans a whole number of cycles, so harmonic h falls in bin
+        h * thdCycles.
+        """
+        if not period:
+            return 0.0
+        length = int(round(self.thdCycles * period))
+        if length < 2 * self.thdCycles or length > self.store.capacity:
+            return 0.0
+
+        values = self.store.snapshot(stop - length, stop, channel)
+        if values is None or len(values) < length:
+            return 0.0
+
+        spectrum = np.abs(np.fft.rfft((values - values.mean()) * hannWindow(length)))
+        bins = np.arange(self.thdCycles, len(spectrum), self.thdCycles)[: self.nHarmonics]
+        if len(bins) < 2 or spectrum[bins[0]] == 0:
+            return 0.0
+        fundamental = spectrum[bins[0]]
+        harmonics = spectrum[bins[1:]]
+        return float(100 * np.sqrt(np.sum(harmonics ** 2)) / fundamental)
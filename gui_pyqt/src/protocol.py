@@ -0,0 +1,132 @@
+"""Wire protocol definitions for General Power Theory GUI.
+
+Two protocols are supported between the Simulink client and the server.
+
+Legacy:
+    The server sends the 6 control inputs as doubles, then the client sends
+    one sample of all channels, by default 13 doubles. One round trip per
+    sample.
+
+Framed (version 1):
+    Every message starts with a 20 byte little-endian header:
+
+        offset  size  field
+        0       4     magic          b"GPTF" for sample frames,
+                                     b"GPTC" for control frames,
+                                     b"GPTS" for schema messages
+        4       2     version        PROTOCOL_VERSION
+        6       2     flags          payload encoding (see encoding.py)
+        8       4     sequence       incremented by the sender per message
+        12      4     sampleCount    number of samples per channel
+        16      4     channelMask    bit n set if channel n is present
+
+    The header is followed by the payload: for every channel whose bit is set
+    in channelMask, in ascending channel order, sampleCount values of the
+    type of the channel. The samples of a channel are therefore contiguous
+    (channel-major layout).
+
+    Sample frames are sent by the client in batches of samples. Channels
+    missing from channelMask keep their last received value. Control frames
+    are sent by the server only when control inputs change and always have
+    a sampleCount of 1. Their channelMask has bit n set if control input n
+    is present, so only the inputs that changed are sent. The first control
+    frame sent on a connection carries all inputs.
+
+    The flags of a sample frame select delta encoding and compression of its
+    payload, which is then prefixed with its length. The flags of control
+    frames advertise the encodings the server supports, so a client may
+    wait for the first control frame and choose from them. Frames with
+    flags 0 are always accepted.
+
+Schema handshake:
+    With either protocol, a client may start by sending a schema message: a
+    header with magic b"GPTS" whose sampleCount is the length of the UTF-8
+    JSON payload that follows and whose channelMask is the number of
+    channels. The payload describes every channel in the order they are
+    sent, for example:
+
+        {"channels": [{"name": "V1", "unit": "V", "dtype": "f4", "group": "V"},
+                      ...]}
+
+    dtype is "f8" (double), "f4" (float) or "i2" (16 bit integer with
+    "scale" and "offset" members, representing offset + scale * value) and
+    group is "V", "I" or "derived". Up to MAX_CHANNELS channels are supported. A client that does
+    not send a schema uses the default 13 double schema (schema.py). In the
+    legacy protocol a sample then holds one value of every channel in its
+    own type.
+"""
+# Standard library imports
+import struct
+
+# Magic numbers
+FRAME_MAGIC = b"GPTF"
+CONTROL_MAGIC = b"GPTC"
+SCHEMA_MAGIC = b"GPTS"
+
+PROTOCOL_VERSION = 1
+
+# Protocol modes
+LEGACY_MODE = "legacy"
+FRAMED_MODE = "framed"
+
+# Legacy protocol
+legacyFrame = struct.Struct("<13d")  # one sample of all channels
+legacyControls = struct.Struct("<6d")  # control inputs
+
+# Framed protocol
+frameHeader = struct.Struct("<4sHHIII")
+
+N_CHANNELS = 13  # channels of the default schema
+MAX_CHANNELS = 32  # channels addressable by a channel mask
+N_CONTROL_INPUTS = 6
+
+# Channels in the order they are sent by the client
+channelNames = (
+    "debug",
+    "V1",
+    "V2",
+    "V3",
+    "I1",
+    "I2",
+    "I3",
+    "f0_V1",
+    "f0_V2",
+    "f0_V3",
+    "f0_I1",
+    "f0_I2",
+    "f0_I3",
+)
+channelIndex = {name: index for index, name in enumerate(channelNames)}
+
+
+def channelCount(channelMask):
+    """Return the number of channels present in a channel mask."""
+    return bin(channelMask).count("1")
+
+
+def maskChannels(channelMask, nChannels=N_CHANNELS):
+    """Return the indexes of the channels present in a channel mask."""
+    return [channel for channel in range(nChannels) if channelMask & (1 << channel)]
+
+
+ALL_CONTROL_INPUTS = (1 << N_CONTROL_INPUTS) - 1  # control input mask with every input present
+
+
+def packControlFrame(sequence, values, inputMask=ALL_CONTROL_INPUTS, flags=0):
+    """Pack the control inputs present in inputMask into a framed protocol
+    control message. flags advertises the supported frame encodings.
+    """
+    inputs = [value for index, value in enumerate(values) if inputMask & (1 << index)]
+    header = frameHeader.pack(
+        CONTROL_MAGIC,
+        PROTOCOL_VERSION,
+        flags,
+        sequence,
+        1,
+        inputMask,
+    )
+    return header + struct.pack(f"<{len(inputs)}d", *inputs)
+
+
+class ProtocolError(Exception):
+    """Raised when a received message does not match the protocol."""
@@ -0,0 +1,532 @@
+"""Recording of received samples to disk and memory-mapped playback.
+
+Recording format (version 2)
+----------------------------
+All values are little-endian. A recording is an append-only sequence of
+chunks between a file header and a chunk index:
+
+    File header (64 bytes)
+        offset  size  field
+        0       8     magic          b"GPTREC\\0\\0"
+        8       2     version        RECORDING_VERSION
+        10      2     nChannels      number of channels
+        12      4     chunkSamples   nominal number of samples per chunk
+        16      8     samplePeriod   seconds between consecutive samples
+        24      8     startTime      UNIX time at which recording started
+        32      4     schemaLength   bytes of channel schema after the header,
+                                     0 if the recording has none
+        36      28    reserved
+
+    Channel schema (schemaLength bytes)
+        The JSON schema of the channels, as in a schema message (see
+        schema.py). Sample types are those sent by the client, but samples
+        are always recorded as doubles.
+
+    Chunk (32 byte header followed by the payload)
+        0       4     magic          b"CHNK"
+        4       4     nSamples       number of samples per channel
+        8       8     firstIndex     absolute sample index of first sample
+        16      8     timestamp      UNIX time at which first sample was received
+        24      8     reserved
+        32            payload        nChannels x nSamples doubles, channel-major
+
+    Chunk index (written when the recording is closed)
+        0       8     magic          b"GPTIDX\\0\\0"
+        8       8     nChunks
+        16            entries        nChunks entries of
+                                         offset      8  file offset of chunk
+                                         firstIndex  8
+                                         nSamples    8
+                                         timestamp   8
+                                         mins        8 * nChannels
+                                         maxs        8 * nChannels
+                                         sums        8 * nChannels
+                                         sumSquares  8 * nChannels
+
+    Trailer (16 bytes, last in file)
+        0       8     indexOffset    file offset of chunk index
+        8       8     magic          b"GPTEND\\0\\0"
+
+The time of sample n of a chunk is timestamp + n * samplePeriod. If a
+recording was not closed cleanly, it has no index and trailer, and the
+index is rebuilt by walking the chunk headers.
+
+Version 1 is version 2 without the sums and sums of squares in the chunk
+index, which are computed from the samples when first needed.
+"""
+# Standard library imports
+import os
+import queue
+import struct
+import threading
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from decimation import combineStats
+from schema import ChannelSchema, SchemaError
+
+RECORDING_VERSION = 2
+READABLE_VERSIONS = (1, RECORDING_VERSION)
+
+FILE_MAGIC = b"GPTREC\0\0"
+CHUNK_MAGIC = b"CHNK"
+INDEX_MAGIC = b"GPTIDX\0\0"
+END_MAGIC = b"GPTEND\0\0"
+
+fileHeader = struct.Struct("<8sHHIddI28x")
+chunkHeader = struct.Struct("<4sIQd8x")
+indexHeader = struct.Struct("<8sQ")
+indexEntry = struct.Struct("<QQQd")
+trailer = struct.Struct("<Q8s")
+
+
+class RecordingError(Exception):
+    """Raised when a file is not a valid recording."""
+
+
+class CaptureRecorder:
+    """Stream samples to a recording file.
+
+    Samples are gathered into chunks on the calling (acquisition) thread and
+    the chunks are written to disk by a background writer thread, so the
+    acquisition thread never waits on the disk. If the writer falls more than
+    queueLength chunks behind, further chunks are dropped and counted in
+    droppedChunks.
+
+    If a ChannelSchema is given it is saved in the recording, so that the
+    names and units of the channels are known when it is read back.
+    """
+    def __init__(
+                    self,
+                    path,
+                    nChannels,
+                    samplePeriod,
+                    firstIndex=0,
+                    chunkSamples=4096,
+                    queueLength=64,
+                    schema=None
+                ) -> None:
+        self.path = path
+        self.nChannels = nChannels
+        self.chunkSamples = chunkSamples
+
+        schemaJson = schema.toJson().encode() if schema is not None else b""
+        self.file = open(path, "xb")  # never overwrite an existing recording
+        self.file.write(
+            fileHeader.pack(
+                FILE_MAGIC,
+                RECORDING_VERSION,
+                nChannels,
+                chunkSamples,
+                samplePeriod,
+                time.time(),
+                len(schemaJson),
+            )
+        )
+        self.file.write(schemaJson)
+
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.chunks = queue.Queue(maxsize=queueLength)  # chunks waiting to be written
+        self.freeBuffers = queue.SimpleQueue()  # chunk buffers available for reuse
+        self.index = []  # (offset, firstIndex, nSamples, timestamp, mins, maxs, sums, sumSquares)
+        self.droppedChunks = 0
+
+        self.buffer = self.newBuffer()
+        self.bufferCount = 0  # number of samples in self.buffer
+        self.bufferFirstIndex = firstIndex
+        self.bufferTimestamp = 0.0
+        self.nextIndex = firstIndex  # absolute index of next sample
+
+        self.writerThread = threading.Thread(target=self.runWriter, name="CaptureRecorder", daemon=True)
+        self.writerThread.start()
+
+    def newBuffer(self):
+        """Return a chunk buffer, reusing one already written if possible."""
+        try:
+            return self.freeBuffers.get_nowait()
+        except queue.Empty:
+            return np.empty((self.nChannels, self.chunkSamples))
+
+    def append(self, block):
+        """Record a block of samples with shape (nChannels, nSamples)."""
+        with self.lock:
+            if self.closed:
+                return
+
+            nSamples = block.shape[1]
+            done = 0
+            while done < nSamples:
+                if self.bufferCount == 0:
+                    self.bufferFirstIndex = self.nextIndex + done
+                    self.bufferTimestamp = time.time()
+
+                n = min(nSamples - done, self.chunkSamples - self.bufferCount)
+                self.buffer[:, self.bufferCount : self.bufferCount + n] = block[:, done : done + n]
+                self.bufferCount += n
+                done += n
+
+                if self.bufferCount == self.chunkSamples:
+                    self.queueChunk()
+
+            self.nextIndex += nSamples
+
+    def appendSample(self, sample):
+        """Record a single sample of all channels."""
+        with self.lock:
+            if self.closed:
+                return
+
+            if self.bufferCount == 0:
+                self.bufferFirstIndex = self.nextIndex
+                self.bufferTimestamp = time.time()
+
+            self.buffer[:, self.bufferCount] = sample
+            self.bufferCount += 1
+            self.nextIndex += 1
+
+            if self.bufferCount == self.chunkSamples:
+                self.queueChunk()
+
+    def queueChunk(self):
+        """Hand the current chunk to the writer thread and start a new one."""
+        try:
+            self.chunks.put_nowait(
+                (self.buffer, self.bufferCount, self.bufferFirstIndex, self.bufferTimestamp)
+            )
+            self.buffer = self.newBuffer()
+        except queue.Full:
+            self.droppedChunks += 1
+        self.bufferCount = 0
+
+    def runWriter(self):
+        """Write queued chunks to the file until the recorder is closed."""
+        while True:
+            item = self.chunks.get()
+            if item is None:
+                return
+
+            buffer, nSamples, firstIndex, timestamp = item
+            data = buffer[:, :nSamples]
+
+            offset = self.file.tell()
+            self.file.write(chunkHeader.pack(CHUNK_MAGIC, nSamples, firstIndex, timestamp))
+            if nSamples == self.chunkSamples:
+                self.file.write(memoryview(buffer).cast("B"))
+            else:
+                for row in data:
+                    self.file.write(row.tobytes())
+
+            self.index.append(
+                (
+                    offset,
+                    firstIndex,
+                    nSamples,
+                    timestamp,
+                    data.min(axis=1),
+                    data.max(axis=1),
+                    data.sum(axis=1),
+                    np.einsum("ij,ij->i", data, data),
+                )
+            )
+            self.freeBuffers.put(buffer)
+
+    def close(self):
+        """Write remaining samples and the chunk index, then close the file."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+            if self.bufferCount:
+                # Wait for room rather than dropping the final chunk
+                self.chunks.put(
+                    (self.buffer, self.bufferCount, self.bufferFirstIndex, self.bufferTimestamp)
+                )
+
+        self.chunks.put(None)
+        self.writerThread.join()
+
+        indexOffset = self.file.tell()
+        self.file.write(indexHeader.pack(INDEX_MAGIC, len(self.index)))
+        for offset, firstIndex, nSamples, timestamp, *summaries in self.index:
+            self.file.write(indexEntry.pack(offset, firstIndex, nSamples, timestamp))
+            for summary in summaries:
+                self.file.write(summary.astype("<f8").tobytes())
+        self.file.write(trailer.pack(indexOffset, END_MAGIC))
+        self.file.close()
+
+
+class RecordingReader:
+    """Memory-mapped read access to a recording.
+
+    Nothing is loaded into memory up front apart from the chunk index, so
+    recordings much larger than the available RAM can be browsed.
+
+    schema is the ChannelSchema saved in the recording, or None if it has
+    none.
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+        if os.path.getsize(path) < fileHeader.size:
+            raise RecordingError(f"{path} is too short to be a recording")
+        self.map = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, self.version, self.nChannels, self.chunkSamples, self.samplePeriod, self.startTime, schemaLength = (
+            fileHeader.unpack_from(self.map)
+        )
+        if magic != FILE_MAGIC or self.version not in READABLE_VERSIONS:
+            raise RecordingError(
+                f"{path} is not a version {' or '.join(map(str, READABLE_VERSIONS))} recording"
+            )
+
+        self.dataOffset = fileHeader.size + schemaLength  # offset of the first chunk
+        self.schema = None
+        if schemaLength:
+            try:
+                self.schema = ChannelSchema.fromJson(bytes(self.map[fileHeader.size : self.dataOffset]))
+            except SchemaError as e:
+                raise RecordingError(f"{path} has an invalid channel schema: {e}") from e
+            if self.schema.nChannels != self.nChannels:
+                raise RecordingError(
+                    f"{path} has a schema of {self.schema.nChannels} channels for {self.nChannels} channels"
+                )
+
+        self.chunkSums = self.chunkSumSquares = None  # computed by summariseChunks if not indexed
+        if not self.readIndex():
+            self.rebuildIndex()
+
+        if len(self.offsets):
+            self.firstIndex = int(self.firstIndexes[0])
+            self.endIndex = int(self.firstIndexes[-1] + self.sampleCounts[-1])
+        else:
+            self.firstIndex = self.endIndex = 0
+
+    def readIndex(self):
+        """Load the chunk index written when the recording was closed.
+
+        Returns False if the recording has no index.
+        """
+        if len(self.map) < self.dataOffset + trailer.size:
+            return False
+        indexOffset, magic = trailer.unpack_from(self.map, len(self.map) - trailer.size)
+        if magic != END_MAGIC:
+            return False
+
+        magic, nChunks = indexHeader.unpack_from(self.map, indexOffset)
+        if magic != INDEX_MAGIC:
+            return False
+
+        nSummaries = 4 if self.version >= 2 else 2
+        entrySize = indexEntry.size + 8 * nSummaries * self.nChannels
+        entries = self.map[indexOffset + indexHeader.size : indexOffset + indexHeader.size + nChunks * entrySize]
+        entries = entries.reshape(nChunks, entrySize)
+
+        fields = entries[:, : indexEntry.size].copy().view("<u8")
+        self.offsets = fields[:, 0].astype(np.int64)
+        self.firstIndexes = fields[:, 1].astype(np.int64)
+        self.sampleCounts = fields[:, 2].astype(np.int64)
+        self.timestamps = fields[:, 3].view("<f8")
+
+        summaries = entries[:, indexEntry.size :].copy().view("<f8").reshape(nChunks, nSummaries, self.nChannels)
+        self.chunkMins = summaries[:, 0]
+        self.chunkMaxs = summaries[:, 1]
+        if nSummaries == 4:
+            self.chunkSums = summaries[:, 2]
+            self.chunkSumSquares = summaries[:, 3]
+        return True
+
+    def rebuildIndex(self):
+        """Rebuild the chunk index by walking the chunk headers, reading
+        every chunk to summarise it.
+        """
+        offsets, firstIndexes, sampleCounts, timestamps, mins, maxs, sums, sumSquares = [], [], [], [], [], [], [], []
+
+        offset = self.dataOffset
+        while offset + chunkHeader.size <= len(self.map):
+            magic, nSamples, firstIndex, timestamp = chunkHeader.unpack_from(self.map, offset)
+            end = offset + chunkHeader.size + 8 * self.nChannels * nSamples
+            if magic != CHUNK_MAGIC or end > len(self.map):
+                break  # partially written chunk at the end of the file
+
+            offsets.append(offset)
+            firstIndexes.append(firstIndex)
+            sampleCounts.append(nSamples)
+            timestamps.append(timestamp)
+            data = self.map[offset + chunkHeader.size : end].view("<f8").reshape(self.nChannels, nSamples)
+            mins.append(data.min(axis=1))
+            maxs.append(data.max(axis=1))
+            sums.append(data.sum(axis=1))
+            sumSquares.append(np.einsum("ij,ij->i", data, data))
+            offset = end
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.firstIndexes = np.array(firstIndexes, dtype=np.int64)
+        self.sampleCounts = np.array(sampleCounts, dtype=np.int64)
+        self.timestamps = np.array(timestamps, dtype=np.float64)
+        self.chunkMins = np.array(mins).reshape(-1, self.nChannels)
+        self.chunkMaxs = np.array(maxs).reshape(-1, self.nChannels)
+        self.chunkSums = np.array(sums).reshape(-1, self.nChannels)
+        self.chunkSumSquares = np.array(sumSquares).reshape(-1, self.nChannels)
+
+    @property
+    def nChunks(self):
+        return len(self.offsets)
+
+    def chunk(self, i):
+        """Return a memory-mapped view of chunk i with shape (nChannels, nSamples)."""
+        start = int(self.offsets[i]) + chunkHeader.size
+        nSamples = int(self.sampleCounts[i])
+        return self.map[start : start + 8 * self.nChannels * nSamples].view("<f8").reshape(
+            self.nChannels, nSamples
+        )
+
+    def findChunk(self, sampleIndex):
+        """Return the number of the chunk containing an absolute sample index."""
+        return max(int(np.searchsorted(self.firstIndexes, sampleIndex, side="right")) - 1, 0)
+
+    def read(self, start, stop, channel=None):
+        """Return a copy of the samples in the absolute range [start, stop),
+        with shape (nChannels, n), or (n,) if a channel is given.
+
+        The range is clipped to the recording. Samples lost to dropped
+        chunks are NaN.
+        """
+        start = max(int(start), self.firstIndex)
+        stop = min(int(stop), self.endIndex)
+        n = max(stop - start, 0)
+        out = np.full((n,) if channel is not None else (self.nChannels, n), np.nan)
+
+        position = start
+        i = self.findChunk(start)
+        while position < stop and i < self.nChunks:
+            data = self.chunk(i)
+            chunkStart = int(self.firstIndexes[i])
+            chunkStop = chunkStart + data.shape[1]
+            begin = max(position, chunkStart) - chunkStart
+            end = min(stop, chunkStop) - chunkStart
+            if end > begin:
+                offset = chunkStart + begin - start
+                if channel is not None:
+                    out[offset : offset + end - begin] = data[channel, begin:end]
+                else:
+                    out[:, offset : offset + end - begin] = data[:, begin:end]
+            position = max(position, chunkStop)
+            i += 1
+        return out
+
+    def sampleTimes(self, start, stop):
+        """Return UNIX times of the samples in the absolute range [start, stop)."""
+        i = self.findChunk(start)
+        indexes = np.arange(start, stop)
+        return self.timestamps[i] + (indexes - self.firstIndexes[i]) * self.samplePeriod
+
+    def query(self, channel, start, stop, nPoints):
+        """Return x and y data for plotting a channel over the absolute sample
+        range [start, stop) with about nPoints points.
+
+        Has the same behaviour as MinMaxPyramid.query. Ranges spanning more
+        than one chunk per point are summarised from the chunk index, so no
+        samples have to be read from disk.
+        """
+        start = max(int(start), self.firstIndex)
+        stop = min(int(stop), self.endIndex)
+        if stop <= start:
+            return np.empty(0), np.empty(0)
+
+        samplesPerPoint = (stop - start) // max(nPoints, 1)
+        if samplesPerPoint <= 1:
+            y = self.read(start, stop, channel)
+            return np.arange(start, stop, dtype=np.float64), y
+
+        if samplesPerPoint >= self.chunkSamples:
+            first = self.findChunk(start)
+            last = self.findChunk(stop - 1) + 1
+            centres = self.firstIndexes[first:last] + self.sampleCounts[first:last] / 2
+            mins = self.chunkMins[first:last, channel]
+            maxs = self.chunkMaxs[first:last, channel]
+        else:
+            data = self.read(start, stop, channel)
+            nBlocks = len(data) // samplesPerPoint
+            blocks = data[: nBlocks * samplesPerPoint].reshape(nBlocks, samplesPerPoint)
+            centres = start + (np.arange(nBlocks) + 0.5) * samplesPerPoint
+            mins = blocks.min(axis=1)
+            maxs = blocks.max(axis=1)
+
+        x = np.repeat(centres.astype(np.float64), 2)
+        y = np.empty(2 * len(mins))
+        y[0::2] = mins
+        y[1::2] = maxs
+        return x, y
+
+    def summariseChunks(self):
+        """Compute the sum and sum of squares of every channel of every
+        chunk if the chunk index does not hold them, as in version 1
+        recordings. Reads the whole recording the first time it is called.
+        """
+        if self.chunkSums is not None:
+            return
+        self.chunkSums = np.empty((self.nChunks, self.nChannels))
+        self.chunkSumSquares = np.empty((self.nChunks, self.nChannels))
+        for i in range(self.nChunks):
+            data = self.chunk(i)
+            self.chunkSums[i] = data.sum(axis=1)
+            self.chunkSumSquares[i] = np.einsum("ij,ij->i", data, data)
+
+    def stats(self, start, stop):
+        """Return the RangeStats of the absolute sample range [start, stop),
+        or None if the recording has no samples in the range.
+
+        Has the same behaviour as MinMaxPyramid.stats. Chunks entirely in the
+        range are combined from their summaries, so only the chunks at the
+        ends of the range are read.
+        """
+        start = max(int(start), self.firstIndex)
+        stop = min(int(stop), self.endIndex)
+        if stop <= start:
+            return None
+        self.summariseChunks()
+
+        first = self.findChunk(start)
+        last = self.findChunk(stop - 1) + 1
+        chunkStarts = self.firstIndexes[first:last]
+        whole = (chunkStarts >= start) & (chunkStarts + self.sampleCounts[first:last] <= stop)
+
+        count = int(self.sampleCounts[first:last][whole].sum())
+        mins = [self.chunkMins[first:last][whole].T]
+        maxs = [self.chunkMaxs[first:last][whole].T]
+        sums = [self.chunkSums[first:last][whole].T]
+        sumSquares = [self.chunkSumSquares[first:last][whole].T]
+        for i in first + np.flatnonzero(~whole):
+            chunkStart = int(self.firstIndexes[i])
+            data = self.chunk(i)[:, max(start - chunkStart, 0) : max(stop - chunkStart, 0)]
+            count += data.shape[1]
+            mins.append(data)
+            maxs.append(data)
+            sums.append(data)
+            sumSquares.append(np.square(data))
+
+        if not count:
+            return None  # the range falls in a gap left by dropped chunks
+        return combineStats(count, mins, maxs, sums, sumSquares)
+
+    def close(self):
+        """Release the memory map."""
+        del self.map
+
+
+def recordingPath(directory, prefix="capture"):
+    """Return a new timestamped recording file path in a directory. A
+    suffix -2, -3... tells apart recordings started in the same second.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, time.strftime(f"{prefix}-%Y%m%d-%H%M%S"))
+    path = f"{stem}.gptrec"
+    n = 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{stem}-{n}.gptrec"
+    return path
@@ -0,0 +1,91 @@
+"""Selection of the path the plot is rendered with.
+
+raster: QPainter draws every curve into the window. Always available, but
+    slow with wide pens once thousands of points are on screen.
+opengl: the plot is drawn in a QOpenGLWidget viewport, where pyqtgraph
+    uploads curves to vertex buffers and draws them as line strips. Works
+    with Mesa software rendering (llvmpipe) on machines without a GPU.
+auto: opengl if an OpenGL context can be created, else raster.
+
+Whether OpenGL works can only be told once the QApplication exists, so the
+mode is resolved when the plot is set up, falling back to raster with the
+reason printed if opengl was asked for but is unavailable.
+"""
+# Standard library imports
+import os
+
+# Third-party library imports
+from PyQt5.QtCore import QCoreApplication, Qt
+from PyQt5.QtGui import QOffscreenSurface, QOpenGLContext
+
+try:
+    from pyqtgraph.Qt import OpenGLHelpers
+except ImportError:
+    OpenGLHelpers = None  # pyqtgraph before 0.13 has no vertex buffer curves
+
+RASTER_MODE = "raster"
+OPENGL_MODE = "opengl"
+AUTO_MODE = "auto"
+RENDER_MODES = (RASTER_MODE, OPENGL_MODE, AUTO_MODE)
+
+
+def prepareRendering(softwareOpenGL):
+    """Ask for software OpenGL if softwareOpenGL is set. Must be called
+    before the QApplication is created.
+    """
+    if softwareOpenGL:
+        os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")  # Mesa llvmpipe
+        QCoreApplication.setAttribute(Qt.AA_UseSoftwareOpenGL)  # opengl32sw on Windows
+
+
+def openGLUnavailableReason():
+    """Return why pyqtgraph cannot draw curves with OpenGL, or None if it
+    can. Creates and discards a context on an offscreen surface.
+    """
+    if OpenGLHelpers is None:
+        return "pyqtgraph has no OpenGL curve support, 0.13 or later is needed"
+
+    context = QOpenGLContext()
+    if not context.create():
+        return "no OpenGL context could be created"
+    surface = QOffscreenSurface()
+    surface.setFormat(context.format())
+    surface.create()
+    try:
+        if not context.makeCurrent(surface):
+            return "the OpenGL context could not be made current"
+        try:
+            OpenGLHelpers.getFunctions(context)
+        except RuntimeError as e:
+            return str(e)
+        finally:
+            context.doneCurrent()
+    finally:
+        surface.destroy()
+    return None
+
+
+def resolveRenderMode(mode):
+    """Return the mode the plot is rendered with for a requested mode, and
+    why OpenGL is not used if it was asked for and is unavailable.
+    """
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode {mode!r}, expected one of {', '.join(RENDER_MODES)}")
+    if mode == RASTER_MODE:
+        return RASTER_MODE, None
+
+    reason = openGLUnavailableReason()
+    if reason is None:
+        return OPENGL_MODE, None
+    return RASTER_MODE, reason if mode == OPENGL_MODE else None
+
+
+def applyRenderMode(plotWidget, mode):
+    """Render a PlotWidget with the requested mode, or the fallback. Returns
+    the mode used.
+    """
+    renderMode, reason = resolveRenderMode(mode)
+    if reason is not None:
+        print(f"OpenGL rendering unavailable ({reason}), rendering with QPainter")
+    plotWidget.useOpenGL(renderMode == OPENGL_MODE)
+    return renderMode
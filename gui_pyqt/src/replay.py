@@ -0,0 +1,144 @@
+"""Replay of recordings through the acquisition pipeline.
+
+A recording is streamed to the server as a client, exactly as the Simulink
+client would send it, so replayed samples are decoded, stored, triggered,
+measured and plotted by the same code as live samples. Replaying at the
+speed the samples were recorded (1x) reproduces a session, faster speeds
+skim through long captures, and max speed sends as fast as the server
+accepts, which measures the throughput of the whole pipeline.
+
+The channel schema saved in the recording is announced to the server with
+every channel sent as doubles, as they were recorded.
+
+Usage:
+    python replay.py RECORDING [--speed 1|4|max] [--start 10] [--stop 20]
+                     [--protocol legacy|framed] [--batch 64]
+"""
+# Standard library imports
+import argparse
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import protocol
+import settings
+from recorder import RecordingReader
+from schema import ChannelSchema, defaultSchema
+from simulator import SimulatedClient
+
+MAX_SPEED = "max"
+REPLAY_SPEEDS = ("1", "2", "4", "10", MAX_SPEED)  # offered by the GUI
+
+
+class RecordingPlayback:
+    """Blocks of the samples of a recording from sample start to stop, in
+    the form of a WaveformGenerator for SimulatedClient.
+
+    The sample rate is the rate the samples were recorded at times speed.
+    Samples lost to dropped chunks are skipped rather than paced.
+    """
+    def __init__(self, reader, speed=1.0, start=None, stop=None) -> None:
+        self.reader = reader
+        self.sampleRate = speed / reader.samplePeriod
+        self.stop = reader.endIndex if stop is None else min(int(stop), reader.endIndex)
+        self.index = reader.firstIndex if start is None else max(int(start), reader.firstIndex)
+        self.chunkIndex = reader.findChunk(self.index) if reader.nChunks else 0
+
+    def block(self, nSamples):
+        """Return the next nSamples or fewer samples of all channels as an
+        array of shape (channels, samples), empty at the end.
+        """
+        reader = self.reader
+        while self.chunkIndex < reader.nChunks and self.index < self.stop:
+            chunkStart = int(reader.firstIndexes[self.chunkIndex])
+            chunkStop = chunkStart + int(reader.sampleCounts[self.chunkIndex])
+            self.index = max(self.index, chunkStart)
+            if self.index >= chunkStop:
+                self.chunkIndex += 1
+                continue
+
+            end = min(self.index + nSamples, chunkStop, self.stop)
+            block = reader.chunk(self.chunkIndex)[:, self.index - chunkStart : end - chunkStart]
+            self.index = end
+            return block
+        return np.empty((reader.nChannels, 0))
+
+
+def replaySchema(reader):
+    """Return the schema to announce for a recording, or None to send it in
+    the default schema. Raises ValueError if the recording has no schema
+    and does not fit the default one.
+    """
+    if reader.schema is None:
+        if reader.nChannels != defaultSchema.nChannels:
+            raise ValueError(
+                f"{reader.path} has {reader.nChannels} channels and no schema to replay them with"
+            )
+        return None
+    return ChannelSchema(
+        channel._replace(dtype="f8", scale=1.0, offset=0.0) for channel in reader.schema.channels
+    )
+
+
+def replayClient(reader, speed=1.0, start=None, stop=None, framed=True, batch=64):
+    """Return a SimulatedClient streaming a recording at speed times the
+    recorded rate, or as fast as the server accepts if speed is MAX_SPEED.
+    """
+    paced = speed != MAX_SPEED
+    return SimulatedClient(
+        RecordingPlayback(reader, float(speed) if paced else 1.0, start, stop),
+        framed=framed,
+        batch=batch,
+        paced=paced,
+        schema=replaySchema(reader)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording to the General Power Theory server")
+    parser.add_argument("recording", help="recording file (.gptrec)")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--protocol", choices=(protocol.LEGACY_MODE, protocol.FRAMED_MODE),
+                        default=settings.protocolMode)
+    parser.add_argument("--speed", default="1",
+                        help=f"multiple of the recorded sample rate, or {MAX_SPEED} to send as fast as "
+                             f"the server accepts")
+    parser.add_argument("--start", type=float, default=None,
+                        help="seconds from the start of the recording to replay from")
+    parser.add_argument("--stop", type=float, default=None,
+                        help="seconds from the start of the recording to replay to")
+    parser.add_argument("--batch", type=int, default=64, help="samples per frame or send")
+    args = parser.parse_args()
+
+    if args.speed != MAX_SPEED:
+        try:
+            if float(args.speed) <= 0:
+                raise ValueError
+        except ValueError:
+            parser.error(f"speed must be a positive number or {MAX_SPEED}")
+
+    reader = RecordingReader(args.recording)
+
+    def index(seconds):
+        return None if seconds is None else reader.firstIndex + round(seconds / reader.samplePeriod)
+
+    try:
+        client = replayClient(
+            reader,
+            args.speed,
+            index(args.start),
+            index(args.stop),
+            framed=args.protocol == protocol.FRAMED_MODE,
+            batch=args.batch
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    rate = client.run(args.host, args.port, float("inf"))
+    print(f"Replayed {client.samplesSent} samples at {rate:,.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Preallocated multi-channel ring buffer for received samples."""
+
+# Third-party library imports
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed size ring buffer storing samples of several channels.
+
+    Samples are addressed by their absolute index i.e. the number of samples
+    written before them. Only the most recent capacity samples are retained.
+
+    Every sample is written twice, once at its position in the ring and once
+    capacity samples further on. Any range of at most capacity retained
+    samples is therefore contiguous in memory, so it can be read as a view
+    without copying, regardless of where the ring wraps.
+
+    There is a single writer. Readers on other threads use snapshot(), which
+    works like a sequence lock: before writing, the writer advances writeEnd
+    to the index one past the samples it is about to write, and a reader
+    checks after copying that writeEnd has not moved far enough for the
+    copied range to have been overwritten. The writer never waits for
+    readers.
+    """
+    def __init__(self, nChannels, capacity, dtype=np.float64) -> None:
+        self.nChannels = nChannels
+        self.capacity = capacity
+
+        self.data = np.zeros((nChannels, 2 * capacity), dtype=dtype)
+        self.nbytes = self.data.nbytes  # fixed memory footprint of buffer
+
+        self.totalWritten = 0  # number of samples written since creation
+        self.writeEnd = 0  # totalWritten once the write in progress, if any, completes
+        self.snapshotRetries = 0  # number of snapshots invalidated by the writer
+
+    @property
+    def oldestIndex(self):
+        """Absolute index of the oldest sample still in the buffer."""
+        return max(0, self.totalWritten - self.capacity)
+
+    def write(self, block):
+        """Append a block of samples with shape (nChannels, nSamples)."""
+        nSamples = block.shape[1]
+        self.writeEnd = self.totalWritten + nSamples
+        if nSamples > self.capacity:
+            # Only the most recent samples can be retained
+            self.totalWritten += nSamples - self.capacity
+            block = block[:, -self.capacity :]
+            nSamples = self.capacity
+
+        capacity = self.capacity
+        position = self.totalWritten % capacity
+        nFirst = min(nSamples, capacity - position)
+        nSecond = nSamples - nFirst
+
+        self.data[:, position : position + nFirst] = block[:, :nFirst]
+        self.data[:, capacity + position : capacity + position + nFirst] = block[:, :nFirst]
+        if nSecond:
+            self.data[:, :nSecond] = block[:, nFirst:]
+            self.data[:, capacity : capacity + nSecond] = block[:, nFirst:]
+
+        self.totalWritten += nSamples
+
+    def writeSample(self, sample):
+        """Append a single sample of all channels."""
+        capacity = self.capacity
+        position = self.totalWritten % capacity
+        self.writeEnd = self.totalWritten + 1
+        self.data[:, position] = sample
+        self.data[:, capacity + position] = sample
+        self.totalWritten += 1
+
+    def latest(self):
+        """Return a view of the most recent sample of all channels, or zeros
+        if nothing has been written yet.
+        """
+        # Before the first write this is the zero-initialised last column
+        return self.data[:, (self.totalWritten - 1) % self.capacity]
+
+    def read(self, start, stop):
+        """Return a view of the samples with absolute indexes in the range
+        [start, stop) with shape (nChannels, stop - start).
+
+        The range is clipped to the samples retained in the buffer. The view
+        is only valid until the samples are overwritten, so copy it if it is
+        to be kept.
+        """
+        start = max(start, self.oldestIndex)
+        stop = min(stop, self.totalWritten)
+        if stop <= start:
+            return self.data[:, :0]
+
+        position = start % self.capacity
+        return self.data[:, position : position + stop - start]
+
+    def snapshot(self, start, stop, channel=None):
+        """Return a copy of the samples with absolute indexes in the range
+        [start, stop), of all channels or of a single channel.
+
+        Safe to call from a thread other than the writer's. Returns None if
+        the writer overwrote part of the range while it was being copied, in
+        which case the caller should try again with a more recent range.
+        """
+        start = max(start, self.oldestIndex)
+        stop = min(stop, self.totalWritten)
+        if stop <= start:
+            start = stop
+
+        position = start % self.capacity
+        if channel is None:
+            copy = self.data[:, position : position + stop - start].copy()
+        else:
+            copy = self.data[channel, position : position + stop - start].copy()
+
+        if start < self.writeEnd - self.capacity:
+            self.snapshotRetries += 1
+            return None
+        return copy
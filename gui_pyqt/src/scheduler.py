@@ -0,0 +1,117 @@
+"""Adaptive scheduling of plot refreshes."""
+
+# Standard library imports
+import time
+
+# Third-party library imports
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class FrameScheduler(QObject):
+    """Call a frame callback from a single shot QTimer whose interval adapts
+    to the time the callback takes.
+
+    After every frame the interval is set so that frames are drawn every
+    targetInterval ms, unless that would spend more than cpuCeiling of the
+    GUI thread's time drawing, in which case the interval is stretched.
+    Frames are skipped while the sequence callable returns the same value
+    as at the last frame i.e. no new samples have arrived, unless a frame
+    has been requested with requestFrame().
+
+    A frame counts as dropped when the timer fires more than one interval
+    late because the event loop was busy, or when it takes longer than
+    the target interval to draw.
+    """
+    statsChanged = pyqtSignal(float, int)  # achieved frames per second, dropped frames
+
+    def __init__(
+                    self,
+                    timer,
+                    callback,
+                    sequence,
+                    initialInterval,
+                    targetInterval,
+                    maxInterval,
+                    cpuCeiling
+                ) -> None:
+        super(FrameScheduler, self).__init__()
+        self.timer = timer
+        self.callback = callback
+        self.sequence = sequence
+        self.targetInterval = targetInterval
+        self.maxInterval = maxInterval
+        self.cpuCeiling = cpuCeiling
+
+        self.interval = initialInterval  # ms
+        self.frameTime = 0.0  # smoothed time taken by a frame in ms
+        self.lastSequence = None
+        self.frameRequested = True
+
+        self.fps = 0.0
+        self.frames = 0  # frames drawn since creation
+        self.skippedFrames = 0  # frames skipped as there was nothing new to draw
+        self.droppedFrames = 0
+
+        self.scheduledAt = 0.0
+        self.statsStart = time.perf_counter()
+        self.statsFrames = 0
+
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.onTimeout)
+
+    def start(self):
+        """Start scheduling frames."""
+        self.schedule()
+
+    def stop(self):
+        """Stop scheduling frames."""
+        self.timer.stop()
+
+    def requestFrame(self):
+        """Draw the next frame even if no new samples have arrived e.g. after
+        the selected lines change.
+        """
+        self.frameRequested = True
+
+    def schedule(self):
+        self.scheduledAt = time.perf_counter()
+        self.timer.start(int(self.interval))
+
+    def onTimeout(self):
+        """Draw a frame if there is something new to draw and schedule the
+        next one.
+        """
+        start = time.perf_counter()
+        lateness = (start - self.scheduledAt) * 1000 - self.interval
+        if lateness > self.interval:
+            self.droppedFrames += int(lateness // self.interval)
+
+        sequence = self.sequence()
+        if sequence == self.lastSequence and not self.frameRequested:
+            self.skippedFrames += 1
+        else:
+            self.lastSequence = sequence
+            self.frameRequested = False
+
+            self.callback()
+
+            frameTime = (time.perf_counter() - start) * 1000
+            self.frameTime = 0.8 * self.frameTime + 0.2 * frameTime if self.frames else frameTime
+            self.frames += 1
+            self.statsFrames += 1
+            if frameTime > self.targetInterval:
+                self.droppedFrames += 1
+
+            self.interval = min(
+                max(self.targetInterval, self.frameTime / self.cpuCeiling),
+                self.maxInterval
+            )
+
+        elapsed = start - self.statsStart
+        if elapsed >= 1.0:
+            self.fps = self.statsFrames / elapsed
+            self.statsStart = start
+            self.statsFrames = 0
+            self.statsChanged.emit(self.fps, self.droppedFrames)
+
+        self.schedule()
@@ -0,0 +1,291 @@
+"""Channel schemas describing the samples sent by a client.
+
+A client may announce its channels in a schema message when it connects
+(see protocol.py). Clients that do not announce a schema use the default
+schema, which is the original 13 double layout of the Simulink client.
+
+Channels are sent as doubles ("f8"), floats ("f4") or 16 bit integers
+("i2"). An integer channel has a scale and offset, and represents the value
+offset + scale * integer, so ADC data of up to 16 bits is sent in a quarter
+of the bytes of a double. Frames may also be delta encoded and compressed
+(see encoding.py).
+"""
+# Standard library imports
+from collections import namedtuple
+import json
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import encoding
+import protocol
+
+# Channel groups
+VOLTAGE_GROUP = "V"
+CURRENT_GROUP = "I"
+DERIVED_GROUP = "derived"
+
+# Supported sample types on the wire
+DTYPES = {"f4": np.dtype("<f4"), "f8": np.dtype("<f8"), "i2": np.dtype("<i2")}
+INTEGER_DTYPES = {"i2"}  # types of scaled integer channels
+
+Channel = namedtuple(
+    "Channel", ["name", "unit", "dtype", "group", "scale", "offset"], defaults=(1.0, 0.0)
+)
+
+# Describes how to decode the channels present in a frame. scales and
+# offsets are column vectors, or None if no channel in the frame is scaled.
+FrameLayout = namedtuple("FrameLayout", ["channels", "dtype", "sampleSize", "scales", "offsets"])
+
+
+class SchemaError(protocol.ProtocolError):
+    """Raised when a schema is invalid."""
+
+
+class ChannelSchema:
+    """Names, units, sample types and groups of the channels of a client.
+
+    Samples are stored as doubles whatever their type on the wire, so
+    compact types only reduce the bandwidth.
+    """
+    def __init__(self, channels) -> None:
+        self.channels = tuple(Channel(*channel) for channel in channels)
+        if not 0 < len(self.channels) <= protocol.MAX_CHANNELS:
+            raise SchemaError(f"A schema must have 1 to {protocol.MAX_CHANNELS} channels")
+        for channel in self.channels:
+            if channel.dtype not in DTYPES:
+                raise SchemaError(f"Unsupported dtype {channel.dtype!r} of channel {channel.name}")
+            if channel.dtype in INTEGER_DTYPES and not (np.isfinite(channel.scale) and channel.scale):
+                raise SchemaError(f"Invalid scale {channel.scale!r} of channel {channel.name}")
+
+        self.names = tuple(channel.name for channel in self.channels)
+        if len(set(self.names)) != len(self.names):
+            raise SchemaError("Channel names must be unique")
+        self.index = {name: index for index, name in enumerate(self.names)}
+        self.nChannels = len(self.channels)
+
+        # A legacy sample holds one value of every channel
+        self.legacyDtype = np.dtype(
+            [(channel.name, DTYPES[channel.dtype]) for channel in self.channels]
+        )
+        dtypes = {channel.dtype for channel in self.channels}
+        self.uniformDtype = DTYPES[dtypes.pop()] if len(dtypes) == 1 else None  # None if types are mixed
+
+        # Scale and offset of every channel, 1 and 0 for floating point channels
+        self.integer = np.array([channel.dtype in INTEGER_DTYPES for channel in self.channels])
+        self.scales = np.where(self.integer, [channel.scale for channel in self.channels], 1.0)
+        self.offsets = np.where(self.integer, [channel.offset for channel in self.channels], 0.0)
+
+        self.layouts = {}  # FrameLayout by channel mask
+
+    def __eq__(self, other):
+        return isinstance(other, ChannelSchema) and self.channels == other.channels
+
+    def __hash__(self):
+        return hash(self.channels)
+
+    def group(self, group):
+        """Return the indexes of the channels in a group."""
+        return [index for index, channel in enumerate(self.channels) if channel.group == group]
+
+    def phases(self):
+        """Return (voltage, current) channel index pairs, pairing the voltages
+        and currents in the order they appear.
+        """
+        return list(zip(self.group(VOLTAGE_GROUP), self.group(CURRENT_GROUP)))
+
+    def layout(self, channelMask):
+        """Return the layout of a frame with the channels in a channel mask."""
+        layout = self.layouts.get(channelMask)
+        if layout is None:
+            if channelMask >> self.nChannels:
+                raise protocol.ProtocolError(f"Channel mask {channelMask:#x} has unknown channels")
+            channels = protocol.maskChannels(channelMask, self.nChannels)
+            dtypes = {self.channels[channel].dtype for channel in channels}
+            scaled = self.integer[channels].any()
+            layout = FrameLayout(
+                channels,
+                DTYPES[dtypes.pop()] if len(dtypes) == 1 else None,  # None if types are mixed
+                sum(DTYPES[self.channels[channel].dtype].itemsize for channel in channels),
+                self.scales[channels, np.newaxis] if scaled else None,
+                self.offsets[channels, np.newaxis] if scaled else None,
+            )
+            self.layouts[channelMask] = layout
+        return layout
+
+    def decodeFrame(self, buffer, offset, layout, sampleCount, flags=0, length=None):
+        """Return the payload of a frame as an array of shape (channels in
+        frame, samples).
+
+        offset is the start of the payload, after its length prefix if the
+        frame has flags set, and length its length in bytes. If all channels
+        are floating point channels of the same type and no flags are set,
+        the array is a view onto the buffer, so it must be used before the
+        buffer is reused.
+        """
+        if flags & encoding.COMPRESSION_FLAGS:
+            buffer = encoding.decompress(memoryview(buffer)[offset:offset + length], flags)
+            offset = 0
+            length = len(buffer)
+        if flags & encoding.FLAG_DELTA:
+            return self.decodeDelta(buffer, offset, length, layout, sampleCount)
+        if length is not None and length != sampleCount * layout.sampleSize:
+            raise encoding.EncodingError(
+                f"Payload of {length} bytes does not hold {sampleCount} samples"
+            )
+
+        if layout.dtype is not None:
+            values = np.frombuffer(
+                buffer, dtype=layout.dtype, count=len(layout.channels) * sampleCount, offset=offset
+            ).reshape(len(layout.channels), sampleCount)
+            if layout.scales is not None:
+                values = values * layout.scales + layout.offsets
+            return values
+
+        values = np.empty((len(layout.channels), sampleCount))
+        for row, channel in enumerate(layout.channels):
+            dtype = DTYPES[self.channels[channel].dtype]
+            values[row] = np.frombuffer(buffer, dtype=dtype, count=sampleCount, offset=offset)
+            offset += dtype.itemsize * sampleCount
+        if layout.scales is not None:
+            values *= layout.scales
+            values += layout.offsets
+        return values
+
+    def decodeDelta(self, buffer, offset, length, layout, sampleCount):
+        """Decode a delta encoded payload. Integer channels are delta and
+        varint encoded, floating point channels are sent as they are.
+
+        The varints of consecutive integer channels are decoded together.
+        """
+        data = np.frombuffer(buffer, dtype=np.uint8, count=length, offset=offset)
+        values = np.empty((len(layout.channels), sampleCount))
+        position = 0
+        row = 0
+        while row < len(layout.channels):
+            channel = layout.channels[row]
+            if self.integer[channel]:
+                end = row + 1
+                while end < len(layout.channels) and self.integer[layout.channels[end]]:
+                    end += 1
+                deltas, nBytes = encoding.decodeVarints(data[position:], (end - row) * sampleCount)
+                values[row:end] = np.cumsum(
+                    encoding.unzigzag(deltas).reshape(end - row, sampleCount), axis=1
+                )
+            else:
+                dtype = DTYPES[self.channels[channel].dtype]
+                nBytes = dtype.itemsize * sampleCount
+                if position + nBytes > length:
+                    raise encoding.EncodingError("Delta encoded payload is truncated")
+                values[row] = data[position:position + nBytes].view(dtype)
+                end = row + 1
+            position += nBytes
+            row = end
+        if position != length:
+            raise encoding.EncodingError(f"{length - position} bytes left over in delta encoded payload")
+
+        if layout.scales is not None:
+            values *= layout.scales
+            values += layout.offsets
+        return values
+
+    def decodeLegacy(self, buffer, nSamples):
+        """Return nSamples legacy samples at the start of a buffer as an
+        array of shape (channels, samples).
+        """
+        if self.uniformDtype is not None:
+            values = np.frombuffer(
+                buffer, dtype=self.uniformDtype, count=nSamples * self.nChannels
+            ).reshape(nSamples, self.nChannels).T
+            if self.integer.any():
+                values = values * self.scales[:, np.newaxis] + self.offsets[:, np.newaxis]
+            return values
+
+        samples = np.frombuffer(buffer, dtype=self.legacyDtype, count=nSamples)
+        values = np.array([samples[name] for name in self.names], dtype=np.float64)
+        values *= self.scales[:, np.newaxis]
+        values += self.offsets[:, np.newaxis]
+        return values
+
+    def quantise(self, channel, values):
+        """Return values of an integer channel as the integers sent, rounded
+        and clipped to the range of the type.
+        """
+        dtype = DTYPES[self.channels[channel].dtype]
+        limits = np.iinfo(dtype)
+        integers = np.rint((values - self.offsets[channel]) / self.scales[channel])
+        return np.clip(integers, limits.min, limits.max).astype(dtype)
+
+    def encodeFrame(self, block, flags=0):
+        """Return the payload of a frame with all channels of a block of
+        shape (channels, samples), encoded as selected by flags.
+        """
+        if self.uniformDtype is not None and not self.integer.any() and not flags:
+            return block.astype(self.uniformDtype).tobytes()
+
+        parts = []
+        for channel in range(self.nChannels):
+            if not self.integer[channel]:
+                parts.append(block[channel].astype(DTYPES[self.channels[channel].dtype]).tobytes())
+            elif flags & encoding.FLAG_DELTA:
+                parts.append(encoding.encodeDelta(self.quantise(channel, block[channel])))
+            else:
+                parts.append(self.quantise(channel, block[channel]).tobytes())
+        payload = b"".join(parts)
+
+        if flags:
+            payload = encoding.compress(payload, flags)
+            payload = encoding.payloadLength.pack(len(payload)) + payload
+        return payload
+
+    def encodeLegacy(self, block):
+        """Return the legacy samples of a block of shape (channels, samples)."""
+        samples = np.empty(block.shape[1], dtype=self.legacyDtype)
+        for channel, name in enumerate(self.names):
+            if self.integer[channel]:
+                samples[name] = self.quantise(channel, block[channel])
+            else:
+                samples[name] = block[channel]
+        return samples.tobytes()
+
+    def toJson(self):
+        """Return the schema as sent in a schema message."""
+        return json.dumps({"channels": [channel._asdict() for channel in self.channels]})
+
+    def toMessage(self):
+        """Return the schema message announcing the schema to the server."""
+        payload = self.toJson().encode()
+        return protocol.frameHeader.pack(
+            protocol.SCHEMA_MAGIC, protocol.PROTOCOL_VERSION, 0, 0, len(payload), self.nChannels
+        ) + payload
+
+    @classmethod
+    def fromJson(cls, text):
+        """Create a schema from the payload of a schema message, as str or
+        UTF-8 bytes.
+        """
+        try:
+            channels = json.loads(text)["channels"]
+            return cls(
+                (
+                    channel["name"],
+                    channel.get("unit", ""),
+                    channel.get("dtype", "f8"),
+                    channel.get("group", DERIVED_GROUP),
+                    float(channel.get("scale", 1.0)),
+                    float(channel.get("offset", 0.0)),
+                )
+                for channel in channels
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            raise SchemaError(f"Invalid schema: {e}") from e
+
+
+# Layout of the original Simulink client
+defaultSchema = ChannelSchema(
+    [("debug", "", "f8", DERIVED_GROUP)]
+    + [(f"V{n}", "V", "f8", VOLTAGE_GROUP) for n in (1, 2, 3)]
+    + [(f"I{n}", "A", "f8", CURRENT_GROUP) for n in (1, 2, 3)]
+    + [(f"f0_{name}", "Hz", "f8", DERIVED_GROUP) for name in ("V1", "V2", "V3", "I1", "I2", "I3")]
+)
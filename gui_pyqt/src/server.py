@@ -2,6 +2,12 @@
 
 The server is responsible for acquiring data that is plotted.
 
+Clients are served by an asyncio event loop running in the server's
+QThread, so any number of data sources can be connected at once and a
+source can reconnect without restarting the GUI. Each client feeds its own
+AcquisitionSession and the GUI plots the active session. The channels of a
+session follow the schema announced by its client.
+
 To-do:
     * Check how quickly the client sends data and then profile how quickly the
         current server can run the whole while loop and then reconcile those times.
@@ -10,276 +16,499 @@ To-do:
         synchronise automatically (unless if using threads in the client).
 """
 # Standard library imports
-import socket
-import struct
+import asyncio
+import time
 
 # Third-party library imports
-from PyQt5.QtCore import QMutex, QObject
-import pyqtgraph as pg
+from PyQt5.QtCore import QObject, pyqtSignal
+import numpy as np
 
 # Local application imports
+import encoding
+import protocol
 import settings
+from control import ControlChannel
+from instrumentation import MetricsDump
+from schema import ChannelSchema, SchemaError, defaultSchema
+from session import AcquisitionSession
+
+
+class ClientConnection(asyncio.BufferedProtocol):
+    """Connection to one client, speaking the protocol selected by
+    settings.protocolMode.
+
+    Data is received straight into a reusable buffer and decoded with views
+    onto it, so nothing is allocated per sample. Each callback decodes at
+    most one buffer of data, so the event loop interleaves the clients and
+    a source sending faster than it can be processed does not starve the
+    others.
+
+    Control inputs are sent from a cached legacy control message answering
+    each received sample, or as control frames holding only the inputs that
+    changed, so the hot path never reads the GUI.
+
+    If a client stops reading, control data queued for it grows past
+    settings.sendBufferLimit and reading from that client is paused until
+    it catches up. Other clients are unaffected.
+
+    The first bytes received decide the channel schema of the connection:
+    either a schema message, or the first sample in the default schema.
+    Control frames advertise the frame encodings the server decodes in
+    their flags, and frames are decoded in whichever of them the client
+    selects.
+    """
+    def __init__(self, server) -> None:
+        self.server = server
+        self.framed = settings.protocolMode == protocol.FRAMED_MODE
+        self.transport = None
+        self.session = None
+        self.schema = None  # ChannelSchema of the client, once known
+
+        # -------------------------
+        # Reusable receive buffers
+        # -------------------------
+        self.receiveBuffer = bytearray(settings.receiveBufferSize)
+        self.receiveView = memoryview(self.receiveBuffer)
+        self.nReceived = 0  # bytes at the start of the receive buffer not yet decoded
+        self.receiveStart = 0  # time at which the event loop asked for a buffer to receive into
+
+        self.controlSequence = 0
+        self.pendingInputs = 0  # mask of control inputs changed but not yet sent in a control frame
+        self.writePaused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        host, port = transport.get_extra_info("peername")[:2]
+        self.session = self.server.attachSession(host)
+        if self.session is None:
+            print(f"Refused {host}:{port}, {settings.maxSessions} sources already connected")
+            transport.close()
+            return
+
+        print(f"Connected by {host}:{port} as {self.session.name}")
+        self.server.connections.add(self)
+        transport.set_write_buffer_limits(high=settings.sendBufferLimit)
+
+        # Always send first. The Simulink block written for this program calls a
+        # blocking recv, so it will block if recv is called with no data sent.
+        if self.framed:
+            self.sendControls(protocol.ALL_CONTROL_INPUTS)
+        else:
+            transport.write(self.server.legacyControlMessage)
+
+    def connection_lost(self, exc):
+        if self.session is not None:
+            print(f"{self.session.name} disconnected")
+            self.server.connections.discard(self)
+            self.server.detachSession(self.session)
+
+    def pause_writing(self):
+        self.writePaused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.writePaused = False
+        self.transport.resume_reading()
+        if self.pendingInputs:
+            self.sendControls(0)
+
+    def get_buffer(self, sizehint):
+        if self.nReceived == len(self.receiveBuffer):
+            # A frame larger than the receive buffer is arriving
+            self.growReceiveBuffer(2 * len(self.receiveBuffer))
+        # The event loop receives into the buffer straight after this returns
+        self.receiveStart = time.perf_counter_ns()
+        return self.receiveView[self.nReceived:]
+
+    def buffer_updated(self, nbytes):
+        decodeStart = time.perf_counter_ns()
+        metrics = self.session.metrics
+        metrics.record("receive", decodeStart - self.receiveStart)
+        totalWritten = self.session.sampleStore.totalWritten
+
+        self.nReceived += nbytes
+        try:
+            consumed = 0
+            if self.schema is None:
+                consumed = self.readSchema()
+                totalWritten = self.session.sampleStore.totalWritten  # replaced if the schema changed
+            if self.schema is not None:
+                consumed += self.decodeFramed(consumed) if self.framed else self.decodeLegacy(consumed)
+        except protocol.ProtocolError as e:
+            print(f"{self.session.name}: {e}")
+            self.transport.close()
+            return
+
+        # Decode time includes writing samples and running the trigger function
+        metrics.record("decode", time.perf_counter_ns() - decodeStart)
+        metrics.addReceived(self.session.sampleStore.totalWritten - totalWritten, nbytes)
+
+        # Move any incomplete message to the start of the buffer
+        remaining = self.nReceived - consumed
+        if consumed and remaining:
+            self.receiveBuffer[:remaining] = self.receiveBuffer[consumed:self.nReceived]
+        self.nReceived = remaining
+
+    def growReceiveBuffer(self, size):
+        """Reallocate the receive buffer, keeping undecoded data."""
+        receiveBuffer = bytearray(size)
+        receiveBuffer[:self.nReceived] = self.receiveBuffer[:self.nReceived]
+        self.receiveBuffer = receiveBuffer
+        self.receiveView = memoryview(self.receiveBuffer)
+
+    def readSchema(self):
+        """Set the schema of the client from a schema message at the start
+        of the receive buffer, or to the default schema if the client starts
+        sending samples instead. Returns the number of bytes decoded.
+        """
+        headerSize = protocol.frameHeader.size
+        if self.nReceived < len(protocol.SCHEMA_MAGIC):
+            return 0
+        if self.receiveBuffer[:len(protocol.SCHEMA_MAGIC)] != protocol.SCHEMA_MAGIC:
+            self.setSchema(defaultSchema)
+            return 0
+        if self.nReceived < headerSize:
+            return 0
+
+        magic, version, flags, sequence, payloadLength, nChannels = (
+            protocol.frameHeader.unpack_from(self.receiveBuffer)
+        )
+        if version != protocol.PROTOCOL_VERSION:
+            raise protocol.ProtocolError(f"Unexpected schema version {version}")
+        if self.nReceived < headerSize + payloadLength:
+            return 0  # wait for the rest of the schema
+
+        schema = ChannelSchema.fromJson(
+            bytes(self.receiveBuffer[headerSize:headerSize + payloadLength])
+        )
+        if schema.nChannels != nChannels:
+            raise SchemaError(f"Schema message has {schema.nChannels} channels, header says {nChannels}")
+        self.setSchema(schema)
+        return headerSize + payloadLength
+
+    def setSchema(self, schema):
+        """Set the schema of the client, reconfiguring its session if the
+        session held channels of another schema.
+        """
+        self.schema = schema
+        if schema != self.session.schema:
+            print(f"{self.session.name}: {schema.nChannels} channels {', '.join(schema.names)}")
+            self.session.configure(schema)
+            self.server.sessionsChanged.emit()
+
+    def decodeLegacy(self, offset=0):
+        """Append the complete samples in the receive buffer from offset to
+        the session and answer each with the control inputs. Returns the
+        number of bytes decoded.
+        """
+        sampleSize = self.schema.legacyDtype.itemsize
+        nSamples = (self.nReceived - offset) // sampleSize
+        if not nSamples:
+            return 0
+
+        samples = self.schema.decodeLegacy(self.receiveView[offset:], nSamples)
+        if nSamples == 1:
+            self.session.appendSample(samples[:, 0])
+        else:
+            self.session.appendBlock(samples)
+
+        # One control message answers each sample, sent with a single write
+        self.transport.write(self.server.legacyControlMessage * nSamples)
+        return nSamples * sampleSize
+
+    def decodeFramed(self, offset=0):
+        """Append the complete frames in the receive buffer from offset to
+        the session. Returns the number of bytes decoded.
+        """
+        session = self.session
+        schema = self.schema
+        start = offset
+        while self.nReceived - offset >= protocol.frameHeader.size:
+            magic, version, flags, sequence, sampleCount, channelMask = (
+                protocol.frameHeader.unpack_from(self.receiveBuffer, offset)
+            )
+            if magic != protocol.FRAME_MAGIC or version != protocol.PROTOCOL_VERSION:
+                raise protocol.ProtocolError(
+                    f"Unexpected frame header {magic!r} version {version}"
+                )
+            if flags & ~encoding.SUPPORTED_FLAGS:
+                raise protocol.ProtocolError(f"Unsupported frame encoding {flags:#x}")
+
+            layout = schema.layout(channelMask)
+            payloadOffset = offset + protocol.frameHeader.size
+            length = None
+            if flags:
+                # Encoded payloads are prefixed with their length
+                if self.nReceived - payloadOffset < encoding.payloadLength.size:
+                    break
+                length, = encoding.payloadLength.unpack_from(self.receiveBuffer, payloadOffset)
+                payloadOffset += encoding.payloadLength.size
+                frameSize = payloadOffset - offset + length
+            else:
+                frameSize = protocol.frameHeader.size + sampleCount * layout.sampleSize
+            if self.nReceived - offset < frameSize:
+                break  # wait for the rest of the frame
+
+            values = schema.decodeFrame(
+                self.receiveBuffer, payloadOffset, layout, sampleCount, flags, length
+            )
+            session.frameSequence = sequence
+            session.metrics.checkSequence(sequence)
+
+            if len(layout.channels) == session.nChannels:
+                session.appendBlock(values)
+            else:
+                # Channels missing from the frame hold their last value
+                block = np.empty((session.nChannels, sampleCount))
+                block[:] = session.sampleStore.latest()[:, np.newaxis]
+                block[layout.channels] = values
+                session.appendBlock(block, layout.channels)
+            offset += frameSize
+
+        return offset - start
+
+    def sendControls(self, inputMask):
+        """Send the control inputs in inputMask, which have changed, in a
+        control frame.
+
+        Nothing is sent with the legacy protocol, which answers every sample
+        with all inputs. While the client is not keeping up with what has
+        already been sent, changes accumulate and are sent together later.
+        """
+        if not self.framed:
+            return
+        self.pendingInputs |= inputMask
+        if self.writePaused:
+            return
+        self.transport.write(
+            protocol.packControlFrame(
+                self.controlSequence,
+                self.server.controls.values,
+                self.pendingInputs,
+                encoding.SUPPORTED_FLAGS
+            )
+        )
+        self.controlSequence += 1
+        self.pendingInputs = 0
+
 
 class TcpServer(QObject):
     """Tcp server implementation.
-    
+
     The server is responsible for acquiring and managing data that is
     then plotted.
+
+    Sessions outlive their connections. A client reconnecting from the same
+    host resumes its previous session, and the first client to connect
+    takes over the session created before any client connected, so the
+    GUI always has an active session to plot.
     """
-    def __init__(
-                    self,
-                    inputGroup1DoubleSpinBox_1,
-                    inputGroup1DoubleSpinBox_2,
-                    inputGroup1DoubleSpinBox_3,
-                    inputGroup2DoubleSpinBox_1,
-                    inputGroup2DoubleSpinBox_2,
-                    inputGroup2DoubleSpinBox_3
-                ) -> None:
+    sessionsChanged = pyqtSignal()  # emitted when a client connects or disconnects
+
+    def __init__(self, controlInputs, sessionClass=AcquisitionSession) -> None:
         super(QObject, self).__init__()
-        self.bufferLen = 13  # number of elements in received TCP buffer
-        self.bufferSize = (
-            self.bufferLen * 8
-        )  # number of bytes in received TCP buffer. 8 because storing doubles.
+        self.sessionClass = sessionClass  # class of the sessions created for sources
 
-        # ------------
-        # QMutex setup
-        # ------------
-        self.mutex = QMutex()
+        # Control inputs posted by the GUI, and their legacy protocol message
+        # which is only packed again when they change
+        self.controls = ControlChannel(controlInputs)
+        self.legacyControlMessage = protocol.legacyControls.pack(*self.controls.values)
 
         # ---------------
         # Initialisations
         # ---------------
-        self.debugBuffer = [] # buffer for use in debugging
-        self.v1Buffer = []
-        self.v2Buffer = []
-        self.v3Buffer = []
-        self.i1Buffer = []
-        self.i2Buffer = []
-        self.i3Buffer = []
-
-        self.v1TriggerValue = -1
-        self.v2TriggerValue = -1
-        self.v3TriggerValue = -1
-        self.i1TriggerValue = -1
-        self.i2TriggerValue = -1
-        self.i3TriggerValue = -1
-
-        self.v1UpperLimit = 0
-        self.v1LowerLimit = 0
-        self.v2UpperLimit = 0
-        self.v2LowerLimit = 0
-        self.v3UpperLimit = 0
-        self.v3LowerLimit = 0
-        self.i1UpperLimit = 0
-        self.i1LowerLimit = 0
-        self.i2UpperLimit = 0
-        self.i2LowerLimit = 0
-        self.i3UpperLimit = 0
-        self.i3LowerLimit = 0
-
-        self.f0_V1 = 0
-        self.f0_V2 = 0
-        self.f0_V3 = 0
-        self.f0_I1 = 0
-        self.f0_I2 = 0
-        self.f0_I3 = 0
-
-        self.inputGroup1DoubleSpinBox_1 = inputGroup1DoubleSpinBox_1
-        self.inputGroup1DoubleSpinBox_2 = inputGroup1DoubleSpinBox_2
-        self.inputGroup1DoubleSpinBox_3 = inputGroup1DoubleSpinBox_3
-        self.inputGroup2DoubleSpinBox_1 = inputGroup2DoubleSpinBox_1
-        self.inputGroup2DoubleSpinBox_2 = inputGroup2DoubleSpinBox_2
-        self.inputGroup2DoubleSpinBox_3 = inputGroup2DoubleSpinBox_3
+        self.triggerMode = settings.triggerMode
+        self.triggerSlope = settings.triggerSlope
+
+        self.sessions = {}  # AcquisitionSession of every source, by name
+        self.activeSession = self.createSession()  # session plotted by the GUI
+        self.connections = set()  # open ClientConnections
+
+        self.loop = None  # asyncio event loop, while running
+        self.listener = None  # asyncio server accepting clients
+
+        # Metrics of all sessions appended to a file for soak runs
+        self.metricsDump = None
+        if settings.metricsDumpPath:
+            self.metricsDump = MetricsDump(
+                settings.metricsDumpPath, self.metricsSummaries, settings.metricsDumpInterval
+            )
+
+    # ----------------------------
+    # State of the active session
+    # ----------------------------
+    @property
+    def sampleStore(self):
+        return self.activeSession.sampleStore
+
+    @property
+    def historyPyramid(self):
+        return self.activeSession.historyPyramid
+
+    @property
+    def trigger(self):
+        return self.activeSession.trigger
+
+    @property
+    def measurements(self):
+        return self.activeSession.measurements
+
+    @property
+    def latestFrame(self):
+        return self.activeSession.latestFrame
 
     def runServer(self):
-        """Listen for connections to a socket and if a client connects,
-        start receving data and writing it to buffers.
+        """Accept clients and receive their data until stopServer is
+        called.
         """
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind((settings.HOST, settings.PORT))
-            s.listen()
-            conn, addr = s.accept()
-            with conn:
-                print(f"Connected by {addr}")
-                while True:
-                    # -----------
-                    # Inputs send
-                    # -----------
-                    # Always send first before recv incase some data to be received depends on sent data.
-                    # Additionally, Simulink block written for this program calls a blocking recv, so it
-                    # will block if recv is called with no data sent.
-                    doubleList = [
-                        self.inputGroup1DoubleSpinBox_1.value(),
-                        self.inputGroup1DoubleSpinBox_2.value(),
-                        self.inputGroup1DoubleSpinBox_3.value(),
-                        self.inputGroup2DoubleSpinBox_1.value(),
-                        self.inputGroup2DoubleSpinBox_2.value(),
-                        self.inputGroup2DoubleSpinBox_3.value()
-                    ]
-                    dataToSend = struct.pack("6d", *doubleList)
-                    conn.sendall(dataToSend)
-
-                    # ------------
-                    # Data receive
-                    # ------------
-                    sizeToRead = self.bufferSize
-                    data = b""
-
-                    # Keep receiving until the expected buffer size has been read
-                    while sizeToRead > 0:
-                        data = data + conn.recv(sizeToRead)
-                        sizeToRead -= len(data)
-
-                    data = struct.unpack((str(self.bufferLen) + "d"), data)
-
-                    v1Value = data[1]
-                    v2Value = data[2]
-                    v3Value = data[3]
-                    i1Value = data[4]
-                    i2Value = data[5]
-                    i3Value = data[6]
-        
-                    # print(data[0])
-
-                    # Add received data to appropriate buffers
-                    self.debugBuffer.append(data[0])
-                    self.v1Buffer.append(v1Value)
-                    self.v2Buffer.append(v2Value)
-                    self.v3Buffer.append(v3Value)
-                    self.i1Buffer.append(i1Value)
-                    self.i2Buffer.append(i2Value)
-                    self.i3Buffer.append(i3Value)
-
-                    self.f0_V1 = data[7]
-                    self.f0_V2 = data[8]
-                    self.f0_V3 = data[9]
-                    self.f0_I1 = data[10]
-                    self.f0_I2 = data[11]
-                    self.f0_I3 = data[12]
-
-                    # Run trigger function
-                    self.computeTriggeredPlotRanges(v1Value, v2Value, v3Value, i1Value, i2Value, i3Value)
-
-                    if len(self.v1Buffer) > settings.maxBufferLength:
-                        self.clearBuffers()
-
-    def computeTriggeredPlotRanges(self, v1Value, v2Value, v3Value, i1Value, i2Value, i3Value):
-        """Determine the range of indexes to be plotted for each buffer
-        such that the moving signal can, somewhat, appear in the same
-        place. This is based on the triggering function of oscilloscopes.
-
-        This method is synchronized with the plotting using a mutex lock to
-        avoid plotting while the indexes are being modified.
-
-        Warning:
-            If data is not repeating, do not run trigger function as it will
-            not work.
+        if self.metricsDump is not None:
+            self.metricsDump.start()
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.listener = await self.loop.create_server(
+            lambda: ClientConnection(self), settings.HOST, settings.PORT
+        )
+        self.applyControls()  # inputs changed before the loop was running
+        try:
+            async with self.listener:
+                await self.listener.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop = None
+
+    def stopServer(self):
+        """Close all connections and stop the event loop. May be called from
+        any thread.
         """
-        self.mutex.lock()
-        # Check trigger value
-        if v1Value > self.v1TriggerValue:
-            self.v1UpperLimit = len(self.v1Buffer)
-            self.v1LowerLimit = self.v1UpperLimit - settings.nSamplesInView
-            if self.v1LowerLimit < 0:
-                self.v1LowerLimit = 0
-
-        if v2Value > self.v2TriggerValue:
-            self.v2UpperLimit = len(self.v2Buffer)
-            self.v2LowerLimit = self.v2UpperLimit - settings.nSamplesInView
-            if self.v2LowerLimit < 0:
-                self.v2LowerLimit = 0
-
-        if v3Value > self.v3TriggerValue:
-            self.v3UpperLimit = len(self.v3Buffer)
-            self.v3LowerLimit = self.v3UpperLimit - settings.nSamplesInView
-            if self.v3LowerLimit < 0:
-                self.v3LowerLimit = 0
-
-        if i1Value > self.i1TriggerValue:
-            self.i1UpperLimit = len(self.i1Buffer)
-            self.i1LowerLimit = self.i1UpperLimit - settings.nSamplesInView
-            if self.i1LowerLimit < 0:
-                self.i1LowerLimit = 0
-
-        if i2Value > self.i2TriggerValue:
-            self.i2UpperLimit = len(self.i2Buffer)
-            self.i2LowerLimit = self.i2UpperLimit - settings.nSamplesInView
-            if self.i2LowerLimit < 0:
-                self.i2LowerLimit = 0
-
-        if i3Value > self.i3TriggerValue:
-            self.i3UpperLimit = len(self.i3Buffer)
-            self.i3LowerLimit = self.i3UpperLimit - settings.nSamplesInView
-            if self.i3LowerLimit < 0:
-                self.i3LowerLimit = 0        
-
-        self.mutex.unlock()
-    
-    def computeNonTriggeredPlotRanges(self):
-        """Compute plot ranges for non-triggered (i.e. non-repeating) channels."""
-        if len(self.v1Buffer) >= settings.nSamplesInView:
-            self.mutex.lock()
-            v1BufferLen = len(self.v1Buffer)
-            self.v1UpperLimit = v1BufferLen
-            self.v1LowerLimit = v1BufferLen - settings.nSamplesInView
-
-            # v2BufferLen = len(self.v2Buffer)
-            # self.v2UpperLimit = v2BufferLen
-            # self.v2LowerLimit = v2BufferLen - settings.nSamplesInView
-
-            # v3BufferLen = len(self.v3Buffer)
-            # self.v3UpperLimit = v3BufferLen
-            # self.v3LowerLimit = v3BufferLen - settings.nSamplesInView
-
-            # i1BufferLen = len(self.i1Buffer)
-            # self.i1UpperLimit = i1BufferLen
-            # self.i1LowerLimit = i1BufferLen - settings.nSamplesInView
-
-            # i2BufferLen = len(self.i2Buffer)
-            # self.i2UpperLimit = i2BufferLen
-            # self.i2LowerLimit = i2BufferLen - settings.nSamplesInView
-
-            # i3BufferLen = len(self.i3Buffer)
-            # self.i3UpperLimit = i3BufferLen
-            # self.i3LowerLimit = i3BufferLen - settings.nSamplesInView
-            # self.mutex.unlock()
-
-    def clearBuffers(self):
-        """If buffers get too large, clear them an only leave the data
-        to be plotted in the current frame.
-        
-        This method is synchronized with the plotting using a mutex lock to
-        avoid plotting while the buffers are being modified.
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.closeConnections)
+        for session in self.sessions.values():
+            session.close()
+        if self.metricsDump is not None:
+            self.metricsDump.stop()
+
+    def metricsSummaries(self):
+        """Return the metrics of every session by session name."""
+        return {name: session.metricsSummary() for name, session in list(self.sessions.items())}
+
+    def closeConnections(self):
+        self.listener.close()
+        for connection in list(self.connections):
+            connection.transport.close()
+
+    def createSession(self, name=None):
+        """Create a session for a new source, named after the first free
+        source number if no name is given.
         """
-        self.mutex.lock()
-
-        del self.v1Buffer[:self.v1LowerLimit]
-        self.v1LowerLimit = 0
-        self.v1UpperLimit = len(self.v1Buffer)
-
-        del self.v2Buffer[:self.v2LowerLimit]
-        self.v2LowerLimit = 0
-        self.v2UpperLimit = len(self.v2Buffer)
-
-        del self.v3Buffer[:self.v3LowerLimit]
-        self.v3LowerLimit = 0
-        self.v3UpperLimit = len(self.v3Buffer)
-
-        del self.i1Buffer[:self.i1LowerLimit]
-        self.i1LowerLimit = 0
-        self.i1UpperLimit = len(self.i1Buffer)
-
-        del self.i2Buffer[:self.i2LowerLimit]
-        self.i2LowerLimit = 0
-        self.i2UpperLimit = len(self.i2Buffer)
-
-        del self.i3Buffer[:self.i3LowerLimit]
-        self.i3LowerLimit = 0
-        self.i3UpperLimit = len(self.i3Buffer)
-
-        self.mutex.unlock()
-
-
-
-
+        if name is None:
+            n = 1
+            while f"source{n}" in self.sessions:
+                n += 1
+            name = f"source{n}"
+        session = self.sessionClass(name)
+        session.trigger.mode = self.triggerMode
+        session.trigger.slope = self.triggerSlope
+        self.sessions[name] = session
+        return session
+
+    def restoreSessions(self, cache):
+        """Recreate the sessions of a SessionCache saved by an earlier run
+        with their samples. Must be called before the server is started.
+        """
+        for cached in cache.sessions:
+            session = self.sessions.get(cached.name)
+            if session is None:
+                session = self.createSession(cached.name)
+            if session.schema != cached.schema:
+                session.configure(cached.schema)
+            session.host = cached.host
+            session.restore(cached.samples)
+
+        if cache.activeSession in self.sessions:
+            self.activeSession = self.sessions[cache.activeSession]
+
+    def attachSession(self, host):
+        """Return the session to be fed by a client that has connected from
+        host, or None if settings.maxSessions sources are connected.
+        """
+        idle = [
+            session for session in self.sessions.values()
+            if not session.connected and session.host in (host, None)
+        ]
+        # Prefer the session previously fed from the same host
+        idle.sort(key=lambda session: session.host is None)
+        if idle:
+            session = idle[0]
+        elif sum(session.connected for session in self.sessions.values()) < settings.maxSessions:
+            session = self.createSession()
+        else:
+            return None
+
+        session.host = host
+        session.connected = True
+        session.metrics.resetRates()
+        session.measurements.start()
+        session.eventDetector.start()
+        if settings.recordingEnabled and session.recorder is None:
+            session.startRecording()
+        self.sessionsChanged.emit()
+        return session
+
+    def detachSession(self, session):
+        """Keep the samples of a session whose client has disconnected, for
+        when it reconnects.
+        """
+        session.connected = False
+        session.eventDetector.stop()
+        self.sessionsChanged.emit()
+
+    def setActiveSession(self, name):
+        """Select the session plotted by the GUI."""
+        self.activeSession = self.sessions[name]
+
+    def setTriggerMode(self, mode):
+        """Change the trigger mode of all sessions."""
+        self.triggerMode = mode
+        for session in self.sessions.values():
+            session.trigger.setMode(mode)
+
+    def setTriggerSlope(self, slope):
+        """Change the trigger slope of all sessions."""
+        self.triggerSlope = slope
+        for session in self.sessions.values():
+            session.trigger.slope = slope
+
+    def rearmTrigger(self):
+        """Re-arm the trigger of all sessions."""
+        for session in self.sessions.values():
+            session.trigger.rearm()
+
+    def postControl(self, index, value):
+        """Change the value of a control input. Called from the GUI thread."""
+        self.controls.post(index, value)
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.applyControls)
+
+    def applyControls(self):
+        """Send control inputs changed since the last call to all clients."""
+        changed = self.controls.collect()
+        if not changed:
+            return
+        self.legacyControlMessage = protocol.legacyControls.pack(*self.controls.values)
+        for connection in self.connections:
+            connection.sendControls(changed)
+
+    def startRecording(self, path=None):
+        """Start recording the active session. Returns the path of the
+        recording.
+        """
+        return self.activeSession.startRecording(path)
 
+    def stopRecording(self):
+        """Stop recording the active session."""
+        self.activeSession.stopRecording()
@@ -0,0 +1,243 @@
+"""Acquisition state of one data source.
+
+Every client connected to the server feeds its own AcquisitionSession, so
+sources never share ring buffers. The channels of a session are described
+by the channel schema of its client and named in the namespace of the
+session e.g. "source2.V1".
+"""
+# Standard library imports
+from collections import namedtuple
+import os
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import settings
+from decimation import MinMaxPyramid
+from events import EventDetector, EventStore
+from instrumentation import PipelineMetrics
+from measurements import PowerQualityEngine
+from recorder import CaptureRecorder, recordingPath
+from ringbuffer import RingBuffer
+from schema import CURRENT_GROUP, VOLTAGE_GROUP, defaultSchema
+from trigger import TriggerEngine
+
+# Consistent view of the acquisition state published for the GUI.
+# endIndex is the absolute index one past the most recent sample and
+# windows holds the (lower, upper) plot range of each trigger channel.
+Frame = namedtuple("Frame", ["endIndex", "windows"])
+
+
+class AcquisitionSession:
+    """Sample store and the data derived from it for one data source.
+
+    Samples are appended from the acquisition thread. Everything read by
+    the GUI is either published atomically (latestFrame, trigger windows,
+    measurement results) or copied with snapshots of the sample store.
+    """
+    def __init__(self, name, schema=defaultSchema) -> None:
+        self.name = name
+        self.host = None  # host of the client feeding the session, once one has connected
+        self.connected = False
+        self.recorder = None  # CaptureRecorder while recording to disk
+        self.metrics = PipelineMetrics()
+        self.events = EventStore(settings.maxEvents)  # power quality events detected in the session
+        self.configure(schema)
+
+    def configure(self, schema):
+        """Create the sample store and everything derived from it for a
+        channel schema, discarding any samples received so far.
+
+        Must not be called while samples are being appended. A recording
+        goes on in a new file, or in the same file if nothing was recorded in
+        it yet e.g. when the client announces its schema after connecting.
+        """
+        if getattr(self, "measurements", None) is not None:
+            self.measurements.stop()
+            self.eventDetector.stop()
+        recorder = self.recorder
+        self.stopRecording()
+
+        self.schema = schema
+        self.nChannels = schema.nChannels
+
+        # Store of the most recent samples of all channels. Its memory footprint
+        # is fixed at self.sampleStore.nbytes.
+        self.sampleStore = self.createRingBuffer(self.nChannels, settings.maxBufferLength)
+
+        # Min/max summaries of the sample store used for plotting history
+        self.historyPyramid = MinMaxPyramid(
+            self.sampleStore, settings.decimationFactor, ringBuffer=self.createRingBuffer
+        )
+
+        # Trigger deciding which window of each voltage and current is plotted live
+        self.trigger = TriggerEngine(
+            schema.group(VOLTAGE_GROUP) + schema.group(CURRENT_GROUP),
+            settings.nSamplesInView,
+            level=settings.triggerLevel,
+            hysteresis=settings.triggerHysteresis,
+            slope=settings.triggerSlope,
+            holdoff=settings.triggerHoldoff,
+            preTriggerFraction=settings.preTriggerFraction,
+            mode=settings.triggerMode
+        )
+
+        # Power quality measurements computed from the sample store on a worker thread
+        self.measurements = PowerQualityEngine(
+            self.sampleStore,
+            schema.phases(),
+            1 / settings.axisScalingFactor,
+            interval=settings.measurementsInterval,
+            thdCycles=settings.thdCycles,
+            nHarmonics=settings.nHarmonics
+        )
+
+        # Channels the client has sent at least once. Channels left out of
+        # frames hold their last value, which is meaningless for events.
+        self.receivedChannels = np.zeros(self.nChannels, dtype=bool)
+
+        # Power quality events detected from the sample store on a worker thread
+        self.events.clear()
+        self.eventDetector = EventDetector(
+            self.sampleStore,
+            schema,
+            settings.eventRules,
+            self.events,
+            self.name,
+            1 / settings.axisScalingFactor,
+            nominalFrequency=settings.nominalFrequency,
+            hysteresis=settings.eventHysteresis,
+            preSeconds=settings.eventPreSeconds,
+            postSeconds=settings.eventPostSeconds,
+            interval=settings.eventInterval,
+            receivedChannels=self.receivedChannels
+        )
+
+        self.frameSequence = 0  # sequence number of last received frame
+
+        # Latest Frame. Replaced as a whole, so the GUI reads it without locking.
+        self.latestFrame = Frame(0, self.trigger.windows)
+
+        if self.connected:
+            self.measurements.start()
+            self.eventDetector.start()
+        if recorder is not None:
+            path = None
+            if not recorder.index:
+                # Nothing was recorded in it, so start again in its place
+                os.remove(recorder.path)
+                path = recorder.path
+            self.startRecording(path)
+
+    def createRingBuffer(self, nChannels, capacity):
+        """Return a ring buffer for the sample store or the history pyramid."""
+        return RingBuffer(nChannels, capacity)
+
+    @property
+    def recording(self):
+        return self.recorder is not None
+
+    def restore(self, samples):
+        """Fill the sample store with samples of shape (channels, samples)
+        saved by an earlier run, as if they had just been received. Must be
+        called before a client feeds the session.
+        """
+        self.sampleStore.write(samples[:, -self.sampleStore.capacity:])
+        self.historyPyramid.update()
+        self.updateTrigger()
+
+    def channelName(self, channel):
+        """Return the name of a channel in the namespace of the session."""
+        return f"{self.name}.{self.schema.names[channel]}"
+
+    def appendSample(self, data):
+        """Add one sample of all channels to the sample store and run the
+        trigger function.
+        """
+        self.receivedChannels[:] = True
+        writeStart = time.perf_counter_ns()
+        self.sampleStore.writeSample(data)
+        self.metrics.record("write", time.perf_counter_ns() - writeStart)
+        self.historyPyramid.update()
+
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.appendSample(data)
+
+        # Run trigger function once enough samples have accumulated
+        if self.sampleStore.totalWritten - self.trigger.processedIndex >= settings.triggerBatchSize:
+            self.updateTrigger()
+
+    def appendBlock(self, block, channels=None):
+        """Add a block of samples with shape (channels, samples) to the sample
+        store and run the trigger function over the block.
+
+        channels are the indexes of the channels sent by the client, if not
+        all of them.
+        """
+        self.receivedChannels[slice(None) if channels is None else channels] = True
+        writeStart = time.perf_counter_ns()
+        self.sampleStore.write(block)
+        self.metrics.record("write", time.perf_counter_ns() - writeStart)
+        self.historyPyramid.update()
+
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.append(block)
+
+        # Run trigger function
+        self.updateTrigger()
+
+    def updateTrigger(self):
+        """Run the trigger function over new samples and publish the result."""
+        triggerStart = time.perf_counter_ns()
+        self.trigger.update(self.sampleStore)
+        self.metrics.record("trigger", time.perf_counter_ns() - triggerStart)
+        self.publishFrame()
+
+    def publishFrame(self):
+        """Publish the current acquisition state for the GUI."""
+        self.latestFrame = Frame(self.trigger.processedIndex, self.trigger.windows)
+
+    def metricsSummary(self):
+        """Return the metrics of the session in a flat dictionary."""
+        summary = self.metrics.summary()
+        summary["snapshot_retries"] = self.sampleStore.snapshotRetries
+        summary["dropped_chunks"] = self.recorder.droppedChunks if self.recorder is not None else 0
+        return summary
+
+    def startRecording(self, path=None):
+        """Start streaming all received samples to a recording file.
+
+        If no path is given, a timestamped file named after the session is
+        created in settings.recordingDirectory. Returns the path of the
+        recording.
+        """
+        if path is None:
+            path = recordingPath(settings.recordingDirectory, self.name)
+        self.stopRecording()
+        self.recorder = CaptureRecorder(
+            path,
+            self.nChannels,
+            settings.axisScalingFactor,
+            firstIndex=self.sampleStore.totalWritten,
+            chunkSamples=settings.recordingChunkSamples,
+            queueLength=settings.recordingQueueLength,
+            schema=self.schema
+        )
+        return path
+
+    def stopRecording(self):
+        """Stop recording and finalise the recording file."""
+        recorder = self.recorder
+        self.recorder = None
+        if recorder is not None:
+            recorder.close()
+
+    def close(self):
+        """Stop the worker threads of the session."""
+        self.measurements.stop()
+        self.eventDetector.stop()
+        self.stopRecording()
@@ -0,0 +1,111 @@
+"""Persistence of the latest samples and the view between runs.
+
+On exit, the most recent settings.sessionCacheSeconds of every channel of
+every session are saved as .npy files, with an index in JSON holding the
+schema of each session and the view state of the GUI. The sample files of
+each run have names of their own and the index is replaced last, so an
+index always refers to complete files of the run that wrote it. On startup the files
+are memory-mapped and copied into the sample stores of the sessions, so
+history is available before any client has connected.
+"""
+# Standard library imports
+from collections import namedtuple
+import json
+import os
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import settings
+from schema import ChannelSchema, SchemaError
+
+CACHE_VERSION = 1
+INDEX_FILE = "sessions.json"
+
+# A session saved by an earlier run. samples is memory-mapped with shape
+# (channels, samples).
+CachedSession = namedtuple("CachedSession", ["name", "host", "schema", "samples"])
+
+# Contents of the cache. view is the dictionary saved by the GUI.
+SessionCache = namedtuple("SessionCache", ["activeSession", "view", "sessions"])
+
+
+def save(server, view, directory=None):
+    """Save the latest samples of every session of a server and the view
+    state. Must not be called while samples are being received.
+    """
+    directory = settings.cacheDirectory if directory is None else directory
+    os.makedirs(directory, exist_ok=True)
+    maxSamples = int(settings.sessionCacheSeconds / settings.axisScalingFactor)
+    run = f"{time.time_ns():x}"  # tells the sample files of this run from those of the last
+
+    sessions = []
+    for name, session in server.sessions.items():
+        store = session.sampleStore
+        samples = store.read(store.totalWritten - maxSamples, store.totalWritten)
+        if not samples.shape[1]:
+            continue
+
+        fileName = f"{name}-{run}.npy"
+        np.save(os.path.join(directory, fileName), samples)
+        sessions.append(
+            {
+                "name": name,
+                "host": session.host,
+                "schema": json.loads(session.schema.toJson()),
+                "file": fileName,
+            }
+        )
+
+    # Replace the index last, so it never refers to files of another run,
+    # then remove the sample files of earlier runs
+    indexPath = os.path.join(directory, INDEX_FILE)
+    with open(f"{indexPath}.tmp", "w") as f:
+        json.dump(
+            {
+                "version": CACHE_VERSION,
+                "activeSession": server.activeSession.name,
+                "view": view,
+                "sessions": sessions,
+            },
+            f,
+            indent=2,
+        )
+    os.replace(f"{indexPath}.tmp", indexPath)
+
+    current = {session["file"] for session in sessions}
+    for fileName in os.listdir(directory):
+        if fileName.endswith(".npy") and fileName not in current:
+            try:
+                os.remove(os.path.join(directory, fileName))
+            except OSError:
+                pass  # removed on a later run
+
+
+def load(directory=None):
+    """Return the SessionCache saved by an earlier run, or None if there is
+    none or it cannot be read.
+    """
+    directory = settings.cacheDirectory if directory is None else directory
+    indexPath = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(indexPath):
+        return None
+    try:
+        with open(indexPath) as f:
+            index = json.load(f)
+        if index.get("version") != CACHE_VERSION:
+            return None
+
+        sessions = []
+        for entry in index["sessions"]:
+            schema = ChannelSchema.fromJson(json.dumps(entry["schema"]))
+            samples = np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+            if samples.ndim != 2 or samples.shape[0] != schema.nChannels:
+                continue
+            sessions.append(CachedSession(entry["name"], entry["host"], schema, samples))
+        return SessionCache(index["activeSession"], index["view"], sessions)
+    except (OSError, ValueError, KeyError, TypeError, SchemaError) as e:
+        print(f"Ignoring session cache: {e}")
+        return None
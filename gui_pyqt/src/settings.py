@@ -1,15 +1,33 @@
 # TCP/IP
 HOST = "127.0.0.1"  # Standard loopback interface address (localhost)
 PORT = 25000  # Port to listen on (non-privileged ports are > 1023)
+protocolMode = "legacy"  # "legacy" (one 13 double frame per sample) or "framed" (batched frames)
+receiveBufferSize = 65536  # initial size in bytes of reusable receive buffer. Grows to fit larger frames.
+maxSessions = 4  # most data sources connected at once
+sendBufferLimit = 65536  # bytes of control data queued for a client before reading from it is paused
+
+# Acquisition process
+acquisitionMode = "thread"  # "thread" (server on a thread of the GUI process) or "process" (separate acquisition process)
+statePublishInterval = 0.2  # seconds between measurements and metrics sent by the acquisition process
 
 # Plot preferences
 penWidth = 1.3
 plotBackground = "w"
-line1Color = "b"
-line2Color = "#ff8c00"
-line3Color = "g"
+lineColors = ["b", "#ff8c00", "g", "r", "m", "c", "k", "y"]  # colours of lines in order, repeated if there are more lines
 axisScalingFactor = 0.001  # value of axis scale. Depends on sample rate i.e. 1 sample = axisScalingFactor seconds.
 nSamplesInView = 100
+cursorColor = "k"  # colour of the measurement cursors
+renderMode = "raster"  # "raster" (QPainter), "opengl" (vertex buffers, falls back to raster) or "auto" (opengl if available)
+softwareOpenGL = False  # render OpenGL in software e.g. with Mesa llvmpipe on machines without a GPU
+
+# Trigger
+triggerMode = "auto"  # "auto", "normal" or "single"
+triggerSlope = "rising"  # "rising" or "falling"
+triggerLevel = 0.0
+triggerHysteresis = 0.05  # width of band the signal must leave before re-arming
+triggerHoldoff = 0  # minimum number of samples between triggers
+preTriggerFraction = 0.5  # fraction of plotted window before the trigger point
+triggerBatchSize = 32  # number of samples evaluated at a time when samples arrive one by one
 
 # Viewbox preferences
 zoomAmount = 0.75
@@ -17,10 +35,75 @@ zoomAmount = 0.75
 # Combo box indexes
 vComboBoxIndex = 0
 iComboBoxIndex = 1
+vSpectrumComboBoxIndex = 2
+iSpectrumComboBoxIndex = 3
 
 # Memory
-maxBufferLength = 10000
+maxBufferLength = 10000  # capacity of the sample store in samples per channel
+
+# Recording
+recordingEnabled = False  # start recording to disk as soon as a client connects
+recordingDirectory = "recordings"
+recordingChunkSamples = 4096  # samples per channel in each chunk of a recording
+recordingQueueLength = 64  # chunks buffered for the writer thread before chunks are dropped
+
+# Measurements
+measurementsInterval = 0.2  # seconds between passes of the measurements engine over new samples
+thdCycles = 10  # number of cycles analysed for total harmonic distortion
+nHarmonics = 40  # highest harmonic included in total harmonic distortion
+
+# Events
+# (kind, channels, quantity, condition, threshold) rules. channels is a channel name, group or unit,
+# quantity "rms" or "mean" over one cycle or "rate" (of the mean, per second) and condition "below",
+# "above" or "beyond" (magnitude above). Evaluated every half cycle.
+eventRules = [
+    ("interruption", "V", "rms", "below", 23.0),
+    ("sag", "V", "rms", "below", 207.0),
+    ("swell", "V", "rms", "above", 253.0),
+    ("underfrequency", "Hz", "mean", "below", 49.5),
+    ("overfrequency", "Hz", "mean", "above", 50.5),
+    ("rocof", "Hz", "rate", "beyond", 1.0),
+]
+nominalFrequency = 50.0  # Hz. Sets the cycle the event quantities are computed over.
+eventHysteresis = 0.02  # fraction of the threshold a quantity must recover by to end an event
+eventPreSeconds = 0.1  # seconds of samples captured before the start of an event
+eventPostSeconds = 0.3  # seconds of samples captured after the start of an event
+maxEvents = 200  # events kept per session. The oldest are dropped first.
+eventInterval = 0.1  # seconds between passes of the event detector over new samples
+eventsRefreshRate = 500  # ms between refreshes of the events list
+
+# Spectrum
+fftSize = 1024  # samples per spectrum frame. Rounded up to a power of two.
+spectrumOverlap = 0.5  # fraction of each frame shared with the next
+spectrumWindow = "hann"  # "hann", "hamming", "blackman" or "rectangular"
+spectrumAveraging = 4  # number of frames in the exponential average. 1 disables averaging.
+maxSpectrumFrames = 8  # most frames transformed per plot refresh. Older frames are skipped.
+
+# Instrumentation
+statsRefreshRate = 1000  # interval between updates of the stats overlay in ms
+metricsDumpPath = ""  # file metrics are appended to, as CSV if it ends in .csv else JSON lines. Empty to disable.
+metricsDumpInterval = 10.0  # seconds between metrics dumps
+
+# Benchmarks
+benchmarkDirectory = "benchmarks"  # directory benchmark results are saved in
+benchmarkDuration = 0.5  # seconds of samples streamed through each pipeline benchmark
+
+# Startup cache
+cacheDirectory = "cache"  # compiled user interface and the sessions saved on exit
+sessionCacheEnabled = True  # save the latest samples and the view on exit and restore them on startup
+sessionCacheSeconds = 10.0  # seconds of the latest samples of every channel saved on exit
+
+# History plot
+decimationFactor = 4  # ratio of block sizes of consecutive levels of the min/max pyramid
+
+# Roll mode
+rollSeconds = 60.0  # time span scrolled through in roll mode
 
 # QTimer settings
-plotRefreshRate = 100
+plotRefreshRate = 100  # initial interval between plot refreshes in ms
 measurementsRefreshRate = 2000
+
+# Plot refresh scheduling
+targetPlotInterval = 33  # interval between plot refreshes in ms when refreshes are cheap
+maxPlotInterval = 500  # longest interval between plot refreshes in ms
+plotCpuCeiling = 0.5  # maximum fraction of GUI thread time spent refreshing the plot
@@ -0,0 +1,166 @@
+"""Sample stores and acquisition state in shared memory.
+
+Used when acquisition runs in a separate process: the acquisition process
+creates the blocks and writes to them, and the GUI process attaches to them
+by name and only reads. Nothing is copied between the processes apart from
+the names of the blocks.
+
+Blocks are unlinked by the acquisition process when it no longer needs
+them. A process that has attached to a block keeps its mapping until it
+lets go of it, so unlinking never invalidates what the GUI is reading.
+Views of attached blocks are read-only, so the GUI cannot corrupt the
+samples or the counters of the acquisition process.
+"""
+# Standard library imports
+from multiprocessing import shared_memory
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from ringbuffer import RingBuffer
+
+HEADER_SIZE = 64  # bytes of counters before the samples, a cache line
+
+# Counters in the header of a SharedRingBuffer
+TOTAL_WRITTEN = 0
+WRITE_END = 1
+N_CHANNELS = 2
+CAPACITY = 3
+
+MAX_READ_ATTEMPTS = 100  # reads of a SharedFrame before giving up on the writer
+
+
+class SharedRingBuffer(RingBuffer):
+    """RingBuffer whose samples and counters are in a shared memory block.
+
+    Created by the writer if no name is given, else attached to the block
+    with that name. The sequence lock of RingBuffer.snapshot works across
+    processes since writeEnd and totalWritten are in the block too.
+    """
+    def __init__(self, nChannels, capacity, name=None) -> None:
+        size = HEADER_SIZE + np.dtype(np.float64).itemsize * nChannels * 2 * capacity
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+        self.counters = np.ndarray(4, dtype=np.int64, buffer=self.memory.buf)
+        if name is None:
+            self.counters[N_CHANNELS] = nChannels
+            self.counters[CAPACITY] = capacity
+        elif (self.counters[N_CHANNELS], self.counters[CAPACITY]) != (nChannels, capacity):
+            raise ValueError(
+                f"Shared ring buffer {name} holds {self.counters[N_CHANNELS]} channels of "
+                f"{self.counters[CAPACITY]} samples, not {nChannels} of {capacity}"
+            )
+
+        self.nChannels = nChannels
+        self.capacity = capacity
+        self.data = np.ndarray(
+            (nChannels, 2 * capacity), dtype=np.float64, buffer=self.memory.buf, offset=HEADER_SIZE
+        )
+        if name is not None:
+            self.counters.flags.writeable = False
+            self.data.flags.writeable = False
+        self.nbytes = self.data.nbytes
+        self.snapshotRetries = 0  # counted by each process for its own snapshots
+
+    @property
+    def totalWritten(self):
+        return int(self.counters[TOTAL_WRITTEN])
+
+    @totalWritten.setter
+    def totalWritten(self, value):
+        self.counters[TOTAL_WRITTEN] = value
+
+    @property
+    def writeEnd(self):
+        return int(self.counters[WRITE_END])
+
+    @writeEnd.setter
+    def writeEnd(self, value):
+        self.counters[WRITE_END] = value
+
+    def close(self):
+        """Let go of the block in this process. The buffer must no longer be
+        used.
+        """
+        self.counters = self.data = None
+        closeMemory(self.memory)
+
+    def unlink(self):
+        """Remove the block once every process has let go of it."""
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedFrame:
+    """The end index and trigger windows of a session, published in shared
+    memory.
+
+    The first value is a sequence number which is odd while the writer is
+    updating the frame, so a reader in another process can tell when it has
+    read a partially updated frame and read it again.
+    """
+    def __init__(self, nWindows, name=None) -> None:
+        size = np.dtype(np.int64).itemsize * (2 + 2 * nWindows)
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.nWindows = nWindows
+        self.values = np.ndarray(2 + 2 * nWindows, dtype=np.int64, buffer=self.memory.buf)
+        if name is not None:
+            self.values.flags.writeable = False
+
+    def publish(self, endIndex, windows):
+        """Write a frame. Must only be called by a single writer."""
+        values = self.values
+        values[0] += 1
+        values[1] = endIndex
+        values[2:] = np.ravel(windows)
+        values[0] += 1
+
+    def read(self):
+        """Return the latest (endIndex, windows) published, or None if the
+        writer was updating the frame every time it was read.
+        """
+        values = self.values
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence = int(values[0])
+            if sequence & 1:
+                continue
+            copy = values[1:].tolist()
+            if int(values[0]) == sequence:
+                windows = tuple(zip(copy[1::2], copy[2::2]))
+                return copy[0], windows
+        return None
+
+    def close(self):
+        """Let go of the block in this process. The frame must no longer be
+        used.
+        """
+        self.values = None
+        closeMemory(self.memory)
+
+    def unlink(self):
+        """Remove the block once every process has let go of it."""
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def closeMemory(memory):
+    """Unmap a shared memory block, unless arrays still view it, in which
+    case it is unmapped once they are garbage collected.
+    """
+    try:
+        memory.close()
+    except BufferError:
+        pass
@@ -0,0 +1,294 @@
+"""Synthetic stand-in for the Simulink TCP client (tcp_client.c).
+
+Connects to the server and streams three-phase voltages and currents in
+the legacy or framed protocol, so the acquisition pipeline can be exercised
+and benchmarked without the target hardware.
+
+The debug channel carries the time.monotonic() time at which each batch of
+samples was generated, which the headless server uses to measure latency.
+
+With --float32 or --int16 the client announces a schema in which every
+channel but the debug channel is sent as floats or scaled 16 bit integers.
+In the framed protocol, --delta and --compress select frame encodings,
+which are used if the server advertises them in its first control frame.
+
+Usage:
+    python simulator.py [--protocol legacy|framed] [--rate 50000] [--batch 64]
+                        [--waveform sine,harmonics,noise,steps] [--duration 10]
+                        [--unpaced] [--float32 | --int16] [--delta]
+                        [--compress zlib|lz4]
+"""
+# Standard library imports
+import argparse
+import socket
+import threading
+import time
+
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+import encoding
+import protocol
+import settings
+from schema import ChannelSchema, defaultSchema
+
+WAVEFORMS = ("sine", "harmonics", "noise", "steps")
+
+
+class WaveformGenerator:
+    """Generate blocks of samples of all channels.
+
+    Voltages and currents are three-phase sines of amplitude vAmplitude and
+    iAmplitude, the currents lagging by phaseShift radians. Optional
+    components: odd harmonics up to the 13th with amplitudes falling as 1/h,
+    Gaussian noise, and amplitude steps alternating every stepPeriod seconds.
+    """
+    def __init__(
+                    self,
+                    sampleRate,
+                    waveforms=("sine",),
+                    frequency=50.0,
+                    vAmplitude=325.0,
+                    iAmplitude=10.0,
+                    phaseShift=np.pi / 6,
+                    harmonicLevel=0.1,
+                    noiseLevel=0.01,
+                    stepPeriod=1.0,
+                    stepDepth=0.5
+                ) -> None:
+        self.sampleRate = sampleRate
+        self.waveforms = set(waveforms)
+        self.frequency = frequency
+        self.amplitudes = np.array([vAmplitude] * 3 + [iAmplitude] * 3)[:, np.newaxis]
+        phases = np.arange(3) * -2 * np.pi / 3
+        self.phases = np.concatenate((phases, phases - phaseShift))[:, np.newaxis]
+        self.harmonicLevel = harmonicLevel
+        self.noiseLevel = noiseLevel
+        self.stepPeriod = stepPeriod
+        self.stepDepth = stepDepth
+
+        self.rng = np.random.default_rng(0)
+        self.index = 0  # index of next sample
+
+    def block(self, nSamples):
+        """Return the next nSamples samples of all channels as an array of
+        shape (channels, samples).
+        """
+        t = (self.index + np.arange(nSamples)) / self.sampleRate
+        self.index += nSamples
+        angle = 2 * np.pi * self.frequency * t + self.phases
+
+        waves = np.sin(angle)
+        if "harmonics" in self.waveforms:
+            for h in range(3, 14, 2):
+                waves += self.harmonicLevel / h * np.sin(h * angle)
+        if "noise" in self.waveforms:
+            waves += self.rng.normal(0, self.noiseLevel, waves.shape)
+        if "steps" in self.waveforms:
+            stepped = (t // self.stepPeriod) % 2 == 1
+            waves[:, stepped] *= self.stepDepth
+
+        block = np.empty((protocol.N_CHANNELS, nSamples))
+        block[0] = time.monotonic()
+        block[1:7] = self.amplitudes * waves
+        block[7:] = self.frequency
+        return block
+
+
+def float32Schema():
+    """Return the default schema with all channels but the debug channel
+    sent as floats.
+    """
+    return ChannelSchema(
+        channel._replace(dtype="f8" if channel.name == "debug" else "f4")
+        for channel in defaultSchema.channels
+    )
+
+
+def int16Schema(vRange=400.0, iRange=20.0, frequencyRange=10.0):
+    """Return the default schema with all channels but the debug channel
+    sent as 16 bit integers, spanning -range to range about nominal values
+    of zero volts, zero amps and 50 Hz.
+    """
+    ranges = {"V": vRange, "A": iRange, "Hz": frequencyRange}
+    return ChannelSchema(
+        channel if channel.name == "debug" else channel._replace(
+            dtype="i2",
+            scale=ranges[channel.unit] / 32767,
+            offset=50.0 if channel.unit == "Hz" else 0.0
+        )
+        for channel in defaultSchema.channels
+    )
+
+
+class SimulatedClient:
+    """Stream generated samples to the server.
+
+    If a schema is given it is announced to the server and samples are sent
+    in its sample types. Otherwise the default schema is assumed. Frames are
+    encoded with the flags advertised by the server out of those requested.
+
+    Streaming stops early if the generator returns an empty block, when it
+    has no more samples.
+    """
+    def __init__(self, generator, framed=False, batch=64, paced=True, schema=None, flags=0) -> None:
+        self.generator = generator
+        self.framed = framed
+        self.batch = batch
+        self.paced = paced
+        self.schema = schema
+        self.requestedFlags = flags
+        self.flags = 0  # frame encoding in use
+        self.bytesSent = 0
+
+        self.controlInputs = [0.0] * protocol.N_CONTROL_INPUTS  # latest control inputs received
+        self.samplesSent = 0
+        self.sequence = 0
+
+    def run(self, host, port, duration):
+        """Connect and stream for duration seconds. Returns the achieved
+        sample rate.
+        """
+        with socket.create_connection((host, port)) as conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.schema is not None:
+                conn.sendall(self.schema.toMessage())
+            if self.framed:
+                self.flags = self.requestedFlags & self.receiveControlFrame(conn)
+                if self.flags != self.requestedFlags:
+                    print(f"Server does not support frame encoding {self.requestedFlags & ~self.flags:#x}")
+                threading.Thread(target=self.receiveControls, args=(conn,), daemon=True).start()
+
+            start = time.monotonic()
+            while True:
+                elapsed = time.monotonic() - start
+                if elapsed >= duration:
+                    break
+                if self.paced:
+                    # Wait until the batch is due
+                    due = self.samplesSent / self.generator.sampleRate
+                    if due > elapsed:
+                        time.sleep(due - elapsed)
+
+                block = self.generator.block(self.batch)
+                if not block.shape[1]:
+                    break
+                if self.framed:
+                    self.sendFrame(conn, block)
+                else:
+                    self.sendLegacy(conn, block)
+                self.samplesSent += block.shape[1]
+
+        return self.samplesSent / (time.monotonic() - start)
+
+    def sendFrame(self, conn, block):
+        header = protocol.frameHeader.pack(
+            protocol.FRAME_MAGIC,
+            protocol.PROTOCOL_VERSION,
+            self.flags,
+            self.sequence,
+            block.shape[1],
+            (1 << block.shape[0]) - 1,
+        )
+        message = header + (self.schema or defaultSchema).encodeFrame(block, self.flags)
+        conn.sendall(message)
+        self.bytesSent += len(message)
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+
+    def sendLegacy(self, conn, block):
+        """Send samples one by one, each after receiving the control inputs."""
+        schema = self.schema or defaultSchema
+        samples = memoryview(schema.encodeLegacy(block))
+        sampleSize = schema.legacyDtype.itemsize
+        controls = bytearray(protocol.legacyControls.size)
+        for offset in range(0, len(samples), sampleSize):
+            receiveExactly(conn, controls)
+            conn.sendall(samples[offset : offset + sampleSize])
+        self.controlInputs = list(protocol.legacyControls.unpack(controls))
+
+    def receiveControls(self, conn):
+        """Receive control frames until the connection is closed."""
+        try:
+            while True:
+                self.receiveControlFrame(conn)
+        except OSError:
+            return
+
+    def receiveControlFrame(self, conn):
+        """Receive a control frame, keeping the latest value of each input.
+        Returns the frame encodings advertised by the server.
+        """
+        header = bytearray(protocol.frameHeader.size)
+        receiveExactly(conn, header)
+        magic, version, flags, sequence, sampleCount, inputMask = (
+            protocol.frameHeader.unpack(header)
+        )
+        indexes = [i for i in range(protocol.N_CONTROL_INPUTS) if inputMask & (1 << i)]
+        payload = bytearray(8 * len(indexes))
+        receiveExactly(conn, payload)
+        for i, value in zip(indexes, np.frombuffer(payload, dtype="<f8").tolist()):
+            self.controlInputs[i] = value
+        return flags
+
+
+def receiveExactly(conn, buffer):
+    """Fill a buffer with bytes received from a connection."""
+    view = memoryview(buffer)
+    while view:
+        nReceived = conn.recv_into(view)
+        if nReceived == 0:
+            raise ConnectionError("Server closed the connection")
+        view = view[nReceived:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic General Power Theory client")
+    parser.add_argument("--host", default=settings.HOST)
+    parser.add_argument("--port", type=int, default=settings.PORT)
+    parser.add_argument("--protocol", choices=(protocol.LEGACY_MODE, protocol.FRAMED_MODE),
+                        default=settings.protocolMode)
+    parser.add_argument("--rate", type=float, default=1 / settings.axisScalingFactor,
+                        help="sample rate in samples per second")
+    parser.add_argument("--batch", type=int, default=64, help="samples per frame or send")
+    parser.add_argument("--waveform", default="sine",
+                        help=f"comma separated components from {', '.join(WAVEFORMS)}")
+    parser.add_argument("--frequency", type=float, default=50.0)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to stream for")
+    parser.add_argument("--unpaced", action="store_true",
+                        help="send as fast as the server accepts, to find the maximum sustained rate")
+    sampleType = parser.add_mutually_exclusive_group()
+    sampleType.add_argument("--float32", action="store_true",
+                            help="announce a schema sending all channels but the debug channel as floats")
+    sampleType.add_argument("--int16", action="store_true",
+                            help="announce a schema sending all channels but the debug channel as "
+                                 "scaled 16 bit integers")
+    parser.add_argument("--delta", action="store_true",
+                        help="delta encode integer channels of frames")
+    parser.add_argument("--compress", choices=("zlib", "lz4"), default=None, help="compress frames")
+    args = parser.parse_args()
+
+    waveforms = args.waveform.split(",")
+    for waveform in waveforms:
+        if waveform not in WAVEFORMS:
+            parser.error(f"unknown waveform {waveform}")
+
+    client = SimulatedClient(
+        WaveformGenerator(args.rate, waveforms, args.frequency),
+        framed=args.protocol == protocol.FRAMED_MODE,
+        batch=args.batch,
+        paced=not args.unpaced,
+        schema=float32Schema() if args.float32 else int16Schema() if args.int16 else None,
+        flags=(
+            (encoding.FLAG_DELTA if args.delta else 0)
+            | {None: 0, "zlib": encoding.FLAG_ZLIB, "lz4": encoding.FLAG_LZ4}[args.compress]
+        )
+    )
+    rate = client.run(args.host, args.port, args.duration)
+    print(f"Sent {client.samplesSent} samples at {rate:,.0f} samples/s")
+    if client.bytesSent:
+        print(f"{client.bytesSent / client.samplesSent:.1f} bytes per sample")
+
+
+if __name__ == "__main__":
+    main()
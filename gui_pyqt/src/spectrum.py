@@ -0,0 +1,141 @@
+"""Live magnitude spectrum of channels of the sample store."""
+
+# Standard library imports
+import functools
+
+# Third-party library imports
+import numpy as np
+
+windowFunctions = {
+    "hann": np.hanning,
+    "hamming": np.hamming,
+    "blackman": np.blackman,
+    "rectangular": np.ones,
+}
+
+
+@functools.lru_cache(maxsize=16)
+def windowCoefficients(name, length):
+    """Return cached window coefficients, read-only since they are shared."""
+    window = windowFunctions[name](length)
+    window.flags.writeable = False
+    return window
+
+
+@functools.lru_cache(maxsize=16)
+def fftLength(length):
+    """Return the smallest power of two not less than length."""
+    return 1 << max(int(length) - 1, 0).bit_length()
+
+
+@functools.lru_cache(maxsize=16)
+def fftFrequencies(length, samplePeriod):
+    """Return cached frequencies of the bins of a real FFT."""
+    frequencies = np.fft.rfftfreq(length, samplePeriod)
+    frequencies.flags.writeable = False
+    return frequencies
+
+
+class SpectrumAnalyser:
+    """Magnitude spectra of several channels over overlapping frames.
+
+    Frames of fftSize samples start every hop samples, where hop is set by
+    the overlap fraction. Each update only transforms frames completed since
+    the previous update, all at once with a single FFT call, and at most
+    maxFrames of the most recent ones so that a refresh never does more
+    than a bounded amount of work. With averaging above 1 the spectrum is an
+    exponential average over about that many frames.
+    """
+    def __init__(
+                    self,
+                    store,
+                    channels,
+                    samplePeriod,
+                    fftSize=1024,
+                    overlap=0.5,
+                    window="hann",
+                    averaging=1,
+                    maxFrames=8
+                ) -> None:
+        self.store = store
+        self.channels = list(channels)  # channel indexes in the sample store
+        self.samplePeriod = samplePeriod
+        self.maxFrames = maxFrames
+        self.configure(fftSize, overlap, window, averaging)
+
+    def configure(self, fftSize, overlap, window, averaging):
+        """Change analysis parameters and restart averaging."""
+        self.fftSize = fftLength(fftSize)
+        self.hop = max(int(self.fftSize * (1 - overlap)), 1)
+        self.window = window
+        self.averaging = averaging
+
+        coefficients = windowCoefficients(window, self.fftSize)
+        self.scale = 2 / coefficients.sum()  # amplitude of a sinusoid in its bin
+
+        self.frequencies = fftFrequencies(self.fftSize, self.samplePeriod)
+        self.magnitudes = np.zeros((len(self.channels), len(self.frequencies)))
+        self.nextFrameStart = None  # absolute index of next frame to be transformed
+        self.frameCount = 0  # frames transformed since configuration
+
+    def update(self):
+        """Transform frames completed since the last update.
+
+        Returns True if the spectra changed.
+        """
+        store = self.store
+        end = store.totalWritten
+        if self.nextFrameStart is None:
+            self.nextFrameStart = max(end - self.fftSize, 0)
+
+        nFrames = (end - self.fftSize - self.nextFrameStart) // self.hop + 1
+        if nFrames <= 0:
+            return False
+
+        # Skip frames that cannot be processed in this update
+        nSkipped = max(nFrames - self.maxFrames, 0)
+        first = self.nextFrameStart + nSkipped * self.hop
+        nFrames -= nSkipped
+        if first < store.oldestIndex:
+            nLost = -(-(store.oldestIndex - first) // self.hop)
+            first += nLost * self.hop
+            nFrames -= nLost
+            nSkipped += nLost
+            if nFrames <= 0:
+                self.nextFrameStart = first
+                return False
+
+        stop = first + (nFrames - 1) * self.hop + self.fftSize
+        data = store.snapshot(first, stop)
+        if data is None:
+            return False  # overwritten while copying, try again next update
+        self.nextFrameStart = first + nFrames * self.hop
+
+        frames = np.lib.stride_tricks.sliding_window_view(
+            data[self.channels], self.fftSize, axis=1
+        )[:, :: self.hop]
+        frames = frames - frames.mean(axis=2, keepdims=True)
+        magnitudes = np.abs(
+            np.fft.rfft(frames * windowCoefficients(self.window, self.fftSize), axis=2)
+        ) * self.scale
+
+        if self.averaging > 1 and self.frameCount:
+            # Exponential average applied frame by frame
+            alpha = 1 / self.averaging
+            weights = alpha * (1 - alpha) ** np.arange(nFrames - 1, -1, -1)
+            self.magnitudes = (
+                (1 - alpha) ** nFrames * self.magnitudes
+                + np.tensordot(magnitudes, weights, axes=([1], [0]))
+            )
+        else:
+            self.magnitudes = magnitudes[:, -1]
+
+        self.frameCount += nFrames + nSkipped
+        return True
+
+    def magnitude(self, channel, decibels=True):
+        """Return the spectrum of a channel of the sample store."""
+        magnitudes = self.magnitudes[self.channels.index(channel)]
+        if decibels:
+            return 20 * np.log10(np.maximum(magnitudes, 1e-12))
+        return magnitudes
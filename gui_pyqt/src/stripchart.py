@@ -0,0 +1,83 @@
+"""Roll mode display buffer.
+
+In roll mode the plot scrolls continuously through the latest span of
+samples, like a strip chart recorder, which suits slow signals that the
+trigger cannot frame. The span can be much longer than the sample store
+retains, so it is kept pre-decimated to about one column per pixel: every
+column holds the min and max of a block of samples, plotted as a vertical
+segment so that peaks are never lost.
+
+Columns are appended to a ring buffer of plot points as their samples
+arrive, and the lines are plotted from views of it. The cost of a refresh
+is therefore proportional to the number of new samples, and the number of
+points plotted is fixed by the width of the plot rather than the span.
+"""
+# Third-party library imports
+import numpy as np
+
+# Local application imports
+from ringbuffer import RingBuffer
+
+
+class StripChart:
+    """Min/max columns of the latest spanSamples samples of all channels of
+    a sample store, for plotting nColumns wide.
+
+    Row 0 of the plot points holds the x values, the absolute sample index
+    at the centre of each column, and row n + 1 the y values of channel n.
+    Every column is two points, its min and its max. Samples after the last
+    completed column are not plotted until the column completes.
+    """
+    def __init__(self, store, spanSamples, nColumns) -> None:
+        self.store = store
+        self.samplesPerColumn = max(1, -(-spanSamples // max(nColumns, 1)))
+        self.nColumns = -(-spanSamples // self.samplesPerColumn)
+        self.spanSamples = self.nColumns * self.samplesPerColumn
+
+        self.points = RingBuffer(1 + store.nChannels, 2 * self.nColumns)
+
+        # Start from the oldest retained samples, so the chart is not empty
+        self.processedIndex = -(-store.oldestIndex // self.samplesPerColumn) * self.samplesPerColumn
+
+    def update(self):
+        """Append the columns completed since the last update. Returns the
+        number of columns appended.
+
+        Safe to call from a thread other than the writer's of the sample
+        store. Columns whose samples were overwritten before they were
+        appended are skipped, leaving a gap plotted as a straight segment.
+        """
+        store = self.store
+        samplesPerColumn = self.samplesPerColumn
+        stop = store.totalWritten // samplesPerColumn * samplesPerColumn
+        start = max(
+            self.processedIndex,
+            -(-store.oldestIndex // samplesPerColumn) * samplesPerColumn,
+            stop - self.spanSamples  # older columns would be dropped straight away
+        )
+        if stop <= start:
+            return 0
+
+        samples = store.snapshot(start, stop)
+        if samples is None or samples.shape[1] != stop - start:
+            return 0  # overwritten while copying, try again next time
+
+        nNew = (stop - start) // samplesPerColumn
+        blocks = samples.reshape(store.nChannels, nNew, samplesPerColumn)
+        points = np.empty((1 + store.nChannels, 2 * nNew))
+        points[0] = np.repeat(
+            (np.arange(start // samplesPerColumn, stop // samplesPerColumn) + 0.5) * samplesPerColumn, 2
+        )
+        points[1:, 0::2] = blocks.min(axis=2)
+        points[1:, 1::2] = blocks.max(axis=2)
+        self.points.write(points)
+
+        self.processedIndex = stop
+        return nNew
+
+    def lineData(self, channel):
+        """Return views of the x and y data of a channel. Only valid until
+        the next update.
+        """
+        points = self.points.read(self.points.oldestIndex, self.points.totalWritten)
+        return points[0], points[1 + channel]
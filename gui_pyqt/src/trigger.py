@@ -0,0 +1,165 @@
+"""Oscilloscope style trigger for the live plot.
+
+The trigger decides which window of samples of each channel is plotted so
+that a repeating signal appears in the same place on every refresh.
+"""
+# Third-party library imports
+import numpy as np
+
+# Trigger modes
+AUTO_MODE = "auto"  # plot triggered windows, or the latest samples if there is no trigger
+NORMAL_MODE = "normal"  # only plot triggered windows
+SINGLE_MODE = "single"  # plot the first triggered window then stop until re-armed
+
+# Trigger slopes
+RISING_SLOPE = "rising"
+FALLING_SLOPE = "falling"
+
+
+class TriggerEngine:
+    """Edge trigger with hysteresis, holdoff and pre-trigger for several
+    channels of a RingBuffer.
+
+    For a rising slope, a channel triggers when it rises to the trigger level
+    after having been below level - hysteresis. The hysteresis band keeps
+    noise around the level from causing spurious triggers. Triggers less than
+    holdoff samples after the previous trigger are ignored.
+
+    New samples are evaluated a block at a time with NumPy. Only the window
+    of the latest trigger of each channel is published, by replacing the
+    windows tuple as a whole, so readers on other threads never see a
+    partially updated set of windows and no lock is needed.
+    """
+    def __init__(
+                    self,
+                    channels,
+                    windowLength,
+                    level=0.0,
+                    hysteresis=0.0,
+                    slope=RISING_SLOPE,
+                    holdoff=0,
+                    preTriggerFraction=0.5,
+                    mode=AUTO_MODE,
+                    autoTimeout=None
+                ) -> None:
+        self.channels = list(channels)  # channel indexes in the sample store
+        self.windowLength = windowLength
+
+        self.levels = [level] * len(self.channels)
+        self.hysteresis = hysteresis
+        self.slope = slope
+        self.holdoff = holdoff
+        self.preTriggerFraction = preTriggerFraction
+        self.mode = mode
+        # Samples without a trigger after which auto mode plots the latest samples
+        self.autoTimeout = autoTimeout if autoTimeout is not None else 2 * windowLength
+
+        self.processedIndex = 0  # absolute index of first sample not yet evaluated
+
+        n = len(self.channels)
+        self.states = [None] * n  # True above level, False below level - hysteresis
+        self.lastTriggers = [None] * n  # last accepted trigger, for holdoff
+        self.pendingTriggers = [None] * n  # accepted triggers awaiting post-trigger samples
+        self.lastPublished = [0] * n  # absolute index at which a window was last published
+        self.stopped = [False] * n  # single mode has captured its window
+
+        # Published (lower, upper) absolute sample ranges, one per channel
+        self.windows = ((0, 0),) * n
+
+    def setLevel(self, channel, level):
+        """Set the trigger level of a channel of the sample store."""
+        self.levels[self.channels.index(channel)] = level
+
+    def setMode(self, mode):
+        """Change trigger mode. Re-arms single mode."""
+        self.mode = mode
+        self.rearm()
+
+    def rearm(self):
+        """Wait for a new trigger in single mode."""
+        self.stopped = [False] * len(self.channels)
+
+    def window(self, channel):
+        """Return the published (lower, upper) range of a channel of the
+        sample store.
+        """
+        return self.windows[self.channels.index(channel)]
+
+    def update(self, store):
+        """Evaluate the samples written to a RingBuffer since the last update
+        and publish the resulting windows.
+        """
+        start = max(self.processedIndex, store.oldestIndex)
+        stop = store.totalWritten
+        if stop <= start:
+            return
+
+        block = store.read(start, stop)
+        self.processedIndex = stop
+
+        nPre = int(round(self.preTriggerFraction * self.windowLength))
+        nPost = self.windowLength - nPre
+
+        windows = list(self.windows)
+        for i, channel in enumerate(self.channels):
+            if self.stopped[i]:
+                continue
+
+            triggers = self.findTriggers(i, block[channel], start)
+
+            # Latest trigger whose post-trigger samples have all arrived
+            if self.pendingTriggers[i] is not None:
+                triggers.insert(0, self.pendingTriggers[i])
+            self.pendingTriggers[i] = None
+            complete = [t for t in triggers if t + nPost <= stop]
+            if triggers and triggers[-1] + nPost > stop:
+                self.pendingTriggers[i] = triggers[-1]
+
+            if complete:
+                trigger = complete[0] if self.mode == SINGLE_MODE else complete[-1]
+                windows[i] = (trigger - nPre, trigger + nPost)
+                self.lastPublished[i] = stop
+                if self.mode == SINGLE_MODE:
+                    self.stopped[i] = True
+                    self.pendingTriggers[i] = None
+            elif self.mode == AUTO_MODE and stop - self.lastPublished[i] >= self.autoTimeout:
+                # Free run on the latest samples
+                windows[i] = (stop - self.windowLength, stop)
+
+        self.windows = tuple(windows)
+
+    def findTriggers(self, i, values, firstIndex):
+        """Return absolute indexes of accepted edges of channel i in a block
+        of values starting at firstIndex.
+        """
+        level = self.levels[i]
+        if self.slope == RISING_SLOPE:
+            high = values >= level
+            low = values < level - self.hysteresis
+        else:
+            high = values <= level
+            low = values > level + self.hysteresis
+
+        # State of the Schmitt trigger where it is defined i.e. outside the
+        # hysteresis band. An edge is a change from low to high state.
+        defined = np.flatnonzero(high | low)
+        if len(defined) == 0:
+            return []
+        states = high[defined]
+
+        previous = np.empty_like(states)
+        previous[0] = True if self.states[i] is None else self.states[i]
+        previous[1:] = states[:-1]
+        self.states[i] = bool(states[-1])
+
+        edges = (defined[states & ~previous] + firstIndex).tolist()
+
+        # Apply holdoff
+        triggers = []
+        lastTrigger = self.lastTriggers[i]
+        for edge in edges:
+            if lastTrigger is None or edge - lastTrigger >= self.holdoff:
+                triggers.append(edge)
+                lastTrigger = edge
+        self.lastTriggers[i] = lastTrigger
+        return triggers
@@ -0,0 +1,82 @@
+"""Cache of Qt Designer files compiled to Python modules.
+
+Parsing gpt_gui.ui with uic.loadUi on every launch is slow on the target,
+so the file is compiled with uic.compileUi the first time it is loaded, and
+again whenever it changes, and the compiled module is imported on later
+launches. uic itself is then only imported when compiling.
+
+Run this module to compile ahead of time, e.g. before packaging:
+
+    python uicache.py [gpt_gui.ui]
+"""
+# Standard library imports
+import importlib.util
+import os
+import sys
+
+# Local application imports
+import settings
+
+
+def compiledPath(uiPath, directory):
+    """Return the path of the module compiled from a Qt Designer file."""
+    name = os.path.splitext(os.path.basename(uiPath))[0]
+    return os.path.join(directory, f"{name}_ui.py")
+
+
+def compileUi(uiPath, directory=None):
+    """Compile a Qt Designer file into a module in directory. Returns the
+    path of the module.
+    """
+    from PyQt5 import uic
+
+    directory = settings.cacheDirectory if directory is None else directory
+    path = compiledPath(uiPath, directory)
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first so that an interrupted compile never
+    # leaves a partial module behind
+    temporaryPath = f"{path}.tmp"
+    with open(temporaryPath, "w") as f:
+        uic.compileUi(uiPath, f)
+    os.replace(temporaryPath, path)
+    return path
+
+
+def loadUi(uiPath, widget, directory=None):
+    """Set up a widget from a Qt Designer file like uic.loadUi, using the
+    compiled module and compiling it first if it is missing or stale.
+
+    Falls back to uic.loadUi if the module cannot be written, e.g. when
+    installed read-only.
+    """
+    directory = settings.cacheDirectory if directory is None else directory
+    path = compiledPath(uiPath, directory)
+
+    stale = not os.path.exists(path) or (
+        os.path.exists(uiPath) and os.path.getmtime(path) < os.path.getmtime(uiPath)
+    )
+    if stale:
+        try:
+            compileUi(uiPath, directory)
+        except OSError:
+            from PyQt5 import uic
+
+            uic.loadUi(uiPath, widget)
+            return
+
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    uiClass = next(value for name, value in vars(module).items() if name.startswith("Ui_"))
+    ui = uiClass()
+    ui.setupUi(widget)
+
+    # uic.loadUi makes the child widgets attributes of the widget itself
+    for name, value in vars(ui).items():
+        setattr(widget, name, value)
+
+
+if __name__ == "__main__":
+    print(f"Compiled {compileUi(sys.argv[1] if len(sys.argv) > 1 else 'gpt_gui.ui')}")